@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Synthetic HDF5 files for the benchmarks.
+
+Each file is generated once per session. Set ``H5SH_BENCH_SCALE`` to a
+factor (default 1) to make every file proportionally larger or smaller.
+"""
+from __future__ import (division, absolute_import, print_function, )
+
+import os
+import shutil
+
+import pytest
+import h5py
+import numpy as np
+
+SCALE = float(os.environ.get('H5SH_BENCH_SCALE', 1))
+
+
+def scaled(n):
+    return max(int(n * SCALE), 1)
+
+
+@pytest.fixture(scope='session')
+def wide_h5(tmp_path_factory):
+    """Group with many small datasets and subgroups."""
+    filename = str(tmp_path_factory.mktemp("bench") / "wide.h5")
+    n = scaled(20000)
+    with h5py.File(filename, 'w', libver='latest') as f:
+        g = f.create_group('wide', track_order=True)
+        for i in range(n):
+            if i % 4:
+                g.create_dataset('dset{:07d}'.format(i), shape=(i % 100,),
+                                 dtype='f8')
+            else:
+                g.create_group('group{:07d}'.format(i))
+    return filename
+
+
+@pytest.fixture(scope='session')
+def deep_h5(tmp_path_factory):
+    """Tree of nested groups, returning the file and its deepest path."""
+    filename = str(tmp_path_factory.mktemp("bench") / "deep.h5")
+    (depth, fanout) = (scaled(64), 4)
+    with h5py.File(filename, 'w') as f:
+        g = f
+        for level in range(depth):
+            for j in range(1, fanout):
+                g.create_group('sibling{:d}'.format(j))['data'] = level
+            g = g.create_group('level{:03d}'.format(level))
+        path = g.name
+    return (filename, path)
+
+
+@pytest.fixture(scope='session')
+def attrs_h5(tmp_path_factory):
+    """Group with many attributes of assorted types."""
+    filename = str(tmp_path_factory.mktemp("bench") / "attrs.h5")
+    with h5py.File(filename, 'w', libver='latest') as f:
+        attrs = f.create_group('attrs').attrs
+        for i in range(scaled(5000)):
+            key = 'attr{:05d}'.format(i)
+            kind = i % 4
+            if kind == 0:
+                attrs[key] = i
+            elif kind == 1:
+                attrs[key] = np.arange(i % 50, dtype='f4')
+            elif kind == 2:
+                attrs[key] = "value {:d}".format(i)
+            else:
+                attrs[key] = np.array(["a", "bb", "ccc"], dtype=object)
+    return filename
+
+
+@pytest.fixture(scope='session')
+def chunked_h5(tmp_path_factory):
+    """Large chunked, compressed dataset."""
+    filename = str(tmp_path_factory.mktemp("bench") / "chunked.h5")
+    nrows = scaled(4000)
+    rng = np.random.default_rng(42)
+    with h5py.File(filename, 'w') as f:
+        d = f.create_dataset('data', shape=(nrows, 1000), dtype='f4',
+                             chunks=(min(250, nrows), 250),
+                             compression='gzip', compression_opts=1,
+                             shuffle=True)
+        for start in range(0, nrows, 500):
+            block = rng.standard_normal((min(500, nrows - start), 1000))
+            d[start:start + len(block)] = np.round(block, 2)
+    return filename
+
+
+@pytest.fixture(scope='session')
+def chunked_copies_h5(chunked_h5):
+    """Copies of the chunked file: byte for byte, and recompressed."""
+    same = chunked_h5.replace("chunked.h5", "chunked-same.h5")
+    shutil.copy(chunked_h5, same)
+    recompressed = chunked_h5.replace("chunked.h5", "chunked-lzf.h5")
+    with h5py.File(chunked_h5, 'r') as src, \
+            h5py.File(recompressed, 'w') as dst:
+        data = src['data']
+        d = dst.create_dataset('data', shape=data.shape, dtype=data.dtype,
+                               chunks=data.chunks, compression='lzf')
+        for start in range(0, data.shape[0], 500):
+            d[start:start + 500] = data[start:start + 500]
+    return (same, recompressed)
+
+
+@pytest.fixture(scope='session')
+def many_chunks_h5(tmp_path_factory):
+    """Dataset split into many tiny chunks, some left unallocated."""
+    filename = str(tmp_path_factory.mktemp("bench") / "many_chunks.h5")
+    nrows = scaled(1000)
+    with h5py.File(filename, 'w') as f:
+        d = f.create_dataset('data', shape=(nrows, 1000), dtype='u1',
+                             chunks=(min(2, nrows), 5))
+        d[:nrows * 4 // 5] = 1
+    return filename
+
+
+@pytest.fixture(scope='session')
+def strings_h5(tmp_path_factory):
+    """Variable- and fixed-length string datasets."""
+    filename = str(tmp_path_factory.mktemp("bench") / "strings.h5")
+    nrows = scaled(200000)
+    words = np.array([("row{:d}-{}".format(i, "x" * (i % 13))).encode()
+                      for i in range(nrows)], dtype=object)
+    with h5py.File(filename, 'w') as f:
+        f.create_dataset('vlen', data=words, dtype=h5py.string_dtype('ascii'))
+        f.create_dataset('fixed', data=words.astype('S'))
+    return filename
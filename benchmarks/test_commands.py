@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time shell commands through the command registry.
+
+Run with ``make bench``, which saves the results under ``.benchmarks`` so
+that later runs can be compared with ``--benchmark-compare``.
+"""
+from __future__ import (division, absolute_import, print_function, )
+
+import contextlib
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from h5sh.commands import COMMANDS
+from h5sh.state import State
+from h5sh.utils import (extract, to_native_str_array)
+
+
+@contextlib.contextmanager
+def state_of(filename, **kwargs):
+    with State(filename, save_index=False, **kwargs) as state:
+        yield state
+
+
+def run(state, command, *args):
+    """Run a command, discarding its output."""
+    with open(os.devnull, 'w') as null:
+        with contextlib.redirect_stdout(null):
+            COMMANDS[command](state, *args)
+
+
+def uncached(state, command, *args):
+    """Run a command without cached listings or metadata of earlier runs."""
+    state.invalidate()
+    run(state, command, *args)
+
+###############################################################################
+# LISTING
+
+
+@pytest.mark.parametrize('args', [(), ('-l',), ('-U', '--limit', '100')],
+                         ids=['ls', 'ls-l', 'ls-U-limit'])
+def test_ls_wide(benchmark, wide_h5, args):
+    with state_of(wide_h5) as state:
+        benchmark(uncached, state, 'ls', *(args + ('wide',)))
+
+
+def test_ls_wide_indexed(benchmark, wide_h5):
+    with state_of(wide_h5, index=True) as state:
+        benchmark(run, state, 'ls', '-l', 'wide')
+
+
+def test_cd_deep(benchmark, deep_h5):
+    (filename, path) = deep_h5
+
+    def cd():
+        run(state, 'cd', path)
+        run(state, 'cd', '/')
+
+    with state_of(filename) as state:
+        benchmark(cd)
+
+
+def test_index_deep(benchmark, deep_h5):
+    (filename, _) = deep_h5
+    with state_of(filename) as state:
+        benchmark(run, state, 'index')
+
+###############################################################################
+# COMPLETION
+
+
+@pytest.mark.parametrize('indexed', [False, True],
+                         ids=['file', 'indexed'])
+def test_complete_wide(benchmark, wide_h5, indexed):
+    from prompt_toolkit.completion import CompleteEvent
+    from prompt_toolkit.document import Document
+    from h5sh.console import CommandCompleter
+
+    # Groups numbered below 10000, so that there are matches at any scale
+    document = Document("cd /wide/group000")
+
+    def complete():
+        if not indexed:
+            state.invalidate()
+        return list(completer.get_completions(document, CompleteEvent()))
+
+    with state_of(wide_h5, index=indexed) as state:
+        completer = CommandCompleter(state)
+        result = benchmark(complete)
+    assert result
+
+###############################################################################
+# QUERY
+
+
+def test_attr_many(benchmark, attrs_h5):
+    with state_of(attrs_h5) as state:
+        benchmark(run, state, 'attr', 'attrs')
+
+
+@pytest.mark.parametrize('args', [('data',), ('data[1000:1500, ::10]',)],
+                         ids=['truncated', 'selection'])
+def test_dump_chunked(benchmark, chunked_h5, args):
+    with state_of(chunked_h5) as state:
+        benchmark(run, state, 'dump', *args)
+
+
+def test_stats_chunked(benchmark, chunked_h5):
+    with state_of(chunked_h5) as state:
+        benchmark(run, state, 'stats', 'data')
+
+
+@pytest.mark.parametrize('args', [(), ('-l', '-s', 'size', '-n', '10')],
+                         ids=['summary', 'list-smallest'])
+def test_chunks_many(benchmark, many_chunks_h5, args):
+    with state_of(many_chunks_h5) as state:
+        benchmark(run, state, 'chunks', *(args + ('data',)))
+
+
+@pytest.mark.parametrize('copy', ['same', 'recompressed'])
+@pytest.mark.parametrize('jobs', ['1', '4'])
+def test_diff_chunked(benchmark, chunked_h5, chunked_copies_h5, copy, jobs):
+    """Identical storage is compared raw; other copies are decompressed."""
+    other = chunked_copies_h5[copy == 'recompressed']
+    with state_of(chunked_h5) as state:
+        benchmark(run, state, 'diff', '-j', jobs, 'data', other + ':data')
+
+
+def test_cp_chunked(benchmark, chunked_h5, tmpdir):
+    """Native copy of compressed chunks, without decompressing them."""
+    out = str(tmpdir / "copy.h5")
+    with state_of(chunked_h5) as state:
+        benchmark(run, state, 'cp', '-f', '-o', out, 'data')
+
+
+def decode_elements(dset):
+    """Read raw strings and decode them one element at a time."""
+    return to_native_str_array(dset[:])
+
+
+@pytest.mark.parametrize('method', [decode_elements, extract],
+                         ids=['per-element', 'bulk'])
+@pytest.mark.parametrize('name', ['vlen', 'fixed'])
+def test_extract_strings(benchmark, strings_h5, name, method):
+    # Compare the baseline with bulk decoding on the same dataset
+    benchmark.group = "extract-strings-" + name
+    with state_of(strings_h5) as state:
+        dset = state.f[name]
+        result = benchmark(method, dset)
+        assert len(result) == len(dset)
+
+###############################################################################
+# FILE DRIVERS
+
+DRIVERS = ['sec2', 'core', 'fileobj']
+
+
+@pytest.mark.parametrize('driver', DRIVERS)
+def test_open_ls_driver(benchmark, wide_h5, driver):
+    """Opening a file for one command: 'core' reads the whole file first."""
+    def open_ls():
+        with state_of(wide_h5, driver=driver) as state:
+            run(state, 'ls', '-U', '--limit', '100', 'wide')
+
+    benchmark(open_ls)
+
+
+@pytest.mark.parametrize('driver', DRIVERS)
+def test_ls_wide_driver(benchmark, wide_h5, driver):
+    """Repeated browsing of an open file, where 'core' pays off."""
+    with state_of(wide_h5, driver=driver) as state:
+        benchmark(uncached, state, 'ls', '-l', 'wide')
+
+
+@pytest.mark.parametrize('driver', DRIVERS)
+def test_index_deep_driver(benchmark, deep_h5, driver):
+    """Walking scattered metadata, which 'fileobj' reads in large blocks."""
+    (filename, _) = deep_h5
+
+    def open_index():
+        with state_of(filename, driver=driver) as state:
+            run(state, 'index')
+
+    benchmark(open_index)
+
+
+@pytest.mark.parametrize('driver', DRIVERS)
+def test_stats_chunked_driver(benchmark, chunked_h5, driver):
+    with state_of(chunked_h5, driver=driver) as state:
+        benchmark(run, state, 'stats', 'data')
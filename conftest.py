@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Fixtures shared by the tests and the benchmarks."""
+
+import pytest
+
+@pytest.fixture(autouse=True)
+def h5sh_cache_dir(tmpdir, monkeypatch):
+    # Don't load or leave saved indexes in the user's cache
+    cache_dir = tmpdir / "cache"
+    monkeypatch.setenv("H5SH_CACHE_DIR", str(cache_dir))
+    yield cache_dir
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Iterate over datasets in chunk-aligned blocks of bounded size."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import itertools
+
+import numpy as np
+
+DEFAULT_BLOCK_BYTES = 64 * 1024**2
+
+###############################################################################
+
+
+def block_shape(shape, chunks=None, itemsize=1, budget=DEFAULT_BLOCK_BYTES):
+    """Shape of the largest chunk-aligned block that fits in `budget` bytes.
+
+    Blocks are grown from the last (fastest-varying) axis forward so that
+    they are as contiguous as possible in C order. Along each axis the block
+    is a whole number of chunks, unless it spans the full axis. A block is
+    never smaller than one chunk (or one element for contiguous datasets),
+    even if that exceeds the budget. Empty shapes are returned unchanged,
+    since they have no blocks at all.
+    """
+    if 0 in shape:
+        return tuple(shape)
+    ndim = len(shape)
+    if chunks is None:
+        chunks = (1,) * ndim
+    block = [min(c, n) for (c, n) in zip(chunks, shape)]
+    itemsize = max(1, itemsize)
+    for axis in reversed(range(ndim)):
+        other = itemsize * int(np.prod([b for (i, b) in enumerate(block)
+                                        if i != axis], dtype=np.int64))
+        unit = max(1, chunks[axis])
+        count = max(1, budget // (other * unit))
+        block[axis] = max(block[axis], min(shape[axis], count * unit))
+        if block[axis] < shape[axis]:
+            break
+    return tuple(block)
+
+
+def iter_blocks(shape, block):
+    """Generate selection tuples that tile `shape` with blocks of `block`.
+
+    Blocks are generated in C order. A scalar shape yields a single empty
+    selection.
+    """
+    ranges = [[slice(start, min(start + b, n))
+               for start in range(0, n, max(1, b))]
+              for (n, b) in zip(shape, block)]
+    return itertools.product(*ranges)
+
+
+def dataset_blocks(data, budget=DEFAULT_BLOCK_BYTES):
+    """Selections of chunk-aligned blocks of an h5py dataset or view.
+    """
+    chunks = getattr(data, 'chunks', None)
+    block = block_shape(data.shape, chunks, data.dtype.itemsize, budget)
+    return iter_blocks(data.shape, block)
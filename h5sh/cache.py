@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""Bounded caches for HDF5 metadata."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from collections import OrderedDict
+import sys
+import threading
+
+###############################################################################
+
+
+class LRUCache(object):
+    """Least-recently-used mapping with an entry and a byte budget.
+
+    Each value is stored along with its (estimated) size in bytes. When either
+    the number of entries or their total size exceeds the budget, the least
+    recently used entries are evicted. A single value that is larger than the
+    byte budget is never stored. Entries may be added from several threads.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=32 * 1024**2):
+        if max_entries < 0 or max_bytes < 0:
+            raise ValueError("Cache budgets must be nonnegative")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Key -> (value, nbytes), in order from least to most recently used
+        self._data = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "{}({:d}/{:d} entries, {:d}/{:d} bytes)".format(
+            type(self).__name__, len(self), self.max_entries,
+            self._nbytes, self.max_bytes)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    @property
+    def nbytes(self):
+        """Estimated total size of the cached values."""
+        return self._nbytes
+
+    def get(self, key, default=None):
+        """Return the cached value, marking it as the most recently used."""
+        with self._lock:
+            try:
+                (value, nbytes) = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = (value, nbytes)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, nbytes=0):
+        """Store a value with the given estimated size."""
+        with self._lock:
+            self.discard(key)
+            if nbytes > self.max_bytes or not self.max_entries:
+                return
+            self._data[key] = (value, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    def discard(self, key):
+        """Remove a key from the cache if present."""
+        with self._lock:
+            try:
+                (_, nbytes) = self._data.pop(key)
+            except KeyError:
+                return
+            self._nbytes -= nbytes
+
+    def discard_if(self, predicate):
+        """Remove all entries whose key satisfies the predicate."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+
+    def resize(self, max_entries=None, max_bytes=None):
+        """Change the budget, evicting entries as needed."""
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        data = self._data
+        while data and (len(data) > self.max_entries
+                        or self._nbytes > self.max_bytes):
+            (_, (_, nbytes)) = data.popitem(last=False)
+            self._nbytes -= nbytes
+
+
+###############################################################################
+
+
+def sizeof_names(names):
+    """Estimate the memory used by a list of strings."""
+    return sys.getsizeof(names) + sum(sys.getsizeof(n) for n in names)
+
+
+class ListingCache(LRUCache):
+    """Classified (groups, datasets) listings of recently visited groups.
+
+    Keys are ``(path, address, filename)`` tuples so that a group that was
+    replaced by a different object at the same path is never served a stale
+    listing.
+    """
+
+    def get_listing(self, key):
+        return self.get(key)
+
+    def put_listing(self, key, groups, datasets):
+        nbytes = sizeof_names(groups) + sizeof_names(datasets)
+        self.put(key, (groups, datasets), nbytes)
+
+    def invalidate(self, path=None, filename=None):
+        """Drop cached listings for a group and everything below it.
+
+        With no path, all listings are dropped; with no filename, listings
+        of every file are. This must be called after modifying a file opened
+        in a writable mode.
+        """
+        if filename is None and (path is None or path == '/'):
+            self.clear()
+            return
+        if path is None:
+            path = '/'
+        path = path.rstrip('/')
+        prefix = path + '/'
+
+        def stale(key):
+            if filename is not None and key[2:3] != (filename,):
+                return False
+            return key[0] == path or key[0].startswith(prefix)
+        self.discard_if(stale)
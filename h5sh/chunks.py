@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Storage layout of the chunks of a dataset, gathered into arrays."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from array import array
+
+import numpy as np
+
+###############################################################################
+
+
+def _iter_chunk_info(dsid, func):
+    """Call `func` with the `StoreInfo` of each allocated chunk.
+
+    ``chunk_iter`` visits every chunk in a single pass over the chunk index,
+    but needs HDF5 1.12.3 or 1.14. Older versions look chunks up one at a
+    time, which is far slower for datasets with many chunks.
+    """
+    chunk_iter = getattr(dsid, 'chunk_iter', None)
+    if chunk_iter is not None:
+        chunk_iter(func)
+        return
+    for i in range(dsid.get_num_chunks()):
+        func(dsid.get_chunk_info(i))
+
+
+class ChunkTable(object):
+    """Allocated chunks of a dataset, as arrays in storage index order.
+
+    For each of the ``len(table)`` allocated chunks, `offsets` is the
+    element index of its first element (one row per chunk), `addresses`
+    its byte offset in the file, `sizes` its stored (possibly compressed)
+    size, and `filter_masks` the filters that were skipped when writing it.
+    """
+
+    def __init__(self, shape, chunks, itemsize, offsets, addresses, sizes,
+                 filter_masks):
+        self.shape = tuple(shape)
+        self.chunks = tuple(chunks)
+        self.itemsize = itemsize
+        self.offsets = offsets
+        self.addresses = addresses
+        self.sizes = sizes
+        self.filter_masks = filter_masks
+
+    @classmethod
+    def from_dataset(cls, dset):
+        """Read the chunk index of a chunked h5py dataset."""
+        if dset.chunks is None:
+            raise ValueError("{} is not chunked".format(dset.name))
+        # Compact buffers of unsigned 64-bit integers
+        (offsets, addresses, sizes, masks) = [array('Q') for _ in range(4)]
+
+        def visit(info, offset=offsets.extend, address=addresses.append,
+                  size=sizes.append, mask=masks.append):
+            offset(info.chunk_offset)
+            address(info.byte_offset)
+            size(info.size)
+            mask(info.filter_mask)
+
+        _iter_chunk_info(dset.id, visit)
+        ndim = len(dset.shape)
+        return cls(dset.shape, dset.chunks, dset.dtype.itemsize,
+                   np.frombuffer(offsets, np.uint64).reshape(-1, ndim),
+                   np.frombuffer(addresses, np.uint64),
+                   np.frombuffer(sizes, np.uint64),
+                   np.frombuffer(masks, np.uint64).astype(np.uint32))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def grid(self):
+        """Number of chunks along each axis."""
+        return tuple(-(-n // c) for (n, c) in zip(self.shape, self.chunks))
+
+    @property
+    def nchunks(self):
+        """Number of chunks covering the dataset, allocated or not."""
+        return int(np.prod(self.grid, dtype=np.int64))
+
+    @property
+    def chunk_nbytes(self):
+        """Uncompressed size of a chunk (edge chunks are stored whole)."""
+        return self.itemsize * int(np.prod(self.chunks, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        """Total stored size of the allocated chunks."""
+        return int(self.sizes.sum())
+
+    @property
+    def indices(self):
+        """Position of each allocated chunk in the chunk grid."""
+        return self.offsets // np.array(self.chunks, dtype=np.uint64)
+
+    @property
+    def ratios(self):
+        """Compression ratio (uncompressed over stored size) of each chunk."""
+        return self.chunk_nbytes / np.maximum(self.sizes, 1)
+
+    @property
+    def filtered(self):
+        """Whether each chunk went through every filter of the pipeline."""
+        return self.filter_masks == 0
+
+    def ratio_percentiles(self, q=(0, 5, 25, 50, 75, 95, 100)):
+        """Percentiles of the compression ratios of allocated chunks."""
+        if not len(self):
+            return np.full(len(q), np.nan)
+        return np.percentile(self.ratios, q)
@@ -2,12 +2,29 @@
 
 """Command-line utilities subsystem."""
 
+from importlib import import_module
+
 # Command utilities
 from .base import Command
 from .miniargparse import MiniArgParser
 from .registry import COMMANDS, register
 
-# Load actual commands
-from . import navigation
-from . import query
-from . import system
+# Load actual commands on first use
+COMMANDS.defer(__name__ + ".navigation",
+               ["cd", "pwd", "ls", "l", "find"]
+               + ["u" + "p" * i for i in range(1, 6)])
+COMMANDS.defer(__name__ + ".query",
+               ["dump", "export", "cp", "stats", "chunks", "diff", "attr",
+                "du"])
+COMMANDS.defer(__name__ + ".system",
+               ["__INTERRUPT__", "__NULL__", "exit", "help", "index",
+                "filename", "open", "files", "use", "time", "profile",
+                "set", "cache"])
+
+
+def __getattr__(name):
+    # Import command modules on attribute access (Python 3.7+)
+    if name in ("navigation", "query", "system"):
+        return import_module(__name__ + "." + name)
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
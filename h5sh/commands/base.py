@@ -5,12 +5,22 @@
 from __future__ import (division, absolute_import, print_function, )
 #-----------------------------------------------------------------------------#
 from .miniargparse import MiniArgParser, MiniSystemExit
+from ..utils import join_brackets
+
+
+# Parsed arguments that name HDF5 objects, or lists of them
+_PATH_ARGUMENTS = ('dataset', 'group', 'obj', 'paths')
 
 
 class Command(object):
     """Utility class for constructing a command that takes arguments.
+
+    Object arguments may be prefixed by the alias of another open file, as in
+    ``run3.h5:/results/energy``: the command then runs with that file in use.
+    Commands that handle aliases themselves set `resolve_aliases` to False.
     """
     name = None
+    resolve_aliases = True
 
     def __init__(self):
         self.parser = self.build_parser()
@@ -23,13 +33,20 @@ class Command(object):
         raise NotImplementedError()
 
     def __call__(self, state, *args):
+        # Rejoin selections such as 'dset[1:2, 3]' split at whitespace
+        args = join_brackets(args)
         # Parse the arguments
         try:
             parsed = self.parser.parse_args(args)
         except MiniSystemExit:
             return
 
-        self.execute(state, **vars(parsed))
+        kwargs = vars(parsed)
+        alias = None
+        if self.resolve_aliases:
+            alias = _resolve_aliases(state, kwargs)
+        with state.using(alias):
+            self.execute(state, **kwargs)
 
     def get_completions(self, document, args, state):
         """Get completions for this command.
@@ -40,13 +57,21 @@ class Command(object):
         if in_word.startswith('-'):
             for arg in self.parser.options:
                 yield arg
-        else:
-            if self.parser.dataset:
-                for arg in state.datasets:
-                    yield arg
-            if self.parser.group:
-                for arg in state.subgroups:
+        elif self.parser.dataset or self.parser.group:
+            # Members are generated as they are read
+            if '/' in in_word:
+                members = state.complete_path(in_word)
+            else:
+                members = state.iter_items()
+            for (arg, is_group) in members:
+                if not is_group:
+                    if self.parser.dataset:
+                        yield arg
+                elif self.parser.group:
                     yield arg
+                else:
+                    # Only offered to reach the datasets inside
+                    yield arg + '/'
 
     @property
     def description(self):
@@ -54,3 +79,23 @@ class Command(object):
         if not desc:
             raise AttributeError(desc)
         return desc
+
+
+def _resolve_aliases(state, kwargs):
+    """Strip file aliases from object arguments, returning the alias."""
+    alias = None
+    for key in _PATH_ARGUMENTS:
+        value = kwargs.get(key)
+        if not value:
+            continue
+        paths = value if isinstance(value, list) else [value]
+        for (i, path) in enumerate(paths):
+            (this_alias, paths[i]) = state.split_alias(path)
+            if this_alias is None:
+                this_alias = state.alias
+            if alias is not None and this_alias != alias:
+                raise ValueError("Arguments must be in the same file")
+            alias = this_alias
+        if not isinstance(value, list):
+            kwargs[key] = paths[0]
+    return alias
@@ -4,7 +4,9 @@
 
 from __future__ import (division, absolute_import, print_function, )
 #-----------------------------------------------------------------------------#
-from argparse import ArgumentParser
+from argparse import Action, ArgumentError, ArgumentParser
+
+from ..selection import split_selection
 ###############################################################################
 
 
@@ -12,6 +14,18 @@ class MiniSystemExit(BaseException):
     pass
 
 
+class SelectionAction(Action):
+    """Store a dataset name and its optional trailing [selection]."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        try:
+            (name, selection) = split_selection(values)
+        except ValueError as e:
+            raise ArgumentError(self, str(e))
+        setattr(namespace, self.dest, name)
+        setattr(namespace, 'selection', selection)
+
+
 class MiniArgParser(ArgumentParser):
     """Argument parser that just returns/raises instead of exiting.
 
@@ -23,6 +37,7 @@ class MiniArgParser(ArgumentParser):
         self.options = []
         self.dataset = False
         self.group = False
+        self.selection = False
         super(MiniArgParser, self).__init__(*args, **kwargs)
 
     def exit(self, status=0, message=None):
@@ -40,7 +55,17 @@ class MiniArgParser(ArgumentParser):
         raise TypeError(message)
 
     def add_dataset_argument(self, *args, **kwargs):
+        """Add a 'dataset' argument.
+
+        With ``selection=True``, the dataset name may be followed by a
+        NumPy-style selection such as ``temp[1000:2000, ::8, 3]``, which is
+        parsed into the 'selection' attribute (None if not given).
+        """
         self.dataset = True
+        if kwargs.pop('selection', False):
+            self.selection = True
+            kwargs['action'] = SelectionAction
+            self.set_defaults(selection=None)
         kwargs.setdefault('help', "Dataset name")
         return super(MiniArgParser, self).add_argument('dataset',
                                                        *args, **kwargs)
@@ -5,17 +5,24 @@
 
 from __future__ import (division, absolute_import, print_function, )
 #-----------------------------------------------------------------------------#
-from h5sh.utils import (make_column_kv_fmt, short_describe, subgroup)
+from h5sh.metadata import (GROUP, DATASET, DATATYPE, HARD, iter_members,
+                           scan_links)
+from h5sh.utils import (abspath, make_column_kv_fmt, parse_bytes,
+                        short_describe, subgroup)
 
 from .base import Command
 from .registry import register
 
-import h5py
+from fnmatch import fnmatchcase
+import numpy as np
+import re
 ###############################################################################
 
 
 class Chdir(Command):
     name = "cd"
+    # Switching files is done by State.chdir
+    resolve_aliases = False
 
     def build_parser(self):
         parser = super(Chdir, self).build_parser(
@@ -53,6 +60,38 @@ for _i in range(1, 6):
 del _i
 
 
+class _Lister(object):
+    """Print names (and descriptions) a page at a time."""
+    page_size = 1024
+
+    def __init__(self, long=False, oneline=False):
+        self.long = long
+        self.oneline = oneline
+        # (name, object or metadata) pairs
+        self.page = []
+
+    def __call__(self, name, obj=None):
+        self.page.append((name, obj))
+        if len(self.page) >= self.page_size:
+            self.flush()
+
+    def flush(self):
+        page = self.page
+        if not page:
+            return
+        keys = [k for (k, _) in page]
+        if self.long:
+            fmt = make_column_kv_fmt(keys)
+            for (k, obj) in page:
+                print(fmt(k, short_describe(obj)))
+        elif self.oneline:
+            for k in keys:
+                print(k)
+        else:
+            print(" ".join(keys))
+        self.page = []
+
+
 class Listdir(Command):
     name = "ls"
 
@@ -63,32 +102,50 @@ class Listdir(Command):
                             help="Print attributes as well as names")
         parser.add_argument('-1', dest='oneline', action='store_true',
                             help="Print one entry per line")
+        parser.add_argument('-U', dest='unsorted', action='store_true',
+                            help="Do not sort: list in creation order if "
+                            "tracked, otherwise in storage order")
+        parser.add_argument('--offset', type=int, default=0, metavar='N',
+                            help="Skip the first N entries")
+        parser.add_argument('--limit', type=int, metavar='N',
+                            help="List at most N entries")
         parser.add_argument('group', nargs='?')
         return parser
 
-    def execute(self, state, long, oneline, group=None):
-        if group is not None:
-            group = subgroup(state.group, group)
-        else:
-            group = state.group
+    def execute(self, state, long, oneline, unsorted=False, offset=0,
+                limit=None, group=None):
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("Offset and limit must be nonnegative")
 
-        keys = sorted(group)
-        if not keys:
-            return
+        index = state.index
+        rows = None
+        if index is not None and not unsorted:
+            # The structure index has no creation order
+            path = state.cwd if group is None else abspath(group, state.cwd)
+            rows = index.child_rows(path)
 
-        if long:
-            fmt = make_column_kv_fmt(keys)
-            for k in keys:
-                v = group.get(k, getlink=True)
-                if isinstance(v, h5py.HardLink):
-                    v = group[k]
-                v = short_describe(v)
-                print(fmt(k, v))
-        elif oneline:
-            for k in keys:
-                print(k)
+        lister = _Lister(long, oneline)
+        if rows is not None:
+            # Answer entirely from the structure index, reconstructing only
+            # the requested page
+            stop = None if limit is None else offset + limit
+            for row in rows[offset:stop]:
+                name = str(index.paths[row]).rpartition('/')[2]
+                lister(name, index.entry(row) if long else None)
         else:
-            print(" ".join(keys))
+            if group is not None:
+                group = subgroup(state.group, group)
+            else:
+                group = state.group
+
+            # Print pages as the links are read
+            if long:
+                for meta in iter_members(group, True, offset, limit,
+                                         unsorted):
+                    lister(meta.name, meta)
+            else:
+                scan_links(group, lister, offset, limit, unsorted)
+        lister.flush()
 
 
 ls = register.instance(Listdir)
@@ -97,3 +154,168 @@ ls = register.instance(Listdir)
 @register("Alias for 'ls -l'")
 def l(state, *args):
     ls(state, "-l", *args)
+
+
+###############################################################################
+
+
+def iter_tree(state, group=None):
+    """Generate `Metadata` for everything below a group.
+
+    The structure index is used if it gives the same results as a walk (see
+    `StructureIndex.subtree`); otherwise the file is walked lazily so that
+    results are available as soon as they are read. Returns the index rows
+    and their paths (or None) and the iterator.
+    """
+    path = state.cwd if group is None else abspath(group, state.cwd)
+    index = state.index
+    if index is not None:
+        tree = index.subtree(path)
+        if tree is not None:
+            return (tree, (index.entry(r, str(p)) for (r, p) in zip(*tree)))
+
+    grp = subgroup(state.group, group) if group is not None else state.group
+    # Imported here so that other commands start faster
+    from h5sh.index import walk
+    tree = walk(grp)
+    # Skip the group itself
+    next(tree)
+    return (None, tree)
+
+
+def _match_size(spec):
+    """Predicate on a byte count from a find-style '[+-]N[KMG]' spec."""
+    sign = spec[:1]
+    if sign in "+-":
+        spec = spec[1:]
+    size = parse_bytes(spec)
+    if sign == '+':
+        return lambda n: n > size
+    if sign == '-':
+        return lambda n: n < size
+    return lambda n: n == size
+
+
+def _match_dtype(spec):
+    """Predicate on a datatype: a kind code such as 'f' or a type like 'f8'.
+    """
+    if len(spec) == 1 and spec in "biufcmMOSUV":
+        return lambda dt: dt is not None and dt.kind == spec
+    expected = np.dtype(spec)
+    return lambda dt: (dt is not None and dt.kind == expected.kind
+                       and dt.itemsize == expected.itemsize)
+
+
+class FindFilter(object):
+    """Find-style predicate on `Metadata` records.
+
+    Conditions on object and link kinds are also applied to structure index
+    columns, so that most rows are rejected without being reconstructed.
+    """
+    TYPES = {'d': GROUP, 'f': DATASET, 't': DATATYPE}
+
+    def __init__(self, name=None, regex=None, kind=None, dtype=None,
+                 size=None, chunked=False, attr=None):
+        tests = []
+        if name is not None:
+            tests.append(lambda m: fnmatchcase(m.name, name))
+        if regex is not None:
+            search = re.compile(regex).search
+            tests.append(lambda m: search(m.path) is not None)
+        if dtype is not None:
+            match_dtype = _match_dtype(dtype)
+            tests.append(lambda m: m.link == HARD and match_dtype(m.dtype))
+        if size is not None:
+            match_size = _match_size(size)
+            tests.append(lambda m: m.kind == DATASET and m.link == HARD
+                         and match_size(m.nbytes))
+        if chunked:
+            tests.append(lambda m: m.chunks is not None)
+        if attr is not None:
+            tests.append(lambda m: any(fnmatchcase(a, attr) for a in m.attrs))
+        self.tests = tests
+        if kind is not None and kind != 'l' and kind not in self.TYPES:
+            raise ValueError("Invalid type {!r}: use one of d, f, l, t"
+                             .format(kind))
+        self.kind = kind
+        self.chunked = chunked
+
+    def __call__(self, meta):
+        kind = self.kind
+        if kind == 'l':
+            if meta.link == HARD:
+                return False
+        elif kind is not None:
+            if meta.link != HARD or meta.kind != self.TYPES[kind]:
+                return False
+        return all(test(meta) for test in self.tests)
+
+    def select_rows(self, index, rows):
+        """Vectorized preselection of structure index rows.
+
+        Returns the positions of the rows that may match.
+        """
+        col = index.columns
+        mask = np.ones(len(rows), dtype=bool)
+        kind = self.kind
+        if kind == 'l':
+            mask &= col['link'][rows] != HARD
+        elif kind is not None:
+            mask &= ((col['link'][rows] == HARD)
+                     & (col['kind'][rows] == self.TYPES[kind]))
+        if self.chunked:
+            mask &= col['ndim'][rows] > 0
+            # Chunk dimensions are all zero for contiguous datasets
+            starts = col['shape_offsets'][rows[mask]]
+            mask[mask] = col['chunks'][starts] > 0
+        return np.flatnonzero(mask)
+
+    def filter(self, state, group=None):
+        """Generate matching `Metadata` below a group."""
+        (tree, entries) = iter_tree(state, group)
+        if tree is not None:
+            (rows, paths) = tree
+            entries = (state.index.entry(rows[i], str(paths[i]))
+                       for i in self.select_rows(state.index, rows))
+        for meta in entries:
+            if self(meta):
+                yield meta
+
+
+def add_filter_arguments(parser):
+    """Add find-style predicate options to a parser."""
+    parser.add_argument('-name', metavar='GLOB',
+                        help="Match the last path component against a glob")
+    parser.add_argument('-regex', metavar='RE',
+                        help="Search the full path with a regular expression")
+    parser.add_argument('-type', dest='kind', choices=('d', 'f', 'l', 't'),
+                        help="Object type: group (d), dataset (f), soft or "
+                        "external link (l), or named datatype (t)")
+    parser.add_argument('-dtype', metavar='TYPE',
+                        help="Datatype, e.g. f8, i4, or a kind such as f, S")
+    parser.add_argument('-size', metavar='[+-]N[KMG]',
+                        help="Logical dataset size: more than (+), less than "
+                        "(-) or exactly N bytes; use '-size=-N' for less than")
+    parser.add_argument('-chunked', action='store_true',
+                        help="Only chunked datasets")
+    parser.add_argument('-attr', metavar='NAME',
+                        help="Objects with an attribute matching the glob")
+
+
+class Find(Command):
+    name = "find"
+
+    def build_parser(self):
+        parser = super(Find, self).build_parser(
+            description="Search for objects below a group (by default the "
+            "current group). Matching paths are printed as they are found.")
+        parser.add_argument('group', nargs='?')
+        add_filter_arguments(parser)
+        return parser
+
+    def execute(self, state, group=None, **kwargs):
+        for meta in FindFilter(**kwargs).filter(state, group):
+            print(meta.path)
+
+
+register.instance(Find)
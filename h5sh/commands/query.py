@@ -4,13 +4,27 @@
 
 from __future__ import (division, absolute_import, print_function, )
 #-----------------------------------------------------------------------------#
+import h5py
 import numpy as np
+import os
 from pprint import pformat
+from six import string_types
 import sys
 from time import time
 
-from h5sh.utils import (make_column_kv_fmt, extract, format_shape)
+from h5sh.blocks import (DEFAULT_BLOCK_BYTES, dataset_blocks)
+from h5sh.chunks import ChunkTable
+from h5sh.diff import Comparison
+from h5sh.export import (FORMATS, export)
+from h5sh.extract import copy_objects
+from h5sh.metadata import (DATASET, GROUP, HARD, filter_names)
+from h5sh.parallel import (bounded_imap, default_jobs, make_pool)
+from h5sh.selection import (DatasetView, format_selection)
+from h5sh.stats import Summary
+from h5sh.utils import (abspath, make_column_kv_fmt, extract, extract_edges,
+                        format_bytes, format_shape, parse_bytes, subgroup)
 from .base import Command
+from .navigation import (FindFilter, add_filter_arguments)
 from .registry import register
 from ..utils import to_native_str
 ###############################################################################
@@ -33,29 +47,42 @@ class Dump(Command):
         parser.add_argument('--suppress_small',
                             help="Print very small numbers as zero",
                             action="store_true")
-        parser.add_argument('dataset', help="Dataset to print")
+        parser.add_argument('dataset', selection=True,
+                            help="Dataset to print, optionally followed by a "
+                            "selection such as 'temp[1000:2000, ::8, 3]'")
         parser.add_argument('-o', '--out',
                             help="File to save output",
                             default=Dump.STDOUT)
+        parser.add_argument('-f', '--format', default="text",
+                            choices=("text",) + FORMATS,
+                            help="Output format: binary formats are "
+                            "written as with 'export'")
         return parser
 
-    def execute(self, state, dataset, out, **kwargs):
+    def execute(self, state, dataset, out, format, **kwargs):
         try:
             dataset = state.group[dataset]
         except KeyError:
             raise ValueError("Nonexistent dataset {!r}".format(dataset))
 
-        if out == Dump.STDOUT:
+        if format != "text":
+            if out == Dump.STDOUT:
+                raise ValueError("Binary output requires a filename (-o)")
+            export(_selected(dataset, kwargs.get('selection')), out, format)
+        elif out == Dump.STDOUT:
             self._dump(dataset, sys.stdout, **kwargs)
         else:
             with open(out, 'w') as f:
                 self._dump(dataset, f, **kwargs)
 
-    def _dump(self, item, f, onlyattr, **kwargs):
+    def _dump(self, item, f, onlyattr, selection=None, **kwargs):
         try:
             shape = item.shape
         except AttributeError:
             raise ValueError("{} is not a dataset".format(item.name))
+        view = None
+        if selection is not None:
+            view = DatasetView(item, selection)
 
         # Print size and shape
         f.write("Dataset: {}\n".format(item.name))
@@ -89,9 +116,18 @@ class Dump(Command):
         if item.compression:
             f.write("Compressed: {}\n".format(item.compression))
 
+        if view is not None:
+            f.write("Selection: [{}] {}\n".format(
+                format_selection(selection), format_shape(view.shape)))
+
         if onlyattr:
             return
 
+        if view is not None:
+            # Print only the selected hyperslab
+            item = view
+            shape = view.shape
+
         threshold = kwargs['threshold']
         if item.size > threshold:
             # More than 60 lines, roughly
@@ -103,7 +139,12 @@ class Dump(Command):
 
         print("---", file=f)
 
-        item = extract(item)
+        if shape and item.size > threshold:
+            # Read only the elements that will be printed
+            item = extract_edges(item, kwargs['edgeitems'])
+            kwargs['threshold'] = 0
+        else:
+            item = extract(item)
         if shape:
             # Print array with given options
             print(np.array2string(item, **kwargs), file=f)
@@ -113,6 +154,434 @@ class Dump(Command):
 
 register.instance(Dump)
 
+
+def _selected(dataset, selection):
+    """Dataset or a view of it, depending on the selection."""
+    if not isinstance(dataset, h5py.Dataset):
+        raise ValueError("{} is not a dataset".format(dataset.name))
+    if selection is None:
+        return dataset
+    return DatasetView(dataset, selection)
+
+###############################################################################
+
+
+class Export(Command):
+    name = "export"
+
+    def build_parser(self):
+        parser = super(Export, self).build_parser(
+            description="Write a dataset to a binary file, reading it in "
+            "chunk-aligned blocks.")
+        parser.add_argument('-f', '--format', default="npy", choices=FORMATS,
+                            help="Write a NumPy .npy file or raw "
+                            "little-endian values")
+        parser.add_argument('-B', '--block-size', type=parse_bytes,
+                            default=DEFAULT_BLOCK_BYTES,
+                            help="Maximum bytes to read at once "
+                            "(default 64M)")
+        parser.add_argument('dataset', selection=True,
+                            help="Dataset to export, optionally with a "
+                            "selection")
+        parser.add_argument('out', help="Output filename")
+        return parser
+
+    def execute(self, state, dataset, out, format, block_size,
+                selection=None):
+        try:
+            dataset = state.group[dataset]
+        except KeyError:
+            raise ValueError("Nonexistent dataset {!r}".format(dataset))
+        export(_selected(dataset, selection), out, format, block_size)
+
+
+register.instance(Export)
+
+###############################################################################
+
+
+class Copy(Command):
+    name = "cp"
+    FILTERS = ('name', 'regex', 'kind', 'dtype', 'size', 'chunked', 'attr')
+
+    def build_parser(self):
+        parser = super(Copy, self).build_parser(
+            description="Copy groups and datasets, keeping their paths, into "
+            "a new HDF5 file. HDF5 copies the objects itself, so data is "
+            "never decompressed. With find-style options, the objects below "
+            "the given groups (by default the current group) that match "
+            "them are copied.")
+        parser.add_argument('-o', '--output', required=True, metavar='FILE',
+                            help="HDF5 file to create")
+        parser.add_argument('-f', '--force', action='store_true',
+                            help="Overwrite the output file if it exists")
+        parser.add_argument('-a', '--append', action='store_true',
+                            help="Add to an existing output file")
+        parser.add_argument('-s', '--shallow', action='store_true',
+                            help="Copy only the immediate members of groups")
+        parser.add_argument('-L', '--dereference', action='store_true',
+                            help="Copy the targets of soft links instead of "
+                            "the links")
+        parser.add_argument('--expand-external', action='store_true',
+                            help="Copy the targets of external links instead "
+                            "of the links")
+        parser.add_argument('-l', '--link', action='store_true',
+                            help="Create external links to the objects "
+                            "instead of copying them")
+        parser.add_argument('-v', '--verbose', action='store_true',
+                            help="Print each copied path")
+        add_filter_arguments(parser)
+        parser.add_argument('paths', nargs='*', metavar='path',
+                            help="Objects to copy, or groups to search")
+        # Complete paths as objects
+        parser.dataset = parser.group = True
+        return parser
+
+    def execute(self, state, output, force, append, shallow, dereference,
+                expand_external, link, verbose, paths, **filters):
+        if force and append:
+            raise ValueError("Use either --force or --append")
+        if any(filters[k] for k in self.FILTERS):
+            find = FindFilter(**filters)
+            paths = [meta.path for group in (paths or [None])
+                     for meta in find.filter(state, group)]
+            if not paths:
+                return
+        elif not paths:
+            raise ValueError("No objects to copy")
+        else:
+            paths = [abspath(p, state.cwd) for p in paths]
+            for path in paths:
+                if not _has_link(state.f, path):
+                    raise ValueError("Nonexistent object {!r}".format(path))
+
+        key = os.path.realpath(output)
+        if key == os.path.realpath(state.filename):
+            raise ValueError("Cannot copy into the file being examined")
+        if key in state.pool:
+            # Opened with 'open': reopened on demand with the new contents
+            state.pool.close(key)
+            state.listings.invalidate(filename=key)
+        if not (append or force) and os.path.exists(output):
+            raise ValueError("{} exists: use --force to overwrite it or "
+                             "--append to add to it".format(output))
+        mode = 'a' if append else 'w'
+        with h5py.File(output, mode) as dst:
+            copied = copy_objects(state.f, paths, dst, shallow=shallow,
+                                  expand_soft=dereference,
+                                  expand_external=expand_external, link=link)
+        if verbose:
+            for path in copied:
+                print(path)
+
+
+def _has_link(f, path):
+    """Whether a path exists, even as a dangling link."""
+    if path == '/':
+        return True
+    try:
+        return f.get(path, getlink=True) is not None
+    except (KeyError, RuntimeError):
+        # Missing parent group
+        return False
+
+
+register.instance(Copy)
+
+###############################################################################
+
+# Files opened by worker processes, kept open between tasks
+_WORKER_FILES = {}
+
+
+def _block_summary(task):
+    """Read one block of a dataset and summarize it."""
+    (source, name, selection, sel, axis) = task
+    if isinstance(source, string_types):
+        try:
+            f = _WORKER_FILES[source]
+        except KeyError:
+            f = _WORKER_FILES[source] = h5py.File(source, 'r')
+    else:
+        f = source
+    data = f[name]
+    if selection is not None:
+        data = DatasetView(data, selection)
+    return (sel, Summary.from_block(data[sel], axis))
+
+
+class Stats(Command):
+    name = "stats"
+    COLUMNS = ("count", "nan", "min", "max", "mean", "std")
+
+    def build_parser(self):
+        parser = super(Stats, self).build_parser(
+            description="Print summary statistics of a numeric dataset, "
+            "reading it once in chunk-aligned blocks.")
+        parser.add_argument('-a', '--axis', type=int,
+                            help="Summarize each index along this axis")
+        parser.add_argument('-p', '--precision', type=int, default=6,
+                            help="Significant digits to print")
+        parser.add_argument('-B', '--block-size', type=parse_bytes,
+                            default=DEFAULT_BLOCK_BYTES // 4,
+                            help="Maximum bytes to read at once "
+                            "(default 16M)")
+        parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                            help="Number of blocks to process at once")
+        parser.add_argument('-P', '--processes', action='store_true',
+                            help="Use worker processes (each opening the "
+                            "file) instead of threads")
+        parser.add_argument('dataset', selection=True,
+                            help="Dataset to summarize, optionally with a "
+                            "selection")
+        return parser
+
+    def execute(self, state, dataset, axis, precision, block_size, jobs,
+                processes, selection=None):
+        try:
+            dataset = state.group[dataset]
+        except KeyError:
+            raise ValueError("Nonexistent dataset {!r}".format(dataset))
+        data = _selected(dataset, selection)
+        if data.dtype.kind not in "biuf":
+            raise ValueError("{} is not numeric".format(dataset.name))
+        if axis is not None:
+            if not -data.ndim <= axis < data.ndim:
+                raise ValueError("Axis {:d} is out of range for {:d}-D data"
+                                 .format(axis, data.ndim))
+            axis %= data.ndim
+            summary = Summary.empty(data.shape[axis])
+        else:
+            summary = Summary.empty()
+
+        if processes:
+            if state.f.mode != 'r':
+                raise ValueError("--processes requires a read-only file")
+            source = state.filename
+        else:
+            source = state.f
+        tasks = ((source, dataset.name, selection, sel, axis)
+                 for sel in dataset_blocks(data, block_size))
+        with make_pool(jobs, processes) as pool:
+            for (sel, part) in bounded_imap(pool, _block_summary, tasks,
+                                            2 * max(1, jobs)):
+                summary.update(part, slice(None) if axis is None
+                               else sel[axis])
+
+        fmt = "{{:.{:d}g}}".format(precision).format
+        rows = [[str(row[0]), str(row[1])] + [fmt(v) for v in row[2:]]
+                for row in summary.rows()]
+        if axis is None:
+            kvfmt = make_column_kv_fmt(self.COLUMNS)
+            for (key, value) in zip(self.COLUMNS, rows[0]):
+                print(kvfmt(key, value))
+            return
+
+        header = ("index",) + self.COLUMNS
+        rows = [[str(i)] + r for (i, r) in enumerate(rows)]
+        widths = [max(len(c) for c in column)
+                  for column in zip(header, *rows)]
+        for row in [header] + rows:
+            print("  ".join(c.rjust(w) for (c, w) in zip(row, widths)))
+
+
+register.instance(Stats)
+
+###############################################################################
+
+
+class Chunks(Command):
+    name = "chunks"
+    PERCENTILES = (0, 5, 25, 50, 75, 95, 100)
+    SORT_KEYS = ("index", "address", "size", "ratio")
+
+    def build_parser(self):
+        parser = super(Chunks, self).build_parser(
+            description="Print the chunk grid of a dataset, how many chunks "
+            "are allocated, and how well they compress.")
+        parser.add_argument('-l', '--list', dest='listing',
+                            action='store_true',
+                            help="List each allocated chunk: its position "
+                            "in the grid, file address, stored size and "
+                            "compression ratio")
+        parser.add_argument('-s', '--sort', choices=self.SORT_KEYS,
+                            default="index",
+                            help="Order of listed chunks: as stored in the "
+                            "chunk index (default), by file address, or by "
+                            "increasing size or ratio")
+        parser.add_argument('-n', '--limit', type=int,
+                            help="List at most this many chunks")
+        parser.add_argument('dataset')
+        return parser
+
+    def execute(self, state, dataset, listing, sort, limit):
+        try:
+            dset = state.group[dataset]
+        except KeyError:
+            raise ValueError("Nonexistent dataset {!r}".format(dataset))
+        if not isinstance(dset, h5py.Dataset):
+            raise ValueError("{} is not a dataset".format(dset.name))
+        if limit is not None and limit < 0:
+            raise ValueError("Limit must not be negative")
+        table = ChunkTable.from_dataset(dset)
+        if listing:
+            self._list(table, sort, limit)
+        else:
+            self._summarize(table, filter_names(dset))
+
+    def _summarize(self, table, filters):
+        nchunks = table.nchunks
+        rows = [
+            ("shape", format_shape(table.shape)),
+            ("chunk shape", "{} ({} uncompressed)".format(
+                format_shape(table.chunks), format_bytes(table.chunk_nbytes))),
+            ("chunk grid", format_shape(table.grid)),
+            ("allocated", "{:d} of {:d} chunks ({:.1%})".format(
+                len(table), nchunks, len(table) / max(nchunks, 1))),
+            ("stored", "{} of {} allocated".format(
+                format_bytes(table.nbytes),
+                format_bytes(len(table) * table.chunk_nbytes))),
+            ("filters", ", ".join(filters) or "none"),
+        ]
+        skipped = len(table) - int(table.filtered.sum())
+        if skipped:
+            rows.append(("unfiltered", "{:d} chunks skipped a filter"
+                         .format(skipped)))
+        if filters and len(table):
+            ratios = table.ratio_percentiles(self.PERCENTILES)
+            labels = ["min" if q == 0 else "max" if q == 100
+                      else "{:d}%".format(q) for q in self.PERCENTILES]
+            rows.append(("ratio", "  ".join(
+                "{} {:.3g}".format(l, r) for (l, r) in zip(labels, ratios))))
+        fmt = make_column_kv_fmt([k for (k, _) in rows], sep="  ")
+        for (key, value) in rows:
+            print(fmt(key, value))
+
+    def _list(self, table, sort, limit):
+        if sort == "index":
+            order = np.arange(len(table))
+        else:
+            key = {"address": table.addresses, "size": table.sizes,
+                   "ratio": table.ratios}[sort]
+            order = np.argsort(key, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        indices = table.indices[order]
+        addresses = table.addresses[order]
+        sizes = table.sizes[order]
+        ratios = table.ratios[order]
+        positions = [",".join(str(i) for i in index)
+                     for index in indices.tolist()]
+
+        header = ("chunk", "address", "size", "ratio")
+        width = max([len(header[0])] + [len(p) for p in positions])
+        fmt = "{{:<{:d}s}}  {{:>12s}}  {{:>10s}}  {{:>7s}}".format(width)
+        fmt = fmt.format
+        print(fmt(*header))
+        for (position, address, size, ratio) in zip(
+                positions, addresses.tolist(), sizes.tolist(),
+                ratios.tolist()):
+            print(fmt(position, str(address), str(size),
+                      "{:.3g}".format(ratio)))
+
+
+register.instance(Chunks)
+
+###############################################################################
+
+
+def _tolerance(text):
+    value = float(text)
+    if not value >= 0:
+        raise ValueError("Tolerance must not be negative: {}".format(text))
+    return value
+
+
+class Diff(Command):
+    name = "diff"
+    resolve_aliases = False
+
+    def build_parser(self):
+        parser = super(Diff, self).build_parser(
+            description="Compare two datasets or groups, which may be in "
+            "different files. Metadata (links, shapes, types and "
+            "attributes) is compared first, then data in chunk-aligned "
+            "blocks; identically stored chunks are compared without "
+            "decompressing them.")
+        parser.add_argument('-q', '--brief', action='store_true',
+                            help="Only report whether the objects differ, "
+                            "stopping at the first difference")
+        parser.add_argument('-c', '--count', action='store_true',
+                            help="Read all data to count differing elements "
+                            "rather than stopping at the first in each "
+                            "dataset")
+        parser.add_argument('-A', '--no-attrs', dest='attrs',
+                            action='store_false',
+                            help="Don't compare attributes")
+        parser.add_argument('--rtol', type=_tolerance,
+                            help="Relative tolerance for numbers")
+        parser.add_argument('--atol', type=_tolerance,
+                            help="Absolute tolerance for numbers")
+        parser.add_argument('-B', '--block-size', type=parse_bytes,
+                            default=DEFAULT_BLOCK_BYTES // 4,
+                            help="Maximum bytes to read at once "
+                            "(default 16M)")
+        parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                            help="Number of blocks to compare at once")
+        parser.add_argument('-P', '--processes', action='store_true',
+                            help="Use worker processes (each opening the "
+                            "files) instead of threads")
+        parser.add_argument('first', help="First object, as [ALIAS:]PATH")
+        parser.add_argument('second', help="Second object, as [ALIAS:]PATH")
+        # Complete both as objects
+        parser.dataset = parser.group = True
+        return parser
+
+    def execute(self, state, first, second, brief, count, attrs, rtol, atol,
+                block_size, jobs, processes):
+        a = _get_object(state, first)
+        # Keep the first file open while getting the second
+        key = os.path.realpath(a.file.filename)
+        pinned = key in state.pool.pinned
+        state.pool.pinned.add(key)
+        try:
+            b = _get_object(state, second)
+            if processes:
+                if a.file.mode != 'r' or b.file.mode != 'r':
+                    raise ValueError("--processes requires read-only files")
+                sources = (a.file.filename, b.file.filename)
+            else:
+                sources = (a.file, b.file)
+            comparison = Comparison(rtol, atol, attrs, count, block_size)
+            ndiff = 0
+            with make_pool(jobs, processes) as pool:
+                for difference in comparison.compare(a, b, pool, sources,
+                                                     2 * max(1, jobs)):
+                    ndiff += 1
+                    if brief:
+                        break
+                    print(difference)
+        finally:
+            if not pinned:
+                state.pool.pinned.discard(key)
+
+        # Fail like diff(1) so that scripts can check the exit status
+        if brief and ndiff:
+            raise ValueError("{} and {} differ".format(first, second))
+        if ndiff:
+            raise ValueError("{:d} difference{} found".format(
+                ndiff, "s" if ndiff != 1 else ""))
+
+
+def _get_object(state, path):
+    try:
+        return state.get(path)
+    except KeyError:
+        raise ValueError("Nonexistent object {!r}".format(path))
+
+
+register.instance(Diff)
+
 ###############################################################################
 
 
@@ -144,3 +613,214 @@ class Attrs(Command):
 
 
 register.instance(Attrs)
+
+###############################################################################
+
+
+def _open_source(source):
+    """Open a file by name (in a worker process) or use an open file."""
+    if isinstance(source, string_types):
+        return (h5py.File(source, 'r'), True)
+    return (source, False)
+
+
+def _dataset_bytes(dset):
+    """Allocated and logical size of a dataset."""
+    shape = dset.shape
+    if shape is None:
+        # Null dataspace
+        return (0, 0)
+    logical = int(np.prod(shape, dtype=np.int64)) * dset.dtype.itemsize
+    return (dset.id.get_storage_size(), logical)
+
+
+def _subtree_usage(task):
+    """Groups and dataset sizes in a subtree.
+
+    Returns a list of absolute group paths and a list of ``(path, address,
+    allocated, logical)`` for each dataset. Each object is visited once even
+    if it has multiple hard links.
+    """
+    (source, path) = task
+    (f, close) = _open_source(source)
+    try:
+        root = f[path]
+        base = root.name.rstrip('/') + '/'
+        groups = [root.name]
+        datasets = []
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Group):
+                groups.append(base + name)
+            elif isinstance(obj, h5py.Dataset):
+                addr = h5py.h5o.get_info(obj.id).addr
+                datasets.append((base + name, addr) + _dataset_bytes(obj))
+
+        root.visititems(visit)
+        return (groups, datasets)
+    finally:
+        if close:
+            f.close()
+
+
+def _storage_sizes(task):
+    """Allocated bytes of each dataset path in a list."""
+    (source, paths) = task
+    (f, close) = _open_source(source)
+    try:
+        return [h5py.h5d.open(f.id, p.encode('utf-8')).get_storage_size()
+                for p in paths]
+    finally:
+        if close:
+            f.close()
+
+
+def _post_order_key(path):
+    # Children sort before their parent, and siblings by name
+    return [(0, c) for c in path.split('/') if c] + [(1,)]
+
+
+class DiskUsage(Command):
+    name = "du"
+
+    def build_parser(self):
+        parser = super(DiskUsage, self).build_parser(
+            description="Report the allocated (on-disk) and logical "
+            "(uncompressed) size of the datasets in each group.",
+            add_help=False)
+        parser.add_argument('--help', action='help',
+                            help="Show this help message")
+        parser.add_argument('-s', '--summarize', action='store_true',
+                            help="Display only the total for the group")
+        parser.add_argument('-h', '--human-readable', dest='human',
+                            action='store_true',
+                            help="Print sizes like 1.5K, 24M, 2.0G")
+        parser.add_argument('-d', '--max-depth', type=int, metavar='N',
+                            help="Print totals only for groups at most N "
+                            "levels below the given one")
+        parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                            help="Number of subtrees to process at once")
+        parser.add_argument('-P', '--processes', action='store_true',
+                            help="Use worker processes (each opening the "
+                            "file) instead of threads")
+        parser.add_argument('group', nargs='?')
+        return parser
+
+    def execute(self, state, summarize, human, max_depth, jobs, processes,
+                group=None):
+        path = state.cwd if group is None else abspath(group, state.cwd)
+        if processes:
+            if state.f.mode != 'r':
+                raise ValueError("--processes requires a read-only file")
+            source = state.filename
+        else:
+            source = state.f
+
+        with make_pool(jobs, processes) as pool:
+            usage = None
+            if state.index is not None:
+                usage = self._indexed_usage(state.index, path, source, pool,
+                                            jobs)
+            if usage is None:
+                usage = self._walked_usage(state, group, source, pool)
+        (root, direct) = usage
+        totals = self._roll_up(root, direct)
+
+        if summarize:
+            max_depth = 0
+        fmt = format_bytes if human else str
+        depth0 = root.rstrip('/').count('/')
+        for p in sorted(totals, key=_post_order_key):
+            if (max_depth is not None
+                    and p.rstrip('/').count('/') - depth0 > max_depth):
+                continue
+            (alloc, logical) = totals[p]
+            print("{:>8s} {:>8s}  {}".format(fmt(alloc), fmt(logical), p))
+
+    def _walked_usage(self, state, group, source, pool):
+        """Walk each child subtree of the group in parallel."""
+        if group is not None:
+            grp = subgroup(state.group, group)
+        else:
+            grp = state.group
+        root = grp.name
+        tasks = []
+        datasets = []
+        for key in grp:
+            if not isinstance(grp.get(key, getlink=True), h5py.HardLink):
+                continue
+            obj = grp[key]
+            if isinstance(obj, h5py.Group):
+                tasks.append((source, obj.name))
+            elif isinstance(obj, h5py.Dataset):
+                addr = h5py.h5o.get_info(obj.id).addr
+                datasets.append((obj.name, addr) + _dataset_bytes(obj))
+
+        direct = {root: [0, 0]}
+        for (groups, subtree) in pool.imap_unordered(_subtree_usage, tasks):
+            for p in groups:
+                direct.setdefault(p, [0, 0])
+            datasets.extend(subtree)
+
+        # Count each object once, at its first path in sorted order
+        seen = set()
+        for (p, addr, alloc, logical) in sorted(datasets):
+            if addr in seen:
+                continue
+            seen.add(addr)
+            totals = direct.setdefault(p.rpartition('/')[0] or '/', [0, 0])
+            totals[0] += alloc
+            totals[1] += logical
+        return (root, direct)
+
+    def _indexed_usage(self, index, path, source, pool, jobs):
+        """Take the hierarchy from the index and only query storage sizes."""
+        tree = index.subtree(path)
+        if tree is None:
+            return None
+        (rows, paths) = tree
+        if len(rows) and index.aliases(rows[0], rows[-1] + 1):
+            # Walks list every path of a hard-linked group
+            return None
+        root = path.rstrip('/') or '/'
+        col = index.columns
+        hard = col['link'][rows] == HARD
+        groups = np.flatnonzero(hard & (col['kind'][rows] == GROUP))
+        dsets = np.flatnonzero(hard & (col['kind'][rows] == DATASET))
+        # Count each object once, even if hard-linked at several paths
+        (_, first) = np.unique(col['addr'][rows[dsets]], return_index=True)
+        dsets = dsets[np.sort(first)]
+
+        direct = dict((str(p), [0, 0]) for p in paths[groups])
+        direct[root] = [0, 0]
+        logical = index.logical_bytes(rows[dsets])
+        paths = [str(p) for p in paths[dsets]]
+        nbatch = max(1, min(len(paths), 4 * jobs))
+        batches = [(source, paths[i::nbatch]) for i in range(nbatch)]
+        logicals = [logical[i::nbatch] for i in range(nbatch)]
+        sizes = pool.imap(_storage_sizes, batches)
+        for ((_, batch), batch_logical, batch_sizes) in zip(batches, logicals,
+                                                            sizes):
+            for (p, alloc, nbytes) in zip(batch, batch_sizes, batch_logical):
+                totals = direct[p.rpartition('/')[0] or '/']
+                totals[0] += alloc
+                totals[1] += int(nbytes)
+        return (root, direct)
+
+    @staticmethod
+    def _roll_up(root, direct):
+        """Add each group's usage to all of its ancestors."""
+        totals = dict((p, list(v)) for (p, v) in direct.items())
+        # Children are always longer than their parents
+        for p in sorted(totals, key=len, reverse=True):
+            if p == root:
+                continue
+            parent = p.rpartition('/')[0] or '/'
+            if parent in totals:
+                ptotals = totals[parent]
+                ptotals[0] += totals[p][0]
+                ptotals[1] += totals[p][1]
+        return totals
+
+
+register.instance(DiskUsage)
@@ -4,6 +4,7 @@
 
 from __future__ import (division, absolute_import, print_function, )
 #-----------------------------------------------------------------------------#
+from importlib import import_module
 import sys
 from functools import wraps
 
@@ -15,6 +16,8 @@ class CommandRegistry(object):
         if commands is None:
             commands = {}
         self.commands = commands
+        # Modules that define commands but have not been imported yet
+        self.deferred = {}
 
     def __repr__(self):
         return "CommandRegistry({!r})".format(self.commands)
@@ -32,6 +35,7 @@ class CommandRegistry(object):
                 self._add_parser_cmd(key, parser)
 
         self.commands[key] = func
+        self.deferred.pop(key, None)
 
     def _add_parser_cmd(self, name, parser):
         """Define a free function that returns a function's parser.
@@ -42,10 +46,37 @@ class CommandRegistry(object):
         attrname = "get_parser_" + name
         setattr(module, attrname, lambda: parser)
 
+    def defer(self, module, names):
+        """Import a module of commands only when one of them is first used.
+        """
+        for name in names:
+            self.deferred[name] = module
+
+    def load(self, key):
+        """Import the module that defines a deferred command."""
+        module = self.deferred.pop(key)
+        import_module(module)
+        for (name, other) in list(self.deferred.items()):
+            if other == module:
+                del self.deferred[name]
+
+    def load_all(self):
+        while self.deferred:
+            self.load(next(iter(self.deferred)))
+
     def __iter__(self):
-        return iter(self.commands)
+        return iter(sorted(set(self.commands) | set(self.deferred)))
+
+    def __contains__(self, key):
+        return key in self.commands or key in self.deferred
 
     def __getitem__(self, key):
+        try:
+            return self.commands[key]
+        except KeyError:
+            if key not in self.deferred:
+                raise
+        self.load(key)
         return self.commands[key]
 
 
@@ -90,5 +121,15 @@ class RegisterCommand(object):
 # List of commands
 COMMANDS = CommandRegistry()
 
+
+def __getattr__(name):
+    # Load deferred commands for 'sphinx-argparse' (Python 3.7+)
+    if name.startswith("get_parser_") and COMMANDS.deferred:
+        COMMANDS.load_all()
+        return getattr(sys.modules[__name__], name)
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
+
+
 # Register in the list of commands
 register = RegisterCommand(COMMANDS)
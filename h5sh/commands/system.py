@@ -4,10 +4,18 @@
 
 from __future__ import (division, absolute_import, print_function, )
 #-----------------------------------------------------------------------------#
+from argparse import REMAINDER
+from collections import OrderedDict
+import os
 import sys
 from time import time
+from timeit import default_timer
 
-from h5sh.utils import (make_column_kv_fmt, short_describe, unescape_string)
+from h5sh.metadata import (GROUP, DATASET)
+from h5sh.pool import (DEFAULT_READ_AHEAD, FILE_DRIVERS)
+from h5sh.shell import cpu_time
+from h5sh.utils import (format_bytes, make_column_kv_fmt, parse_bytes,
+                        parse_fraction, short_describe, unescape_string)
 
 from .base import Command
 from .registry import register, COMMANDS
@@ -72,6 +80,356 @@ def _help(state):
 ###############################################################################
 
 
+class Index(Command):
+    name = "index"
+
+    def build_parser(self):
+        parser = super(Index, self).build_parser(
+            description="Index the structure of the entire file so that "
+            "listings and completions no longer read from it.")
+        parser.add_argument('-d', '--drop', action='store_true',
+                            help="Discard the index and its saved copy")
+        return parser
+
+    def execute(self, state, drop):
+        if drop:
+            state.drop_index()
+            return
+
+        start = time()
+        how = state.build_index()
+        index = state.index
+        counts = index.counts()
+        print("{} index of {:d} objects ({:d} groups, {:d} datasets) in "
+              "{:.2f} s".format(how.capitalize(), len(index), counts[GROUP],
+                                counts[DATASET], time() - start))
+
+
+register.instance(Index)
+
+###############################################################################
+
+
 @register("Print the name of the file being examined")
 def filename(state):
     print(state.f.filename)
+
+###############################################################################
+
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise ValueError("Expected a positive integer, not {}".format(text))
+    return value
+
+
+def _driver(text):
+    if text not in FILE_DRIVERS:
+        raise ValueError("Expected one of {}, not {}"
+                         .format(", ".join(FILE_DRIVERS), text))
+    return text
+
+
+# Name -> (State.configure keyword, conversion, description)
+SETTINGS = OrderedDict([
+    ('cache-entries', ('cache_entries', int,
+                       "Number of group listings to cache")),
+    ('cache-size', ('cache_bytes', parse_bytes,
+                    "Memory budget for cached group listings")),
+    ('max-open-files', ('max_open_files', _positive_int,
+                        "Number of files to keep open")),
+    ('rdcc-nbytes', ('rdcc_nbytes', parse_bytes,
+                     "Raw data chunk cache size of each dataset")),
+    ('rdcc-nslots', ('rdcc_nslots', _positive_int,
+                     "Number of chunk cache hash table slots (preferably "
+                     "a prime about 100 times the number of cached chunks)")),
+    ('rdcc-w0', ('rdcc_w0', parse_fraction,
+                 "Chunk cache preemption policy: 1 evicts fully read chunks "
+                 "first")),
+    ('mdc-size', ('mdc_nbytes', parse_bytes,
+                  "Metadata cache size of each file")),
+    ('page-buffer-size', ('page_buf_size', parse_bytes,
+                          "Page buffer size for files created with paged "
+                          "aggregation")),
+    ('driver', ('driver', _driver,
+                "HDF5 file driver: 'core' reads each file into memory, "
+                "'fileobj' reads through a large Python buffer")),
+    ('read-ahead', ('read_ahead', parse_bytes,
+                    "Buffer size of the 'fileobj' driver")),
+])
+
+
+def _settings(state):
+    """Current values of the settings, formatted."""
+    fid = state.f.id
+    (_, nslots, nbytes, w0) = fid.get_access_plist().get_cache()
+    listings = state.listings
+    return OrderedDict([
+        ('cache-entries', str(listings.max_entries)),
+        ('cache-size', format_bytes(listings.max_bytes)),
+        ('max-open-files', str(state.pool.max_open)),
+        ('rdcc-nbytes', format_bytes(nbytes)),
+        ('rdcc-nslots', str(nslots)),
+        ('rdcc-w0', str(w0)),
+        ('mdc-size', format_bytes(fid.get_mdc_config().max_size)),
+        ('page-buffer-size',
+         format_bytes(state.pool.options.get('page_buf_size', 0))),
+        ('driver', state.f.driver),
+        ('read-ahead', format_bytes(state.pool.options.get(
+            'read_ahead', DEFAULT_READ_AHEAD))),
+    ])
+
+
+class Set(Command):
+    name = "set"
+
+    def build_parser(self):
+        parser = super(Set, self).build_parser(
+            description="Show or change cache settings. Sizes may have a "
+            "K, M or G suffix. Changing HDF5 chunk cache or page buffer "
+            "settings reopens the files.")
+        parser.add_argument('setting', nargs='?', choices=list(SETTINGS),
+                            help="Name of the setting")
+        parser.add_argument('value', nargs='?', help="New value")
+        return parser
+
+    def execute(self, state, setting=None, value=None):
+        if value is None:
+            current = _settings(state)
+            names = [setting] if setting is not None else list(current)
+            fmt = make_column_kv_fmt(names, sep=" = ")
+            for name in names:
+                print(fmt(name, current[name]))
+            return
+        (key, convert, _) = SETTINGS[setting]
+        state.configure(**{key: convert(value)})
+
+    def get_completions(self, document, args, state):
+        if len(args) <= 1 and not document.text.endswith(' ' * 2):
+            for name in SETTINGS:
+                yield name
+
+
+register.instance(Set)
+
+
+def _hit_rate(hits, total):
+    if not total:
+        return "no accesses"
+    return "{:.1%} hit rate".format(hits / total)
+
+
+class Cache(Command):
+    name = "cache"
+
+    def build_parser(self):
+        parser = super(Cache, self).build_parser(
+            description="Show the size and hit rate of HDF5 caches for the "
+            "current file, and of h5sh's own caches.")
+        parser.add_argument('-r', '--reset', action='store_true',
+                            help="Reset the metadata cache hit rate "
+                            "statistics afterward")
+        return parser
+
+    def execute(self, state, reset):
+        fid = state.f.id
+        rows = OrderedDict()
+
+        (max_size, _, cur_size, entries) = fid.get_mdc_size()
+        rows["Metadata cache"] = "{} of {} in {:d} entries, {:.1%} hit rate" \
+            .format(format_bytes(cur_size), format_bytes(max_size), entries,
+                    fid.get_mdc_hit_rate())
+        (_, nslots, nbytes, w0) = fid.get_access_plist().get_cache()
+        rows["Chunk cache"] = "{} per dataset, {:d} slots, w0 = {:g}".format(
+            format_bytes(nbytes), nslots, w0)
+        if state.pool.options.get('page_buf_size'):
+            try:
+                stats = fid.get_page_buffering_stats()
+            except (RuntimeError, ValueError):
+                # File isn't paged
+                rows["Page buffer"] = "not used"
+            else:
+                rows["Page buffer"] = "metadata {}, raw data {}".format(
+                    _hit_rate(stats.meta.hits, stats.meta.accesses),
+                    _hit_rate(stats.raw.hits, stats.raw.accesses))
+
+        listings = state.listings
+        rows["Group listings"] = "{:d}/{:d} entries, {} of {}, {}".format(
+            len(listings), listings.max_entries,
+            format_bytes(listings.nbytes), format_bytes(listings.max_bytes),
+            _hit_rate(listings.hits, listings.hits + listings.misses))
+        pool = state.pool
+        rows["Open files"] = "{:d}/{:d}, opened {:d} times".format(
+            len(pool), pool.max_open, pool.opens)
+
+        fmt = make_column_kv_fmt(list(rows), sep="  ")
+        for (k, v) in rows.items():
+            print(fmt(k, v))
+        if reset:
+            fid.reset_mdc_hit_rate_stats()
+
+
+register.instance(Cache)
+
+###############################################################################
+
+
+class Open(Command):
+    name = "open"
+
+    def build_parser(self):
+        parser = super(Open, self).build_parser(
+            description="Open another HDF5 file and switch to it. Objects in "
+            "any open file can be named as ALIAS:PATH.")
+        parser.add_argument('-a', '--alias',
+                            help="Name for the file (default: its base name)")
+        parser.add_argument('-m', '--mode', default='r', choices=('r', 'r+'),
+                            help="Access mode")
+        parser.add_argument('filename', help="HDF5 file")
+        return parser
+
+    def execute(self, state, filename, alias, mode):
+        try:
+            alias = state.open(filename, alias, mode)
+        except (IOError, OSError) as e:
+            raise ValueError(str(e))
+        state.use(alias)
+
+
+register.instance(Open)
+
+
+class Use(Command):
+    name = "use"
+    resolve_aliases = False
+
+    def build_parser(self):
+        parser = super(Use, self).build_parser(
+            description="Switch to another open file.")
+        parser.add_argument('alias', help="Alias of the file")
+        return parser
+
+    def execute(self, state, alias):
+        state.use(alias)
+
+    def get_completions(self, document, args, state):
+        for alias in state.sessions:
+            yield alias
+
+
+register.instance(Use)
+
+
+@register("List open files: '*' marks the file in use and '-' files "
+          "temporarily closed to stay under the open-file limit")
+def files(state):
+    fmt = make_column_kv_fmt(list(state.sessions), sep="  ")
+    for (alias, session) in state.sessions.items():
+        if alias == state.alias:
+            mark = "*"
+        elif session.filename in state.pool:
+            mark = " "
+        else:
+            mark = "-"
+        print(mark, fmt(alias, os.path.relpath(session.filename)))
+
+###############################################################################
+
+
+class _Prefix(Command):
+    """Run another command given as the remaining arguments."""
+    resolve_aliases = False
+
+    def build_parser(self, **kwargs):
+        parser = super(_Prefix, self).build_parser(**kwargs)
+        parser.add_argument('command', nargs=REMAINDER,
+                            help="Command and its arguments")
+        return parser
+
+    def lookup(self, command):
+        """Load the command to run, returning a function of the state."""
+        if not command:
+            raise ValueError("No command given")
+        try:
+            cmd = COMMANDS[command[0]]
+        except KeyError:
+            raise ValueError("{}: command not found".format(command[0]))
+        return lambda state: cmd(state, *command[1:])
+
+    def get_completions(self, document, args, state):
+        # Skip our own options
+        args = [a for a in args if not a.startswith('-')]
+        if not args or (len(args) == 1 and not document.text.endswith(' ')):
+            # Completing the command name
+            for name in COMMANDS:
+                if not name.startswith('_'):
+                    yield name
+            return
+        try:
+            get_completions = COMMANDS[args[0]].get_completions
+        except (KeyError, AttributeError):
+            return
+        for arg in get_completions(document, args[1:], state):
+            yield arg
+
+
+class Time(_Prefix):
+    name = "time"
+
+    def build_parser(self):
+        return super(Time, self).build_parser(
+            description="Run a command and print its wall-clock and CPU "
+            "time.")
+
+    def execute(self, state, command):
+        run = self.lookup(command)
+        start = (default_timer(), cpu_time())
+        try:
+            run(state)
+        finally:
+            print("real {:.3f}s  cpu {:.3f}s".format(
+                default_timer() - start[0], cpu_time() - start[1]),
+                file=sys.stderr)
+
+
+register.instance(Time)
+
+
+class Profile(_Prefix):
+    name = "profile"
+    sort_keys = ('cumulative', 'tottime', 'calls', 'name')
+
+    def build_parser(self):
+        parser = super(Profile, self).build_parser(
+            description="Run a command under cProfile and print the "
+            "functions that took the longest.")
+        parser.add_argument('-n', '--limit', type=int, default=20,
+                            help="Number of functions to print")
+        parser.add_argument('-s', '--sort', default='cumulative',
+                            choices=self.sort_keys, help="Sort order")
+        parser.add_argument('-o', '--output', metavar='FILE',
+                            help="Save the statistics to a .prof file "
+                            "instead of printing them")
+        return parser
+
+    def execute(self, state, command, limit, sort, output):
+        # Imported here so that other commands start faster
+        import cProfile
+        import pstats
+
+        run = self.lookup(command)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            run(state)
+        finally:
+            profiler.disable()
+            if output is not None:
+                profiler.dump_stats(output)
+            else:
+                stats = pstats.Stats(profiler, stream=sys.stdout)
+                stats.sort_stats(sort).print_stats(limit)
+
+
+register.instance(Profile)
@@ -4,14 +4,18 @@ from __future__ import (division, absolute_import, print_function,
                         unicode_literals)
 from six.moves import input
 #-----------------------------------------------------------------------------#
+import threading
+
 from prompt_toolkit import PromptSession
-from prompt_toolkit.completion import Completer, Completion
+from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
 from prompt_toolkit.formatted_text import FormattedText
+from prompt_toolkit.lexers import Lexer, SimpleLexer
 from prompt_toolkit.patch_stdout import patch_stdout
 from prompt_toolkit.styles import Style
 
 from .commands import COMMANDS
 from .commands.system import INTERRUPT_CMD, NULL_CMD
+from .shell import Shell
 from .styles import get_style_rules
 from .utils import shlex_split
 
@@ -27,12 +31,41 @@ def _get_console_lexer():
     return PygmentsLexer(BashLexer)
 
 
+class LazyLexer(Lexer):
+    """Highlight commands, loading pygments when the first one is typed.
+    """
+
+    def __init__(self):
+        self.lexer = None
+
+    def lex_document(self, document):
+        if self.lexer is None:
+            if not document.text:
+                # Nothing to highlight yet: don't delay the first prompt
+                return lambda lineno: []
+            self.lexer = _get_console_lexer() or SimpleLexer()
+        return self.lexer.lex_document(document)
+
+
 class CommandCompleter(Completer):
+    """Complete command names and their arguments.
+
+    Listing a large group can take a while, so the console runs this in a
+    background thread: completions are shown as the group is read, and each
+    request stops as soon as a newer one (from further typing) starts.
+    """
+
     def __init__(self, state):
         self.state = state
         self.cmd_names = sorted(k for k in COMMANDS if not k.startswith('_'))
+        # Number of the latest completion request
+        self.latest = 0
+        self._lock = threading.Lock()
 
     def get_completions(self, document, complete_event):
+        with self._lock:
+            self.latest += 1
+            request = self.latest
         preceding_word = document.get_word_before_cursor(WORD=True)
 
         if len(document.text) == len(preceding_word):
@@ -56,20 +89,21 @@ class CommandCompleter(Completer):
 
         pos = -len(preceding_word)
         for arg in completions:
+            if self.latest != request:
+                # Superseded
+                return
             if arg.startswith(preceding_word):
                 yield Completion(arg, pos)
 
 
-class Console(object):
+class Console(Shell):
     def __init__(self, state):
-        # Command-line state
-        self.state = state
-        # Debug mode
-        self.debug = False
+        super(Console, self).__init__(state)
         # Prompt session
-        self.session = PromptSession(lexer=_get_console_lexer(),
+        self.session = PromptSession(lexer=LazyLexer(),
                                      style=Style(get_style_rules()),
-                                     completer=CommandCompleter(state))
+                                     completer=ThreadedCompleter(
+                                         CommandCompleter(state)))
         # prompt_toolkit Output class
         self.output = self.session.app.output
 
@@ -103,20 +137,6 @@ class Console(object):
         while True:
             (cmd_name, args) = self.read()
             try:
-                cmd = COMMANDS[cmd_name]
-            except KeyError:
-                print("h5sh: {}: command not found".format(cmd_name))
-                continue
-
-            try:
-                cmd(self.state, *args)
+                self.execute(cmd_name, args)
             except KeyboardInterrupt:
                 INTERRUPT_CMD(self.state)
-            except Exception as e:
-                if not self.debug and isinstance(e, (TypeError, ValueError)):
-                    print("{}: {!s}".format(cmd_name, e))
-                    continue
-
-                import logging as log
-                log.exception(e)
-                continue
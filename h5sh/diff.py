@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+"""Compare HDF5 objects: metadata first, then data in chunk-aligned blocks."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from collections import namedtuple
+
+import h5py
+import numpy as np
+from six import string_types
+
+from .blocks import (DEFAULT_BLOCK_BYTES, block_shape, iter_blocks)
+from .chunks import ChunkTable
+from .parallel import (SerialPool, bounded_imap)
+from .utils import (format_shape, items)
+
+###############################################################################
+
+
+class Difference(namedtuple('Difference', ['path', 'message'])):
+    """A difference found at a path (in the first object, if it exists)."""
+
+    def __str__(self):
+        return "{}: {}".format(self.path, self.message)
+
+
+def _describe(obj):
+    if isinstance(obj, h5py.SoftLink):
+        return "soft link to {}".format(obj.path)
+    if isinstance(obj, h5py.ExternalLink):
+        return "external link to {}:{}".format(obj.filename, obj.path)
+    if isinstance(obj, h5py.Group):
+        return "group"
+    if isinstance(obj, h5py.Dataset):
+        return "dataset"
+    if isinstance(obj, h5py.Datatype):
+        return "named datatype"
+    return type(obj).__name__
+
+
+def _is_link(obj):
+    return isinstance(obj, (h5py.SoftLink, h5py.ExternalLink))
+
+
+def _same_link(a, b):
+    if isinstance(a, h5py.SoftLink) and isinstance(b, h5py.SoftLink):
+        return a.path == b.path
+    if isinstance(a, h5py.ExternalLink) and isinstance(b, h5py.ExternalLink):
+        return (a.filename, a.path) == (b.filename, b.path)
+    return False
+
+
+def equal_elements(a, b, rtol=None, atol=None):
+    """Boolean array of which elements of two arrays match.
+
+    Numbers match within the tolerances as in `numpy.isclose` if either is
+    given, and exactly otherwise; NaNs match each other.
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    numeric = a.dtype.kind in "biufc" and b.dtype.kind in "biufc"
+    if numeric and (rtol is not None or atol is not None):
+        return np.isclose(a, b, rtol=rtol or 0, atol=atol or 0,
+                          equal_nan=True)
+    shape = np.broadcast(a, b).shape
+    try:
+        same = np.asarray(a == b)
+    except (TypeError, ValueError):
+        same = None
+    if same is None or same.shape != shape:
+        # Incomparable types
+        return np.zeros(shape, dtype=bool)
+    if numeric and (a.dtype.kind in "fc" or b.dtype.kind in "fc"):
+        same |= np.isnan(a) & np.isnan(b)
+    return same
+
+
+def _same_value(a, b):
+    """Whether two attribute values are equal."""
+    try:
+        a = np.asarray(a)
+        b = np.asarray(b)
+    except (TypeError, ValueError):
+        return repr(a) == repr(b)
+    if a.shape != b.shape:
+        return False
+    try:
+        return bool(equal_elements(a, b).all())
+    except (TypeError, ValueError):
+        return repr(a) == repr(b)
+
+
+def _filters(dset):
+    dcpl = dset.id.get_create_plist()
+    return [dcpl.get_filter(i)[:3] for i in range(dcpl.get_nfilters())]
+
+
+def same_storage(a, b):
+    """Whether raw chunks of two datasets can be compared byte for byte.
+
+    Both must have the same type, chunk shape, filter pipeline and fill value
+    (which unallocated chunks read as).
+    """
+    if a.chunks is None or a.chunks != b.chunks:
+        return False
+    if a.dtype != b.dtype or a.shape != b.shape:
+        return False
+    if _filters(a) != _filters(b):
+        return False
+    return (np.asarray(a.fillvalue).tobytes()
+            == np.asarray(b.fillvalue).tobytes())
+
+###############################################################################
+# DATA
+###############################################################################
+
+
+# Files opened by worker processes, kept open between tasks
+_WORKER_FILES = {}
+
+
+def _open(source):
+    """Use an open file, or open one by name in a worker process."""
+    if not isinstance(source, string_types):
+        return source
+    try:
+        return _WORKER_FILES[source]
+    except KeyError:
+        f = _WORKER_FILES[source] = h5py.File(source, 'r')
+        return f
+
+
+def _compare_task(task):
+    """Compare blocks of two datasets.
+
+    The task holds both datasets, the tolerances, whether to count every
+    difference, and a list of (selection, chunk offset) pairs. If the chunk
+    offset is not None, the raw chunks there are compared first and the
+    values are only read if they differ.
+
+    Returns the number of differing elements (just 1 when not counting) and
+    the index and values of the first difference, if any.
+    """
+    (sources, names, rtol, atol, count, blocks) = task
+    (a, b) = [_open(s)[n] for (s, n) in zip(sources, names)]
+    ndiff = 0
+    first = None
+    for (sel, offset) in blocks:
+        if offset is not None:
+            if (a.id.read_direct_chunk(offset)
+                    == b.id.read_direct_chunk(offset)):
+                continue
+        (va, vb) = (np.asarray(a[sel]), np.asarray(b[sel]))
+        same = equal_elements(va, vb, rtol, atol)
+        if same.all():
+            continue
+        if first is None:
+            i = np.unravel_index(np.argmin(same), same.shape)
+            start = tuple(s.start for s in sel)
+            index = tuple(int(s + j) for (s, j) in zip(start, i))
+            first = (index, va[i], vb[i])
+        if not count:
+            return (1, first)
+        ndiff += same.size - int(np.count_nonzero(same))
+    return (ndiff, first)
+
+
+def _chunk_blocks(a, b, budget):
+    """Generate lists of (selection, offset) for chunks allocated in either.
+
+    Chunks allocated in both are compared raw; chunks allocated in only one
+    have to be read. Chunks allocated in neither read as the same fill value
+    and are skipped.
+    """
+    (ta, tb) = (ChunkTable.from_dataset(a), ChunkTable.from_dataset(b))
+    grid = ta.grid
+    (la, lb) = [np.ravel_multi_index(t.indices.T.astype(np.intp), grid)
+                if len(t) else np.zeros(0, np.intp) for t in (ta, tb)]
+    linear = np.union1d(la, lb)
+    raw = np.isin(linear, np.intersect1d(la, lb))
+    chunks = np.array(a.chunks)
+    offsets = np.transpose(np.unravel_index(linear, grid)) * chunks
+    per_block = max(1, budget // max(1, ta.chunk_nbytes))
+
+    blocks = []
+    for (offset, both) in zip(offsets.tolist(), raw.tolist()):
+        sel = tuple(slice(o, min(o + c, n))
+                    for (o, c, n) in zip(offset, a.chunks, a.shape))
+        blocks.append((sel, tuple(offset) if both else None))
+        if len(blocks) >= per_block:
+            yield blocks
+            blocks = []
+    if blocks:
+        yield blocks
+
+
+def _value_blocks(a, budget):
+    itemsize = max(a.dtype.itemsize, 1)
+    block = block_shape(a.shape, a.chunks, itemsize, budget)
+    for sel in iter_blocks(a.shape, block):
+        yield [(sel, None)]
+
+###############################################################################
+# COMPARISON
+###############################################################################
+
+
+class Comparison(object):
+    """Compare two HDF5 objects and, for groups, all their members.
+
+    `compare` first walks both objects comparing kinds, links, shapes, types
+    and attributes, then compares the data of datasets that can be compared
+    in blocks of at most `block_size` bytes, which are read (and raw chunks
+    compared) in parallel by a worker pool.
+
+    Unless `count` is set, reading a dataset stops at its first difference.
+    """
+
+    def __init__(self, rtol=None, atol=None, attrs=True, count=False,
+                 block_size=DEFAULT_BLOCK_BYTES):
+        self.rtol = rtol
+        self.atol = atol
+        self.attrs = attrs
+        self.count = count
+        self.block_size = block_size
+
+    def compare(self, a, b, pool=None, sources=None, max_pending=2):
+        """Generate the differences between two objects.
+
+        `sources` are how workers get each file: the open files by default,
+        or their names for process pools.
+        """
+        if pool is None:
+            pool = SerialPool()
+        if sources is None:
+            sources = (a.file, b.file)
+        pairs = []
+        for difference in self.metadata(a, b, pairs):
+            yield difference
+        for (name_a, name_b) in pairs:
+            for difference in self.data(a.file[name_a], b.file[name_b],
+                                        pool, sources, max_pending):
+                yield difference
+
+    def metadata(self, a, b, pairs, visited=None):
+        """Generate metadata differences, appending datasets to compare.
+        """
+        if visited is None:
+            visited = set()
+        if type(a) is not type(b):
+            yield Difference(a.name, "{} != {}".format(_describe(a),
+                                                       _describe(b)))
+            return
+        if self.attrs:
+            for difference in self._attrs(a, b):
+                yield difference
+        if isinstance(a, h5py.Group):
+            if (a.id, b.id) in visited:
+                # Already compared through another hard link
+                return
+            visited.add((a.id, b.id))
+            for difference in self._members(a, b, pairs, visited):
+                yield difference
+        elif isinstance(a, h5py.Datatype):
+            if a.dtype != b.dtype:
+                yield Difference(a.name, "type {} != {}".format(a.dtype,
+                                                                b.dtype))
+        elif isinstance(a, h5py.Dataset):
+            for difference in self._dataset(a, b, pairs):
+                yield difference
+
+    def data(self, a, b, pool, sources, max_pending=2):
+        """Generate the difference, if any, between data of two datasets."""
+        if same_storage(a, b):
+            blocks = _chunk_blocks(a, b, self.block_size)
+        else:
+            blocks = _value_blocks(a, self.block_size)
+        tasks = ((sources, (a.name, b.name), self.rtol, self.atol,
+                  self.count, block) for block in blocks)
+
+        ndiff = 0
+        first = None
+        for (n, found) in bounded_imap(pool, _compare_task, tasks,
+                                       max_pending):
+            ndiff += n
+            if first is None:
+                first = found
+            if n and not self.count:
+                break
+        if not ndiff:
+            return
+
+        (index, va, vb) = first
+        where = " at [{}]".format(", ".join(str(i) for i in index)) \
+            if index else ""
+        if self.count:
+            message = "{:d} of {:d} elements differ, first{}: {} != {}" \
+                .format(ndiff, a.size, where, va, vb)
+        else:
+            message = "data differ{}: {} != {}".format(where, va, vb)
+        yield Difference(a.name, message)
+
+    def _attrs(self, a, b):
+        (names_a, names_b) = (set(a.attrs), set(b.attrs))
+        for name in sorted(names_a | names_b):
+            if name not in names_b:
+                message = "attribute '{}' only in first"
+            elif name not in names_a:
+                message = "attribute '{}' only in second"
+            elif _same_value(a.attrs[name], b.attrs[name]):
+                continue
+            else:
+                message = "attribute '{}' differs"
+            yield Difference(a.name, message.format(name))
+
+    def _members(self, a, b, pairs, visited):
+        members_a = dict(items(a))
+        members_b = dict(items(b))
+        for name in sorted(set(members_a) | set(members_b)):
+            if name not in members_b:
+                yield Difference(_join(a.name, name), "only in first")
+                continue
+            if name not in members_a:
+                yield Difference(_join(b.name, name), "only in second")
+                continue
+            (ma, mb) = (members_a[name], members_b[name])
+            if _is_link(ma) or _is_link(mb):
+                # Links are compared, not followed
+                if not _same_link(ma, mb):
+                    yield Difference(_join(a.name, name), "{} != {}".format(
+                        _describe(ma), _describe(mb)))
+                continue
+            for difference in self.metadata(ma, mb, pairs, visited):
+                yield difference
+
+    def _dataset(self, a, b, pairs):
+        if a.shape != b.shape:
+            yield Difference(a.name, "shape {} != {}".format(
+                format_shape(a.shape), format_shape(b.shape)))
+            return
+        comparable = True
+        if a.dtype != b.dtype:
+            yield Difference(a.name, "type {} != {}".format(a.dtype, b.dtype))
+            # Numbers of different types can still be compared
+            comparable = (a.dtype.kind in "biufc" and b.dtype.kind in "biufc")
+        if comparable and a.shape is not None:
+            pairs.append((a.name, b.name))
+
+
+def _join(path, name):
+    return path.rstrip('/') + '/' + name
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""Stream datasets to binary files."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import h5py
+import numpy as np
+
+from .blocks import (DEFAULT_BLOCK_BYTES, dataset_blocks)
+from .selection import DatasetView
+
+FORMATS = ("npy", "raw")
+
+###############################################################################
+
+
+def _check_dtype(dt):
+    if (dt.hasobject or h5py.check_vlen_dtype(dt) is not None
+            or h5py.check_string_dtype(dt) is not None
+            and h5py.check_string_dtype(dt).length is None):
+        raise ValueError("Cannot export variable-length data of type {}"
+                         .format(dt))
+
+
+def open_output(filename, fmt, dtype, shape):
+    """Create a writable memory map for a binary file.
+
+    Returns None for an empty raw file, which cannot be memory-mapped.
+    """
+    if fmt == "npy":
+        return np.lib.format.open_memmap(filename, mode='w+', dtype=dtype,
+                                         shape=shape)
+    if fmt == "raw":
+        dtype = dtype.newbyteorder('<')
+        if not int(np.prod(shape, dtype=np.int64)):
+            open(filename, 'wb').close()
+            return None
+        return np.memmap(filename, mode='w+', dtype=dtype, shape=shape)
+    raise ValueError("Unknown export format {!r}: choose from {}"
+                     .format(fmt, ", ".join(FORMATS)))
+
+
+def export(data, filename, fmt="npy", budget=DEFAULT_BLOCK_BYTES):
+    """Write a dataset (or `DatasetView`) to a binary file.
+
+    With the "npy" format the file has a standard NumPy header; "raw" files
+    are the bare little-endian values in C order. The data is read in
+    chunk-aligned blocks of at most `budget` bytes directly into a memory map
+    of the output, so memory use does not grow with the dataset size.
+    """
+    _check_dtype(data.dtype)
+    if isinstance(data, DatasetView):
+        (dataset, compose) = (data.dataset, data.compose)
+    else:
+        (dataset, compose) = (data, lambda sel: sel)
+
+    out = open_output(filename, fmt, data.dtype, data.shape)
+    if out is None:
+        return
+    try:
+        for sel in dataset_blocks(data, budget):
+            dataset.read_direct(out, compose(sel), sel)
+        out.flush()
+    finally:
+        del out
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""Copy parts of an HDF5 file into another with native object copies."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import os
+import posixpath
+
+import h5py
+
+###############################################################################
+
+
+def covering_paths(paths):
+    """Sorted absolute paths, without any that are below another.
+
+    Copying a group copies everything below it, so its descendants need no
+    copies of their own.
+    """
+    kept = []
+    for path in sorted(set(paths), key=lambda p: p.split('/')):
+        if path == '/':
+            return ['/']
+        if kept and (path + '/').startswith(kept[-1].rstrip('/') + '/'):
+            continue
+        kept.append(path)
+    return kept
+
+
+def _targets(src, paths):
+    """Expand the root group into its members."""
+    for path in paths:
+        if path == '/':
+            for name in src:
+                yield '/' + name
+        else:
+            yield path
+
+
+def copy_objects(src, paths, dst, shallow=False, expand_soft=False,
+                 expand_external=False, link=False):
+    """Copy objects of an open file into an open writable file.
+
+    Objects keep their absolute paths; groups above them are created as
+    needed, without attributes. Objects are copied by HDF5 itself, so data
+    is never converted or even decompressed.
+
+    - `shallow`: copy only the immediate members of groups
+    - `expand_soft`: copy the targets of soft links instead of the links
+    - `expand_external`: likewise for external links
+    - `link`: create external links to the objects instead of copying them
+
+    Raises ValueError, before copying anything, if an object already exists
+    in the destination. Returns the copied paths.
+    """
+    paths = covering_paths(paths)
+    targets = list(_targets(src, paths))
+    existing = [p for p in targets if p in dst]
+    if existing:
+        raise ValueError("Already in {}: {}".format(dst.filename,
+                                                    ", ".join(existing)))
+
+    if '/' in paths:
+        for (key, value) in src.attrs.items():
+            dst.attrs[key] = value
+    filename = os.path.realpath(src.filename)
+    for path in targets:
+        (parent, name) = posixpath.split(path)
+        group = dst.require_group(parent)
+        if link:
+            group[name] = h5py.ExternalLink(filename, path)
+            continue
+        source = src.get(path, getlink=True)
+        if isinstance(source, h5py.SoftLink) and not expand_soft:
+            group[name] = h5py.SoftLink(source.path)
+        elif isinstance(source, h5py.ExternalLink) and not expand_external:
+            group[name] = h5py.ExternalLink(source.filename, source.path)
+        else:
+            src.copy(path, group, name=name, shallow=shallow,
+                     expand_soft=expand_soft,
+                     expand_external=expand_external)
+    return targets
@@ -0,0 +1,600 @@
+# -*- coding: utf-8 -*-
+
+"""File-wide structure index.
+
+The index is built with a single walk over the file and stores the metadata of
+every link in array-backed columns, sorted by path. Since all paths below a
+group share a common prefix, the descendants of any group occupy a contiguous
+range of rows that is found by binary search.
+
+Strings are stored as offsets into one UTF-8 buffer per column rather than as
+fixed-width numpy strings, which are as wide as the longest value: a single
+long compound datatype would otherwise multiply the size of every row.
+Datatypes and filter pipelines, which repeat across most datasets, are stored
+once each and referenced by an integer code.
+"""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import os
+
+import h5py
+import numpy as np
+
+from .metadata import (Metadata, kind_of, dtype_to_spec, dtype_from_spec,
+                       object_signature, GROUP, DATASET, UNKNOWN, HARD, SOFT)
+from .utils import abspath
+
+###############################################################################
+
+
+def join_path(base, name):
+    """Join a group path and a member name."""
+    if base == '/':
+        return '/' + name
+    return base + '/' + name
+
+
+def _encode(name):
+    return name.encode('utf-8') if not isinstance(name, bytes) else name
+
+
+def walk(group, previous=None):
+    """Generate `Metadata` for a group and everything below it.
+
+    Each group's members are generated before descending into its subgroups,
+    so the first results are available immediately. Soft and external links
+    are not followed. A group that is reachable through more than one hard
+    link is only descended into once; later occurrences have their ``target``
+    set to the path of the first.
+
+    If a `previous` index of the same file is given, objects whose header
+    address and signature are unchanged reuse its records rather than being
+    fully reread; only dataset extents and group sizes are refreshed.
+    """
+    root = group.name
+    seen = {h5py.h5o.get_info(group.id).addr: root}
+    yield Metadata.from_object(root, group)
+
+    stack = [(root, group)]
+    while stack:
+        (base, grp) = stack.pop()
+        subgroups = []
+        for name in grp:
+            path = join_path(base, name)
+            link = grp.get(name, getlink=True)
+            if not isinstance(link, h5py.HardLink):
+                cls = grp.get(name, getclass=True)
+                kind = kind_of(cls) if cls is not None else UNKNOWN
+                yield Metadata.from_object(path, link, kind=kind)
+                continue
+
+            info = h5py.h5o.get_info(grp.id, _encode(name))
+            meta = None
+            if previous is not None:
+                meta = previous._reuse(path, info)
+            if meta is None or meta.kind == GROUP:
+                obj = grp[name]
+            if meta is None:
+                meta = Metadata.from_object(path, obj, info=info)
+            elif meta.kind == GROUP:
+                meta = meta._replace(nchildren=len(obj))
+            elif meta.kind == DATASET:
+                dset = h5py.h5d.open(grp.id, _encode(name))
+                meta = meta._replace(shape=dset.shape)
+
+            if meta.kind == GROUP:
+                if info.addr in seen:
+                    meta = meta._replace(target=seen[info.addr])
+                else:
+                    seen[info.addr] = path
+                    meta = meta._replace(target=None)
+                    subgroups.append((path, obj))
+            yield meta
+        stack.extend(reversed(subgroups))
+
+
+COLUMNS = ('depth', 'kind', 'link', 'dtype', 'ndim', 'shape_offsets', 'shape',
+           'chunks', 'filters', 'attr_offsets', 'nchildren', 'addr',
+           'signature')
+STRING_COLUMNS = ('path', 'dtype_specs', 'filter_specs', 'attrs', 'target',
+                  'filename')
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _object_array(values):
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def _codes(values):
+    """Table of unique strings and the code of each value in it."""
+    table = {}
+    codes = np.array([table.setdefault(v, len(table)) for v in values],
+                     dtype=np.int32)
+    return (StringColumn.from_strings(list(table)), codes)
+
+###############################################################################
+
+
+class StringColumn(object):
+    """Sequence of strings stored in a single UTF-8 buffer.
+
+    String ``i`` is ``data[offsets[i]:offsets[i + 1]]``. Indexing with an
+    integer gives a native string, and with a slice or an array of rows an
+    object array of them. Since UTF-8 preserves code point order, a sorted
+    column can be searched without decoding more than a few entries.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        # Slicing a memoryview is several times faster than slicing an array
+        self._view = memoryview(data)
+
+    @classmethod
+    def from_strings(cls, values):
+        encoded = [v.encode('utf-8') for v in values]
+        return cls(_offsets([len(b) for b in encoded]),
+                   np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def save(self, prefix):
+        np.save(prefix + ".offsets.npy", self.offsets, allow_pickle=False)
+        np.save(prefix + ".utf8.npy", self.data, allow_pickle=False)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        return cls(*(np.load(prefix + suffix, mmap_mode=mmap_mode,
+                             allow_pickle=False)
+                     for suffix in (".offsets.npy", ".utf8.npy")))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def _bytes(self, row):
+        offsets = self.offsets
+        return bytes(self._view[offsets[row]:offsets[row + 1]])
+
+    def __getitem__(self, key):
+        offsets = self.offsets
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(offsets) - 1
+            if not 0 <= key < len(offsets) - 1:
+                raise IndexError(key)
+            return str(self._view[offsets[key]:offsets[key + 1]], 'utf-8')
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(len(self))
+            if step == 1:
+                # Decode the whole range with a single read
+                offsets = offsets[start:max(start, stop) + 1]
+                text = bytes(self._view[offsets[0]:offsets[-1]])
+                bounds = (offsets - offsets[0]).tolist()
+                return _object_array([text[a:b].decode('utf-8') for (a, b)
+                                      in zip(bounds[:-1], bounds[1:])])
+            key = np.arange(start, stop, step)
+        rows = np.asarray(key)
+        if rows.dtype == np.bool_:
+            rows = np.flatnonzero(rows)
+        return _object_array([self._bytes(r).decode('utf-8') for r in rows])
+
+    def searchsorted(self, value, side='left'):
+        """Row at which to insert a string to keep a sorted column sorted."""
+        key = value.encode('utf-8')
+        (lo, hi) = (0, len(self))
+        while lo < hi:
+            mid = (lo + hi) // 2
+            item = self._bytes(mid)
+            if item < key or (side == 'right' and item == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def nonempty(self, lo, hi):
+        """Boolean mask of the non-empty strings in a range of rows."""
+        return np.diff(self.offsets[lo:hi + 1]) > 0
+
+###############################################################################
+
+
+class StructureIndex(object):
+    """Metadata for every object in a file, in compact sorted columns.
+
+    Columns (one row per link, sorted by path unless noted):
+
+    ``path``, ``depth``, ``kind``, ``link``
+        Absolute path, number of path components, object kind, link kind.
+    ``dtype``, ``dtype_specs``
+        Code of each datatype in the table of distinct datatype spec strings
+        (see `dtype_to_spec`); the spec is empty if not applicable.
+    ``ndim``, ``shape_offsets``, ``shape``, ``chunks``
+        Dataset rank (-1 if not a dataset) and the concatenated dimensions of
+        all datasets; chunk dimensions are zero for contiguous datasets.
+    ``filters``, ``filter_specs``
+        Code of each comma-separated filter pipeline in a table of them.
+    ``attr_offsets``, ``attrs``
+        Concatenated attribute names of every object.
+    ``target``, ``filename``
+        Link targets, or the original path of a hard-linked group.
+    ``nchildren``
+        Number of members of a group (-1 if not a group).
+    ``addr``, ``signature``
+        Object header address and `object_signature` for detecting changes.
+
+    String columns are `StringColumn` instances and every other column is a
+    plain numpy array, so an index can be saved as a directory of ``.npy``
+    files and loaded back with memory mapping.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.paths = columns['path']
+        self._dtypes = {}
+        self._pipelines = {}
+        self._rows = None
+
+    @classmethod
+    def build(cls, group, previous=None):
+        """Walk the hierarchy below a group (usually the file itself).
+
+        If an outdated index of the same file is given, unchanged objects are
+        not reread.
+        """
+        return cls.from_metadata(walk(group, previous))
+
+    def save(self, dirname):
+        """Write each column to ``.npy`` files in the given directory."""
+        for name in COLUMNS:
+            np.save(os.path.join(dirname, name + ".npy"), self.columns[name],
+                    allow_pickle=False)
+        for name in STRING_COLUMNS:
+            self.columns[name].save(os.path.join(dirname, name))
+
+    @classmethod
+    def load(cls, dirname, mmap_mode='r'):
+        """Load an index written by `save`, memory-mapped by default."""
+        columns = {}
+        for name in COLUMNS:
+            columns[name] = np.load(os.path.join(dirname, name + ".npy"),
+                                    mmap_mode=mmap_mode, allow_pickle=False)
+        for name in STRING_COLUMNS:
+            columns[name] = StringColumn.load(os.path.join(dirname, name),
+                                              mmap_mode=mmap_mode)
+        return cls(columns)
+
+    @classmethod
+    def from_metadata(cls, records):
+        """Build the index from an iterable of `Metadata`."""
+        rows = sorted(records, key=lambda m: m.path)
+
+        def column(attr, dtype):
+            return np.array([getattr(m, attr) for m in rows], dtype=dtype)
+
+        def optional(attr, missing, dtype):
+            values = [getattr(m, attr) for m in rows]
+            return np.array([missing if v is None else v for v in values],
+                            dtype=dtype)
+
+        shapes = [m.shape if m.shape is not None else () for m in rows]
+        chunks = [m.chunks or (0,) * len(s) for (m, s) in zip(rows, shapes)]
+        attrs = [m.attrs for m in rows]
+        flat_dims = [d for s in shapes for d in s]
+        flat_chunks = [d for c in chunks for d in c]
+        (dtype_specs, dtypes) = _codes(dtype_to_spec(m.dtype) for m in rows)
+        (filter_specs, filters) = _codes(",".join(m.filters) for m in rows)
+
+        columns = {
+            'path': StringColumn.from_strings([m.path for m in rows]),
+            'depth': np.array([m.path.count('/') if m.path != '/' else 0
+                               for m in rows], dtype=np.uint16),
+            'kind': column('kind', np.uint8),
+            'link': column('link', np.uint8),
+            'dtype': dtypes,
+            'dtype_specs': dtype_specs,
+            'ndim': np.array([len(m.shape) if m.shape is not None else -1
+                              for m in rows], dtype=np.int8),
+            'shape_offsets': _offsets([len(s) for s in shapes]),
+            'shape': np.array(flat_dims, dtype=np.int64),
+            'chunks': np.array(flat_chunks, dtype=np.int64),
+            'filters': filters,
+            'filter_specs': filter_specs,
+            'attr_offsets': _offsets([len(a) for a in attrs]),
+            'attrs': StringColumn.from_strings(
+                [a for names in attrs for a in names]),
+            'target': StringColumn.from_strings([m.target or ''
+                                                 for m in rows]),
+            'filename': StringColumn.from_strings([m.filename or ''
+                                                   for m in rows]),
+            'nchildren': optional('nchildren', -1, np.int64),
+            'addr': column('addr', np.uint64),
+            'signature': column('signature', np.int64),
+        }
+        return cls(columns)
+
+    def __repr__(self):
+        return "{}({:d} entries)".format(type(self).__name__, len(self))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path):
+        return self.find(path) >= 0
+
+    def __getitem__(self, path):
+        row = self.find(path)
+        if row < 0:
+            raise KeyError(path)
+        return self.entry(row)
+
+    def get(self, path, default=None):
+        row = self.find(path)
+        if row < 0:
+            return default
+        return self.entry(row)
+
+    def counts(self):
+        """Number of entries of each object kind."""
+        return np.bincount(self.columns['kind'], minlength=UNKNOWN + 1)
+
+    def _dtype(self, code):
+        try:
+            return self._dtypes[code]
+        except KeyError:
+            spec = self.columns['dtype_specs'][code]
+            dt = self._dtypes[code] = dtype_from_spec(spec)
+            return dt
+
+    def _filters(self, code):
+        try:
+            return self._pipelines[code]
+        except KeyError:
+            spec = self.columns['filter_specs'][code]
+            filters = tuple(spec.split(",")) if spec else ()
+            self._pipelines[code] = filters
+            return filters
+
+    def entry(self, row, path=None):
+        """Reconstruct the `Metadata` of the given row, optionally at another
+        path (see `subtree`).
+        """
+        col = self.columns
+        ndim = int(col['ndim'][row])
+        if ndim >= 0:
+            start = col['shape_offsets'][row]
+            shape = tuple(int(d) for d in col['shape'][start:start + ndim])
+            chunks = tuple(int(d) for d in col['chunks'][start:start + ndim])
+            if not any(chunks):
+                chunks = None
+        else:
+            shape = chunks = None
+        (astart, astop) = col['attr_offsets'][row:row + 2]
+        nchildren = int(col['nchildren'][row])
+        return Metadata(
+            path=self.paths[row] if path is None else path,
+            kind=int(col['kind'][row]),
+            link=int(col['link'][row]),
+            dtype=self._dtype(int(col['dtype'][row])),
+            shape=shape,
+            chunks=chunks,
+            filters=self._filters(int(col['filters'][row])),
+            attrs=tuple(col['attrs'][astart:astop]) if astop > astart else (),
+            target=col['target'][row] or None,
+            filename=col['filename'][row] or None,
+            nchildren=nchildren if nchildren >= 0 else None,
+            addr=int(col['addr'][row]),
+            signature=int(col['signature'][row]))
+
+    def _reuse(self, path, info):
+        """Metadata of a path if its object header is unchanged."""
+        if self._rows is None:
+            # Every path is looked up when refreshing, so hash them all
+            self._rows = dict((p, r) for (r, p) in enumerate(self.paths))
+        row = self._rows.get(path, -1)
+        if row < 0:
+            return None
+        col = self.columns
+        if (col['link'][row] != HARD or col['addr'][row] != info.addr
+                or col['signature'][row] != object_signature(info)):
+            return None
+        return self.entry(row)
+
+    def _exact(self, path):
+        paths = self.paths
+        row = paths.searchsorted(path)
+        if row < len(paths) and paths[row] == path:
+            return row
+        return -1
+
+    def find(self, path):
+        """Row of an absolute path, or -1 if it is not in the index.
+
+        Hard-linked groups and soft links to groups in the middle of the path
+        are resolved.
+        """
+        path = path.rstrip('/') or '/'
+        for _ in range(32):
+            row = self._exact(path)
+            if row >= 0:
+                return row
+            # Resolve the deepest aliased ancestor and try again
+            parts = path.split('/')
+            for i in range(len(parts) - 1, 1, -1):
+                parent = '/'.join(parts[:i])
+                prow = self._exact(parent)
+                if prow < 0:
+                    continue
+                target = self._group_target(prow, parent)
+                if target is None:
+                    return -1
+                path = '/'.join([target.rstrip('/')] + parts[i:])
+                break
+            else:
+                return -1
+        return -1
+
+    def _group_target(self, row, path):
+        """Path that a group alias or soft link to a group points to."""
+        col = self.columns
+        target = col['target'][row]
+        if not target or col['kind'][row] != GROUP:
+            return None
+        link = col['link'][row]
+        if link == HARD:
+            return target
+        if link == SOFT:
+            return abspath(target, path.rpartition('/')[0] or '/')
+        return None
+
+    def _prefix_range(self, path):
+        """Rows of all descendants of a path."""
+        prefix = path if path == '/' else path + '/'
+        # The root path sorts before its descendants, and '0' immediately
+        # follows '/' in sort order
+        lo = self.paths.searchsorted(prefix, side='right')
+        hi = self.paths.searchsorted(prefix[:-1] + '0')
+        return (lo, hi)
+
+    def resolve_group(self, path):
+        """Row and canonical path of a group, following aliases.
+
+        Returns ``(-1, None)`` if the path is not an indexed group.
+        """
+        row = self.find(path)
+        if row < 0:
+            return (-1, None)
+        path = self.paths[row]
+        target = self._group_target(row, path)
+        if target is not None:
+            row = self.find(target)
+            path = self.paths[row] if row >= 0 else None
+        if row < 0 or self.columns['kind'][row] != GROUP:
+            return (-1, None)
+        return (row, path)
+
+    def logical_bytes(self, rows):
+        """Logical size in bytes of the datasets in the given rows."""
+        col = self.columns
+        ndim = col['ndim'][rows]
+        starts = col['shape_offsets'][rows]
+        sizes = np.where(ndim >= 0, 1, 0).astype(np.int64)
+        for k in range(int(ndim.max()) if len(rows) else 0):
+            has_dim = ndim > k
+            sizes[has_dim] *= col['shape'][starts[has_dim] + k]
+        (codes, inverse) = np.unique(col['dtype'][rows], return_inverse=True)
+        itemsizes = np.array([self._dtype(int(code)).itemsize
+                              if col['dtype_specs'][code] else 0
+                              for code in codes], dtype=np.int64)
+        return sizes * itemsizes[inverse]
+
+    def descendant_rows(self, path):
+        """Array of rows below a group, or None if it is not an indexed group.
+        """
+        (row, path) = self.resolve_group(path)
+        if row < 0:
+            return None
+        (lo, hi) = self._prefix_range(path)
+        return np.arange(lo, hi)
+
+    def subtree(self, path):
+        """Rows below a group and their paths, as a `walk` from it gives them.
+
+        A group reached through a soft link or a later hard link has the rows
+        of its first path, which are moved under the requested one. Returns
+        ``(rows, paths)``, or None if the path is not an indexed group or if
+        the walk would differ: hard-linked groups are only descended into at
+        their first path in the whole file, which may be outside the group.
+        """
+        path = path.rstrip('/') or '/'
+        (row, canonical) = self.resolve_group(path)
+        if row < 0:
+            return None
+        (lo, hi) = self._prefix_range(canonical)
+        targets = self.aliases(lo, hi)
+        if len(targets):
+            if path != canonical:
+                return None
+            prefix = canonical.rstrip('/') + '/'
+            if not all(t == canonical or t.startswith(prefix)
+                       for t in targets):
+                return None
+        paths = self.paths[lo:hi]
+        if path != canonical:
+            start = len(canonical)
+            paths = _object_array([path + p[start:] for p in paths])
+        return (np.arange(lo, hi), paths)
+
+    def aliases(self, lo, hi):
+        """Targets of the hard-linked group aliases in a range of rows."""
+        col = self.columns
+        rows = lo + np.flatnonzero((col['link'][lo:hi] == HARD)
+                                   & col['target'].nonempty(lo, hi))
+        return list(col['target'][rows])
+
+    def child_rows(self, path):
+        """Array of rows directly inside a group, in name order.
+        """
+        (row, path) = self.resolve_group(path)
+        if row < 0:
+            return None
+        (lo, hi) = self._prefix_range(path)
+        depth = self.columns['depth']
+        return lo + np.flatnonzero(depth[lo:hi] == depth[row] + 1)
+
+    def children(self, path):
+        """List of `Metadata` for the members of a group, in name order."""
+        rows = self.child_rows(path)
+        if rows is None:
+            return None
+        return [self.entry(r) for r in rows]
+
+    def complete(self, path, limit=None):
+        """Members of a group whose names start with a prefix.
+
+        Everything after the last '/' of the absolute `path` is the prefix
+        and everything before it the group. Returns up to `limit` pairs of
+        (name, is_group) in name order, or None if the group is not indexed.
+        Only rows that share the prefix are examined, so completion stays
+        fast in groups with millions of members.
+        """
+        (parent, _, partial) = path.rpartition('/')
+        (row, parent) = self.resolve_group(parent or '/')
+        if row < 0:
+            return None
+        prefix = join_path(parent, partial)
+        lo = self.paths.searchsorted(prefix)
+        # Paths starting with the prefix sort before it followed by the
+        # largest code point
+        hi = self.paths.searchsorted(prefix + u'\U0010ffff')
+        depth = self.columns['depth']
+        rows = lo + np.flatnonzero(depth[lo:hi] == depth[row] + 1)
+        if limit is not None:
+            rows = rows[:limit]
+        kinds = self.columns['kind'][rows]
+        return [(p.rpartition('/')[2], k == GROUP)
+                for (p, k) in zip(self.paths[rows], kinds)
+                if k in (GROUP, DATASET)]
+
+    def classify(self, path):
+        """Names of the (subgroups, datasets) of a group, like `State`.
+
+        Links are classified by the kind of object they resolve to.
+        """
+        rows = self.child_rows(path)
+        if rows is None:
+            return None
+        kinds = self.columns['kind'][rows]
+        names = [p.rpartition('/')[2] for p in self.paths[rows]]
+        groups = [n for (n, k) in zip(names, kinds) if k == GROUP]
+        datasets = [n for (n, k) in zip(names, kinds) if k == DATASET]
+        return (groups, datasets)
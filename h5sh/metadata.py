@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+"""Lightweight metadata records for HDF5 objects."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from ast import literal_eval
+from collections import namedtuple
+
+import h5py
+import numpy as np
+
+###############################################################################
+# OBJECT AND LINK KINDS
+###############################################################################
+
+# Object kinds
+GROUP = 0
+DATASET = 1
+DATATYPE = 2
+UNKNOWN = 3  # dangling link or unreadable object
+
+KIND_NAMES = ("group", "dataset", "datatype", "unknown")
+
+# Link kinds
+HARD = 0
+SOFT = 1
+EXTERNAL = 2
+
+LINK_NAMES = ("hard", "soft", "external")
+
+_CLASS_KINDS = ((h5py.Group, GROUP), (h5py.Dataset, DATASET),
+                (h5py.Datatype, DATATYPE))
+
+
+def kind_of(cls_or_obj):
+    """Object kind for an h5py class or instance."""
+    cls = cls_or_obj if isinstance(cls_or_obj, type) else type(cls_or_obj)
+    for (base, kind) in _CLASS_KINDS:
+        if issubclass(cls, base):
+            return kind
+    return UNKNOWN
+
+###############################################################################
+# DATATYPE SERIALIZATION
+###############################################################################
+
+
+def dtype_to_spec(dt):
+    """Convert a datatype to a string from which it can be rebuilt.
+    """
+    if dt is None:
+        return ''
+    string_info = h5py.check_string_dtype(dt)
+    if string_info is not None and string_info.length is None:
+        return "vlen:" + string_info.encoding
+    if dt.names or dt.subdtype:
+        return repr(dt.descr)
+    return dt.str
+
+
+def dtype_from_spec(spec):
+    """Rebuild a datatype from `dtype_to_spec`.
+    """
+    if not spec:
+        return None
+    if spec.startswith("vlen:"):
+        return h5py.string_dtype(spec[5:])
+    if spec.startswith("["):
+        return np.dtype(literal_eval(spec))
+    return np.dtype(spec)
+
+
+def filter_names(dset):
+    """Names of the filters in a chunked dataset's pipeline.
+    """
+    dcpl = dset.id.get_create_plist()
+    names = []
+    for i in range(dcpl.get_nfilters()):
+        name = dcpl.get_filter(i)[3]
+        if isinstance(name, bytes):
+            name = name.decode('ascii', 'replace')
+        names.append(name)
+    return tuple(names)
+
+
+def object_signature(info):
+    """Summarize an object header from `h5py.h5o.get_info` as an integer.
+
+    The signature changes when attributes are added or removed, when the
+    object's header messages change, or when the object's modification time
+    changes (if times are tracked). It does *not* change when a dataset
+    without time tracking is resized.
+    """
+    hdr = info.hdr
+    return hash((info.num_attrs, hdr.nmesgs, hdr.space.mesg, info.mtime))
+
+###############################################################################
+# METADATA RECORD
+###############################################################################
+
+
+_Metadata = namedtuple('_Metadata', [
+    'path', 'kind', 'link', 'dtype', 'shape', 'chunks', 'filters', 'attrs',
+    'target', 'filename', 'nchildren', 'addr', 'signature'])
+
+
+class Metadata(_Metadata):
+    """Summary of an HDF5 link and the object it points to.
+
+    Fields that do not apply to the object (e.g. ``shape`` for a group) are
+    ``None``. For a soft link, ``target`` is the linked path; for an external
+    link, ``filename`` is also set. For a hard link to a group that was already
+    recorded under a different path, ``target`` is that path. The object
+    header ``addr`` and its `object_signature` are zero for soft and external
+    links.
+    """
+    __slots__ = ()
+
+    @property
+    def name(self):
+        """Last component of the path."""
+        return self.path.rpartition('/')[2] or '/'
+
+    @property
+    def is_group(self):
+        return self.kind == GROUP
+
+    @property
+    def is_dataset(self):
+        return self.kind == DATASET
+
+    @property
+    def nbytes(self):
+        """Logical size of a dataset in bytes."""
+        if self.shape is None:
+            return 0
+        return int(np.prod(self.shape, dtype=np.int64)) * self.dtype.itemsize
+
+    @classmethod
+    def from_object(cls, path, obj, link=None, kind=None, info=None):
+        """Summarize an h5py object or link.
+
+        If `obj` is a soft or external link, `kind` should be the kind of the
+        object it resolves to. Otherwise the object header `info` is looked
+        up if not given.
+        """
+        if isinstance(obj, h5py.SoftLink):
+            return cls(path, UNKNOWN if kind is None else kind, SOFT,
+                       None, None, None, (), (), obj.path, None, None, 0, 0)
+        if isinstance(obj, h5py.ExternalLink):
+            return cls(path, UNKNOWN if kind is None else kind, EXTERNAL,
+                       None, None, None, (), (), obj.path, obj.filename, None,
+                       0, 0)
+
+        if link is None:
+            link = HARD
+        if info is None:
+            info = h5py.h5o.get_info(obj.id)
+        header = (info.addr, object_signature(info))
+        kind = kind_of(obj)
+        attrs = tuple(obj.attrs)
+        if kind == GROUP:
+            return cls(path, kind, link, None, None, None, (), attrs,
+                       None, None, len(obj), *header)
+        if kind == DATASET:
+            filters = filter_names(obj) if obj.chunks else ()
+            return cls(path, kind, link, obj.dtype, obj.shape, obj.chunks,
+                       filters, attrs, None, None, None, *header)
+        if kind == DATATYPE:
+            return cls(path, kind, link, obj.dtype, None, None, (), attrs,
+                       None, None, None, *header)
+        return cls(path, kind, link, None, None, None, (), (),
+                   None, None, None, *header)
+
+###############################################################################
+# GROUP MEMBERS
+###############################################################################
+
+
+_LINK_KINDS = {h5py.h5l.TYPE_HARD: HARD, h5py.h5l.TYPE_SOFT: SOFT,
+               h5py.h5l.TYPE_EXTERNAL: EXTERNAL}
+
+_OBJECT_KINDS = {h5py.h5o.TYPE_GROUP: GROUP, h5py.h5o.TYPE_DATASET: DATASET,
+                 h5py.h5o.TYPE_NAMED_DATATYPE: DATATYPE}
+
+
+def scan_links(group, func, offset=0, limit=None, unsorted=False,
+               info=False):
+    """Call ``func(name)`` for the links of a group as they are read.
+
+    Links are visited in name order or, with `unsorted`, in creation order if
+    the group tracks it and in storage order otherwise. Iteration starts at
+    the link numbered `offset` and stops after `limit` links without reading
+    the rest of the group. With `info`, the link kind is passed as a second
+    argument.
+    """
+    h5 = h5py.h5
+    if unsorted:
+        flags = group.id.get_create_plist().get_link_creation_order()
+        if flags & h5py.h5p.CRT_ORDER_INDEXED:
+            # Native order of the creation order index is increasing, and
+            # unlike ITER_INC doesn't require reading every link first
+            (index, order) = (h5.INDEX_CRT_ORDER, h5.ITER_NATIVE)
+        elif flags & h5py.h5p.CRT_ORDER_TRACKED:
+            (index, order) = (h5.INDEX_CRT_ORDER, h5.ITER_INC)
+        else:
+            (index, order) = (h5.INDEX_NAME, h5.ITER_NATIVE)
+    else:
+        # HDF5 sorts the names of large groups, which have a hashed index
+        (index, order) = (h5.INDEX_NAME, h5.ITER_INC)
+    if offset >= len(group) or (limit is not None and limit <= 0):
+        return
+
+    remaining = [limit]
+
+    def visit(name, linfo=None):
+        name = name.decode('utf-8')
+        if info:
+            func(name, _LINK_KINDS.get(linfo.type, UNKNOWN))
+        else:
+            func(name)
+        if remaining[0] is not None:
+            remaining[0] -= 1
+            # Nonzero return value stops the iteration
+            return remaining[0] <= 0
+
+    group.id.links.iterate(visit, info=info, idx_type=index, order=order,
+                           idx=offset)
+
+
+def member_metadata(group, name, link=HARD, details=True, path=None):
+    """Summarize a member of a group using only low-level calls.
+
+    With `details`, datasets get their datatype and shape and groups their
+    number of members; soft and external links get their targets but are
+    not followed. Without, only the kind of object that each link resolves
+    to is looked up. Attributes, chunking and filters are never read.
+    """
+    gid = group.id
+    bname = name.encode('utf-8')
+    if path is None:
+        path = group.name.rstrip('/') + '/' + name
+    if link != HARD and details:
+        value = gid.links.get_val(bname)
+        if link == EXTERNAL:
+            (filename, target) = (v.decode('utf-8') for v in value)
+        else:
+            (filename, target) = (None, value.decode('utf-8'))
+        return Metadata(path, UNKNOWN, link, None, None, None, (), (),
+                        target, filename, None, 0, 0)
+
+    try:
+        info = h5py.h5o.get_info(gid, bname)
+    except (KeyError, RuntimeError):
+        # Dangling link
+        return Metadata(path, UNKNOWN, link, None, None, None, (), (),
+                        None, None, None, 0, 0)
+    kind = _OBJECT_KINDS.get(info.type, UNKNOWN)
+    (dtype, shape, nchildren) = (None, None, None)
+    if details:
+        if kind == GROUP:
+            nchildren = len(h5py.h5g.open(gid, bname))
+        elif kind == DATASET:
+            dset = h5py.h5d.open(gid, bname)
+            (dtype, shape) = (dset.dtype, dset.shape)
+        elif kind == DATATYPE:
+            dtype = h5py.h5t.open(gid, bname).dtype
+    if link != HARD:
+        header = (0, 0)
+    else:
+        header = (info.addr, object_signature(info))
+    return Metadata(path, kind, link, dtype, shape, None, (), (), None, None,
+                    nchildren, *header)
+
+
+def iter_members(group, details=True, offset=0, limit=None, unsorted=False,
+                 batch=100):
+    """Generate `member_metadata` for the members of a group.
+
+    The links are read in batches (see `scan_links` for the order and paging)
+    and each object is summarized as it is generated, so the first members of
+    a large group are available at once and the rest are not read if the
+    generator is abandoned. Batches start at `batch` links and double in
+    size, since HDF5 may reread the link index to find where each starts.
+    """
+    base = group.name.rstrip('/') + '/'
+    links = []
+    while limit is None or limit > 0:
+        count = batch if limit is None else min(batch, limit)
+        del links[:]
+        scan_links(group, lambda name, link: links.append((name, link)),
+                   offset, count, unsorted, info=True)
+        for (name, link) in links:
+            yield member_metadata(group, name, link, details, base + name)
+        if len(links) < count:
+            return
+        offset += count
+        if limit is not None:
+            limit -= count
+        batch *= 2
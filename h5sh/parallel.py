@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""Worker pools for fanning out independent reads.
+
+HDF5 calls made through h5py are serialized by a global lock, so threads only
+overlap HDF5 with NumPy work (which releases the GIL). Tasks that open the
+file by name can instead run in separate processes to read truly in parallel.
+"""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from collections import deque
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import sys
+
+###############################################################################
+
+
+def cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def default_jobs():
+    """Default number of workers: the number of CPUs, up to 8."""
+    return min(8, cpu_count())
+
+
+class _Result(object):
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class SerialPool(object):
+    """Drop-in replacement for a pool that runs everything immediately."""
+
+    def imap(self, func, iterable):
+        for item in iterable:
+            yield func(item)
+
+    imap_unordered = imap
+
+    def apply_async(self, func, args=()):
+        return _Result(func(*args))
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+def make_pool(jobs, processes=False):
+    """Create a pool of `jobs` workers (threads unless `processes`).
+
+    With a single job, tasks are run in the calling thread. Process pools use
+    the 'spawn' start method where available, since forking a process with
+    open HDF5 files is unsafe.
+    """
+    if jobs <= 1:
+        return SerialPool()
+    if not processes:
+        return ThreadPool(jobs)
+    if sys.version_info >= (3, 4):
+        return multiprocessing.get_context('spawn').Pool(jobs)
+    return multiprocessing.Pool(jobs)
+
+
+def bounded_imap(pool, func, iterable, max_pending):
+    """Like ``pool.imap`` but with at most `max_pending` tasks in flight.
+
+    The iterable is consumed lazily in the calling thread, so memory use is
+    bounded when it produces large items (such as blocks read from a
+    dataset), and reading the next item overlaps with processing the
+    previous ones.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""Pool of open HDF5 file handles."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from collections import OrderedDict
+import io
+import os
+
+import h5py
+
+###############################################################################
+
+# Keyword arguments of `h5py.File` that tune HDF5 caches
+FILE_CACHE_OPTIONS = ('rdcc_nbytes', 'rdcc_nslots', 'rdcc_w0', 'page_buf_size')
+
+# Ways of doing file I/O: 'fileobj' reads through a Python buffer
+FILE_DRIVERS = ('sec2', 'stdio', 'core', 'fileobj')
+
+# Default buffer size of the 'fileobj' driver
+DEFAULT_READ_AHEAD = 4 * 1024**2
+
+# Keyword arguments of `FilePool` other than the metadata cache size
+FILE_OPTIONS = FILE_CACHE_OPTIONS + ('driver', 'read_ahead')
+
+
+def set_metadata_cache_size(fid, nbytes):
+    """Make HDF5 start with (and never grow past) a metadata cache size."""
+    config = fid.get_mdc_config()
+    config.max_size = nbytes
+    config.min_size = min(config.min_size, nbytes)
+    config.initial_size = nbytes
+    config.set_initial_size = True
+    fid.set_mdc_config(config)
+
+
+def _check_driver(driver):
+    if driver is not None and driver not in FILE_DRIVERS:
+        raise ValueError("Unknown file driver '{}': choose from {}"
+                         .format(driver, ", ".join(FILE_DRIVERS)))
+
+
+class _ReadAheadReader(io.BufferedReader):
+    # h5py names a file opened from a Python object after its repr
+    def __repr__(self):
+        return self.raw.name
+
+
+class _ReadAheadRandom(io.BufferedRandom):
+    def __repr__(self):
+        return self.raw.name
+
+
+def open_read_ahead(filename, mode='r', buffer_size=DEFAULT_READ_AHEAD):
+    """Open a file for the 'fileobj' driver with a large read buffer.
+
+    Each small HDF5 read that misses the buffer fetches a whole block, so
+    metadata stored close together costs one request to the file system
+    rather than many.
+    """
+    if mode == 'r':
+        return _ReadAheadReader(io.FileIO(filename, 'r'), buffer_size)
+    return _ReadAheadRandom(io.FileIO(filename, 'r+'), buffer_size)
+
+
+def open_file(filename, mode='r', driver=None, read_ahead=None, **options):
+    """Open an HDF5 file with a driver from `FILE_DRIVERS`.
+
+    Returns the `h5py.File` and, for the 'fileobj' driver, the Python file
+    that must be closed after it.
+    """
+    if driver == 'fileobj':
+        fileobj = open_read_ahead(filename, mode,
+                                  read_ahead or DEFAULT_READ_AHEAD)
+        try:
+            return (h5py.File(fileobj, mode, **options), fileobj)
+        except Exception:
+            fileobj.close()
+            raise
+    _check_driver(driver)
+    if driver == 'core':
+        # Read the whole file into memory, writing it back if modified
+        options['backing_store'] = (mode != 'r')
+    return (h5py.File(filename, mode, driver=driver, **options), None)
+
+
+class FilePool(object):
+    """Open HDF5 files, closing the least recently used beyond a limit.
+
+    Files are keyed by their real path, so asking again for an open file
+    returns the same handle. Pinned files (such as the one being browsed)
+    are never closed to make room for others, and a closed file is
+    transparently reopened the next time it is requested.
+
+    Files are opened with the chunk cache and page buffer settings in
+    `options` (see `FILE_CACHE_OPTIONS`), the `driver` and `read_ahead`
+    buffer size of `open_file`, and, if `mdc_nbytes` is set, with that
+    metadata cache size. Unset options keep the HDF5 defaults.
+    """
+
+    def __init__(self, max_open=64, mdc_nbytes=None, **options):
+        if max_open < 1:
+            raise ValueError("At least one file must be allowed open")
+        unknown = set(options) - set(FILE_OPTIONS)
+        if unknown:
+            raise TypeError("Unknown file options: " + ", ".join(unknown))
+        _check_driver(options.get('driver'))
+        self.max_open = max_open
+        self.mdc_nbytes = mdc_nbytes
+        self.options = dict((k, v) for (k, v) in options.items()
+                            if v is not None)
+        # Real path -> h5py.File, in order from least to most recently used
+        self._files = OrderedDict()
+        # Real path -> Python file underlying an h5py.File
+        self._fileobjs = {}
+        # Real paths of files that must stay open
+        self.pinned = set()
+        # Number of times a file was opened
+        self.opens = 0
+
+    def __repr__(self):
+        return "FilePool({:d}/{:d} open)".format(len(self), self.max_open)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, filename):
+        return os.path.realpath(filename) in self._files
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def get(self, filename, mode='r'):
+        """Return an open handle to a file, opening it if needed."""
+        key = os.path.realpath(filename)
+        f = self._files.pop(key, None)
+        if f is not None and (not f.id.valid
+                              or (mode != 'r' and f.mode == 'r')):
+            # Closed elsewhere, or opened read-only but now needed writable
+            self._release(key, f)
+            f = None
+        if f is None:
+            (f, fileobj) = open_file(key, mode, **self.options)
+            if fileobj is not None:
+                self._fileobjs[key] = fileobj
+            if self.mdc_nbytes is not None:
+                set_metadata_cache_size(f.id, self.mdc_nbytes)
+            self.opens += 1
+        self._files[key] = f
+        self._evict(keep=key)
+        return f
+
+    def close(self, filename):
+        """Close a file if it is open."""
+        key = os.path.realpath(filename)
+        self.pinned.discard(key)
+        f = self._files.pop(key, None)
+        if f is not None:
+            self._release(key, f)
+
+    def close_all(self):
+        for (key, f) in self._files.items():
+            self._release(key, f)
+        self._files.clear()
+        self.pinned.clear()
+
+    def configure(self, mdc_nbytes=None, **options):
+        """Change cache settings, closing files whose settings are stale.
+
+        The metadata cache of open files is resized in place; other options
+        only apply when a file is opened, so unpinned files are closed (to be
+        reopened on demand) and the paths of pinned ones are returned for the
+        caller to reopen.
+        """
+        if mdc_nbytes is not None:
+            self.mdc_nbytes = mdc_nbytes
+            for f in self._files.values():
+                if f.id.valid:
+                    set_metadata_cache_size(f.id, mdc_nbytes)
+        options = dict((k, v) for (k, v) in options.items() if v is not None)
+        _check_driver(options.get('driver'))
+        if not options:
+            return []
+        self.options.update(options)
+        stale = [k for k in self._files if k in self.pinned]
+        for key in list(self._files):
+            if key not in self.pinned:
+                self.close(key)
+        return stale
+
+    def reopen(self, filename, mode='r'):
+        """Close a file and open it again with the current settings."""
+        key = os.path.realpath(filename)
+        pinned = key in self.pinned
+        self.close(key)
+        f = self.get(key, mode)
+        if pinned:
+            self.pinned.add(key)
+        return f
+
+    def resize(self, max_open):
+        if max_open < 1:
+            raise ValueError("At least one file must be allowed open")
+        self.max_open = max_open
+        self._evict()
+
+    def _evict(self, keep=None):
+        excess = len(self._files) - self.max_open
+        if excess <= 0:
+            return
+        victims = [k for k in self._files
+                   if k != keep and k not in self.pinned][:excess]
+        for key in victims:
+            self._release(key, self._files.pop(key))
+
+    def _release(self, key, f):
+        if f.id.valid:
+            f.close()
+        fileobj = self._fileobjs.pop(key, None)
+        if fileobj is not None:
+            fileobj.close()
@@ -1,62 +1,265 @@
 # -*- coding: utf-8 -*-
 from __future__ import (division, absolute_import, print_function,
                         unicode_literals)
+from argparse import Action, ArgumentParser, ArgumentTypeError, SUPPRESS
 from h5sh import __version__
+from importlib import import_module
 import sys
 
 
-def run(inp, debug=False):
+def _parse_bytes(text):
+    from h5sh.utils import parse_bytes
+    return parse_bytes(text)
+
+
+def _fraction(text):
+    from h5sh.utils import parse_fraction
+    try:
+        return parse_fraction(text)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+
+
+def _driver(text):
+    from h5sh.pool import FILE_DRIVERS
+    if text not in FILE_DRIVERS:
+        raise ArgumentTypeError("invalid choice: {!r} (choose from {})"
+                                .format(text, ", ".join(FILE_DRIVERS)))
+    return text
+
+
+def run(inp, debug=False, command=None, script=None, exit_on_error=False,
+        startup_profile=None, timing_log=None, **kwargs):
+    """Run commands on a file, interactively unless given a command or script.
+
+    If given, the `startup_profile` import profiler reports once h5sh is
+    ready to run the first command, and the time taken by each command is
+    appended to the `timing_log` file. Returns the exit status of a batch run.
+    """
     from h5sh.state import State
-    from h5sh.console import Console
-    with State(inp) as state:
-        console = Console(state)
-        console.debug = debug
-        console.interact()
+    with State(inp, **kwargs) as state:
+        if command is None and script is None:
+            from h5sh.console import Console
+            shell = Console(state)
+        else:
+            from h5sh.shell import Batch
+            shell = Batch(state, exit_on_error)
+        shell.debug = debug
+        if timing_log is not None:
+            shell.timing_log = open(timing_log, 'a')
+        try:
+            _report_startup(startup_profile)
+            if command is None and script is None:
+                shell.interact()
+                return 0
+            if command is not None:
+                return shell.run(command)
+            if script == '-':
+                return shell.run(sys.stdin)
+            with open(script) as f:
+                return shell.run(f)
+        finally:
+            if shell.timing_log is not None:
+                shell.timing_log.close()
 
 
-def main(argv=None):
-    from argparse import ArgumentParser
+def _report_startup(profiler):
+    if profiler is not None:
+        profiler.uninstall()
+        profiler.report(sys.stderr)
 
-    # Load version
-    this_version = __version__
 
-    h5err = None
+def version_string():
+    """Versions of h5sh and its main dependencies."""
     try:
         from h5py import version as h5version
-    except ImportError as e:
-        h5err = e
+    except ImportError:
         h5py_vers = hdf5_vers = "UNAVAILABLE"
     else:
         h5py_vers = h5version.version
         hdf5_vers = h5version.hdf5_version
 
     py_vers = "{v.major}.{v.minor}.{v.micro}".format(v=sys.version_info)
-    version_str = "h5sh {} [Python {}] [h5py {}] [HDF5 {}]".format(
-        this_version, py_vers, h5py_vers, hdf5_vers)
+    return "h5sh {} [Python {}] [h5py {}] [HDF5 {}]".format(
+        __version__, py_vers, h5py_vers, hdf5_vers)
+
+
+class _VersionAction(Action):
+    """Print the version, importing h5py only if it is requested."""
+
+    def __init__(self, option_strings, dest=SUPPRESS, default=SUPPRESS,
+                 help="show program's version number and exit"):
+        super(_VersionAction, self).__init__(
+            option_strings=option_strings, dest=dest, default=default,
+            nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.exit(message=version_string() + "\n")
+
+
+def _check_h5py(parser):
+    try:
+        import_module('h5py')
+    except ImportError as e:
+        parser.error("The 'h5py' Python package is required to run this "
+                     "utility: " + str(e))
+
+
+def _add_state_arguments(parser):
+    parser.add_argument('--cache-entries', type=int, default=64,
+                        help="Number of group listings to cache")
+    parser.add_argument('--cache-size', dest='cache_bytes', type=_parse_bytes,
+                        default=32 * 1024**2,
+                        help="Memory budget for cached group listings")
+    parser.add_argument('--index', action="store_true",
+                        help="Index the structure of the entire file on "
+                        "startup")
+    parser.add_argument('--index-dir', metavar='DIR',
+                        help="Directory for saved indexes (default: "
+                        "$H5SH_CACHE_DIR or ~/.cache/h5sh)")
+    parser.add_argument('--no-save-index', dest='save_index',
+                        action="store_false",
+                        help="Neither load nor save indexes on disk")
+    parser.add_argument('--max-open-files', type=int, default=64, metavar='N',
+                        help="Number of files opened with 'open' to keep "
+                        "open at once")
+    parser.add_argument('--rdcc-nbytes', type=_parse_bytes, metavar='SIZE',
+                        help="Raw data chunk cache size of each dataset "
+                        "(HDF5 default: 1M)")
+    parser.add_argument('--rdcc-nslots', type=int, metavar='N',
+                        help="Number of chunk cache hash table slots")
+    parser.add_argument('--rdcc-w0', type=_fraction, metavar='W',
+                        help="Chunk cache preemption policy from 0 to 1")
+    parser.add_argument('--mdc-size', dest='mdc_nbytes', type=_parse_bytes,
+                        metavar='SIZE',
+                        help="Metadata cache size of each file")
+    parser.add_argument('--page-buffer-size', dest='page_buf_size',
+                        type=_parse_bytes, metavar='SIZE',
+                        help="Page buffer size for files created with paged "
+                        "aggregation")
+    parser.add_argument('--driver', type=_driver, metavar='NAME',
+                        help="HDF5 file driver: 'core' reads each file into "
+                        "memory, 'fileobj' reads through a large Python "
+                        "buffer (default: sec2)")
+    parser.add_argument('--read-ahead', type=_parse_bytes, metavar='SIZE',
+                        help="Buffer size of the 'fileobj' driver "
+                        "(default: 4M)")
+
+
+def serve(argv):
+    """Run 'h5sh serve'."""
+    parser = ArgumentParser(
+        prog="h5sh serve",
+        description="Keep HDF5 files open and run commands sent by "
+        "'h5sh --connect' clients")
+    parser.add_argument('--socket', metavar='PATH',
+                        help="Unix socket to listen on (default: "
+                        "$H5SH_SOCKET or a per-user file)")
+    parser.add_argument('--stop', action="store_true",
+                        help="Stop the running server")
+    parser.add_argument('-g', '--debug', action="store_true")
+    _add_state_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from h5sh.server import Server, stop_server
+    if args.stop:
+        return stop_server(args.socket)
+    _check_h5py(parser)
+
+    kwargs = vars(args)
+    del kwargs['stop']
+    server = Server(kwargs.pop('socket'), **kwargs)
+    server.bind()
+    print("h5sh serving on {}".format(server.path), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def connect(args):
+    """Send batch commands to a server and return the exit status."""
+    from h5sh.server import run_client
+    if args.command is not None:
+        commands = args.command
+    elif args.script == '-':
+        commands = sys.stdin.read()
+    else:
+        with open(args.script) as f:
+            commands = f.read()
+    return run_client(args.inp, commands, args.socket, args.exit_on_error)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'serve':
+        sys.exit(serve(argv[1:]))
+
+    profiler = None
+    if '--startup-profile' in argv and sys.version_info >= (3, 4):
+        # Time imports from here on
+        from h5sh.startup import ImportProfiler
+        profiler = ImportProfiler().install()
 
     # Create parser
     parser = ArgumentParser(
         prog="h5sh",
-        description="shell-like interface to interacting with HDF5 files")
+        description="shell-like interface to interacting with HDF5 files",
+        epilog="Run 'h5sh serve' to start a server for '--connect'.")
     parser.add_argument('inp',
                         help="Name of the HDF5 input file")
-    parser.add_argument('--version', action="version",
-                        version=version_str)
+    parser.add_argument('--version', action=_VersionAction)
     parser.add_argument('-g', '--debug', action="store_true")
+    parser.add_argument('-c', '--command', metavar='COMMANDS',
+                        help="Run commands separated by ';' and exit")
+    parser.add_argument('-f', '--file', dest='script', metavar='SCRIPT',
+                        help="Run commands from a script file ('-' for "
+                        "standard input) and exit")
+    parser.add_argument('-e', '--exit-on-error', action="store_true",
+                        help="Stop a batch run at the first failed command")
+    parser.add_argument('--connect', action="store_true",
+                        help="Run batch commands in a running 'h5sh serve'")
+    parser.add_argument('--socket', metavar='PATH',
+                        help="Socket of the server for --connect")
+    parser.add_argument('--startup-profile', action="store_true",
+                        help="Print the time taken to import each module "
+                        "before running the first command")
+    parser.add_argument('--timing-log', metavar='FILE',
+                        help="Append the wall-clock and CPU time of every "
+                        "command to a file")
+    _add_state_arguments(parser)
 
     args = parser.parse_args(argv)
+    args.startup_profile = profiler
 
-    if h5err is not None:
-        # h5py is unavailable
-        parser.error("The 'h5py' Python package is required to run this "
-                     "utility: " + str(h5err))
-        sys.exit(2)
+    if (args.command is None and args.script is None
+            and not sys.stdin.isatty()):
+        # Read commands from a pipe
+        args.script = '-'
+
+    if args.connect or args.socket is not None:
+        if args.command is None and args.script is None:
+            parser.error("--connect requires -c, -f or commands on "
+                         "standard input")
+        try:
+            sys.exit(connect(args))
+        except (IOError, OSError) as e:
+            print("h5sh: cannot reach server: {!s}".format(e),
+                  file=sys.stderr)
+            sys.exit(2)
+    del args.connect
+    del args.socket
+
+    _check_h5py(parser)
 
-    # Print the version string at the top
-    print(version_str)
+    if args.command is None and args.script is None:
+        # Print the version string at the top
+        print(version_string())
 
     # Run the program
-    run(**vars(args))
+    sys.exit(run(**vars(args)))
 
 
 if __name__ == '__main__':
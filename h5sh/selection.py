@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""NumPy-style hyperslab selections of datasets."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import numpy as np
+
+###############################################################################
+# PARSING
+###############################################################################
+
+
+def _parse_int(text, selection):
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError("Invalid selection [{}]: {!r} is not an integer"
+                         .format(selection, text))
+
+
+def parse_selection(text):
+    """Convert the inside of ``[...]`` to a tuple of indices and slices.
+
+    Example::
+
+        >>> parse_selection("1000:2000, ::8, -1, ...")
+        (slice(1000, 2000, None), slice(None, None, 8), -1, Ellipsis)
+    """
+    result = []
+    for item in text.split(','):
+        item = item.strip()
+        if item == '...':
+            result.append(Ellipsis)
+        elif ':' in item:
+            parts = item.split(':')
+            if len(parts) > 3:
+                raise ValueError("Invalid selection [{}]: bad slice {!r}"
+                                 .format(text, item))
+            parts = [_parse_int(p, text) if p.strip() else None
+                     for p in parts]
+            result.append(slice(*parts))
+        elif item:
+            result.append(_parse_int(item, text))
+        else:
+            raise ValueError("Invalid selection [{}]: empty index"
+                             .format(text))
+    if result.count(Ellipsis) > 1:
+        raise ValueError("Invalid selection [{}]: more than one '...'"
+                         .format(text))
+    return tuple(result)
+
+
+def split_selection(arg):
+    """Split 'name[selection]' into the name and a parsed selection.
+
+    The selection is None if the argument has no trailing brackets.
+    """
+    if not arg.endswith(']'):
+        return (arg, None)
+    start = arg.find('[')
+    if start <= 0:
+        return (arg, None)
+    return (arg[:start], parse_selection(arg[start + 1:-1]))
+
+
+def format_selection(selection):
+    """Inverse of `parse_selection`."""
+    def fmt(item):
+        if item is Ellipsis:
+            return '...'
+        if isinstance(item, slice):
+            text = ':'.join('' if v is None else str(v)
+                            for v in (item.start, item.stop))
+            if item.step is not None:
+                text += ':' + str(item.step)
+            return text
+        return str(item)
+    return ', '.join(fmt(item) for item in selection)
+
+###############################################################################
+# NORMALIZATION
+###############################################################################
+
+
+def normalize_selection(selection, shape):
+    """Resolve a selection against a shape.
+
+    Returns a list with one entry per axis: an integer for an indexed axis,
+    or ``(start, step, count)`` for a sliced axis. Negative steps are not
+    supported (as in h5py).
+    """
+    if not isinstance(selection, tuple):
+        selection = (selection,)
+    nexplicit = sum(1 for s in selection if s is not Ellipsis)
+    if nexplicit > len(shape):
+        raise ValueError("Too many indices ({:d}) for {:d}-D dataset"
+                         .format(nexplicit, len(shape)))
+    expanded = []
+    for item in selection:
+        if item is Ellipsis:
+            expanded.extend([slice(None)] * (len(shape) - nexplicit))
+        else:
+            expanded.append(item)
+    expanded.extend([slice(None)] * (len(shape) - len(expanded)))
+
+    axes = []
+    for (item, n) in zip(expanded, shape):
+        if isinstance(item, slice):
+            (start, stop, step) = item.indices(n)
+            if step <= 0:
+                raise ValueError("Slice steps must be positive")
+            axes.append((start, step, len(range(start, stop, step))))
+        else:
+            index = int(item)
+            if index < 0:
+                index += n
+            if not 0 <= index < n:
+                raise ValueError("Index {:d} is out of range for axis of "
+                                 "length {:d}".format(int(item), n))
+            axes.append(index)
+    return axes
+
+
+def _to_slices(axes):
+    """Convert normalized axes to an h5py-compatible selection tuple."""
+    result = []
+    for axis in axes:
+        if isinstance(axis, tuple):
+            (start, step, count) = axis
+            stop = start + (count - 1) * step + 1 if count else start
+            result.append(slice(start, stop, step if step != 1 else None))
+        else:
+            result.append(axis)
+    return tuple(result)
+
+###############################################################################
+# DATASET VIEW
+###############################################################################
+
+
+class DatasetView(object):
+    """Lazily selected region of an h5py dataset.
+
+    Indexing the view reads only the corresponding part of the dataset, so
+    it can be used anywhere an array-like with ``shape``, ``dtype`` and
+    ``__getitem__`` is expected.
+    """
+
+    def __init__(self, dataset, selection):
+        self.dataset = dataset
+        self.selection = selection
+        self._axes = normalize_selection(selection, dataset.shape)
+        self.shape = tuple(a[2] for a in self._axes if isinstance(a, tuple))
+
+    def __repr__(self):
+        return "<DatasetView {}[{}]>".format(
+            self.dataset.name, format_selection(self.selection))
+
+    @property
+    def dtype(self):
+        return self.dataset.dtype
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def name(self):
+        return self.dataset.name
+
+    @property
+    def chunks(self):
+        """Approximate chunk shape as seen through the view, or None."""
+        chunks = self.dataset.chunks
+        if chunks is None:
+            return None
+        return tuple(max(1, c // a[1]) for (c, a) in zip(chunks, self._axes)
+                     if isinstance(a, tuple))
+
+    @property
+    def source_selection(self):
+        """Selection of the whole view in dataset coordinates."""
+        return _to_slices(self._axes)
+
+    def compose(self, key):
+        """Convert a selection of the view to one of the dataset."""
+        inner = iter(normalize_selection(key, self.shape))
+        axes = []
+        for axis in self._axes:
+            if not isinstance(axis, tuple):
+                axes.append(axis)
+                continue
+            (start, step, _) = axis
+            sub = next(inner)
+            if isinstance(sub, tuple):
+                (sub_start, sub_step, sub_count) = sub
+                axes.append((start + sub_start * step, step * sub_step,
+                             sub_count))
+            else:
+                axes.append(start + sub * step)
+        return _to_slices(axes)
+
+    def __getitem__(self, key):
+        return self.dataset[self.compose(key)]
+
+    def __array__(self, dtype=None, copy=None):
+        result = self.dataset[self.source_selection]
+        return np.asarray(result, dtype=dtype)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""Long-lived h5sh server and a thin client over a Unix socket.
+
+The server keeps a `State` open for every file it has been asked about, so
+each request gets warm HDF5 metadata caches and listings. Messages are JSON
+objects, one per line. A request names a file and the commands to run on it;
+the server replies with any number of ``{"out": text}`` and ``{"err": text}``
+messages, streamed as the commands run, followed by ``{"status": code}``.
+
+Requests are run one at a time. This module only imports the rest of h5sh
+(and h5py) when serving, so the client starts quickly.
+"""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import json
+import os
+import socket
+import stat
+import sys
+
+###############################################################################
+# PROTOCOL
+###############################################################################
+
+
+def _user_tmp_dir():
+    """Per-user directory in ``/tmp`` for the socket."""
+    return os.path.join("/tmp", "h5sh-{:d}".format(os.getuid()))
+
+
+def default_socket_path():
+    """Socket path: ``$H5SH_SOCKET``, else a per-user file.
+
+    The per-user file is in ``$XDG_RUNTIME_DIR`` if set, otherwise in a
+    directory in ``/tmp`` that only the user can access.
+    """
+    try:
+        return os.environ['H5SH_SOCKET']
+    except KeyError:
+        pass
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base:
+        return os.path.join(base, "h5sh-{:d}.sock".format(os.getuid()))
+    return os.path.join(_user_tmp_dir(), "h5sh.sock")
+
+
+def _make_private_dir(path):
+    """Create a directory only the user can access, or check an existing one.
+
+    Since the name in ``/tmp`` is predictable, another user could have
+    created it first.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    st = os.lstat(path)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid()
+            or st.st_mode & 0o077):
+        raise IOError("{} must be a directory owned by the user and "
+                      "inaccessible to others".format(path))
+
+
+def _send(conn, message):
+    conn.sendall((json.dumps(message) + "\n").encode('utf-8'))
+
+
+def _receive(conn):
+    """Generate messages from a connection until it is closed."""
+    reader = conn.makefile('rb')
+    try:
+        for line in reader:
+            yield json.loads(line.decode('utf-8'))
+    finally:
+        reader.close()
+
+###############################################################################
+# CLIENT
+###############################################################################
+
+
+def request(message, path=None):
+    """Send a request to a server and generate its replies.
+
+    Raises `socket.error` (`OSError`) if no server is listening.
+    """
+    if path is None:
+        path = default_socket_path()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+        _send(conn, message)
+        conn.shutdown(socket.SHUT_WR)
+        for reply in _receive(conn):
+            yield reply
+    finally:
+        conn.close()
+
+
+def run_client(filename, commands, path=None, exit_on_error=False,
+               stdout=None, stderr=None):
+    """Run commands on a file through a server and return the exit status.
+    """
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+    message = {'file': os.path.abspath(filename), 'commands': commands,
+               'exit_on_error': exit_on_error}
+    for reply in request(message, path):
+        if 'out' in reply:
+            stdout.write(reply['out'])
+        elif 'err' in reply:
+            stderr.write(reply['err'])
+        elif 'status' in reply:
+            stdout.flush()
+            return reply['status']
+    raise IOError("Server closed the connection before replying")
+
+
+def stop_server(path=None):
+    """Ask a server to exit after its current request."""
+    for reply in request({'shutdown': True}, path):
+        if 'status' in reply:
+            return reply['status']
+    return 1
+
+###############################################################################
+# SERVER
+###############################################################################
+
+
+class _Output(object):
+    """Text stream that forwards everything written to a client."""
+
+    def __init__(self, conn, key):
+        self.conn = conn
+        self.key = key
+
+    def write(self, text):
+        if text:
+            _send(self.conn, {self.key: text})
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def _settings(state):
+    """Everything about a state that 'set' can change."""
+    pool = state.pool
+    return (sorted(pool.options.items()), pool.mdc_nbytes, pool.max_open,
+            state.listings.max_entries, state.listings.max_bytes)
+
+
+class Server(object):
+    """Run requests from clients against cached open files.
+
+    Keyword arguments are passed to each `State`. A file is reopened if its
+    size or modification time has changed since it was opened, and its state
+    is discarded after a request that opens other files or changes settings,
+    so that no request sees the effects of another.
+    """
+
+    def __init__(self, path=None, debug=False, **state_kwargs):
+        if path is None:
+            path = default_socket_path()
+        self.path = path
+        self.debug = debug
+        self.state_kwargs = state_kwargs
+        # (State, (mtime, size)) by real path
+        self.states = {}
+        self.running = False
+        self._sock = None
+
+    def get_state(self, filename):
+        """Open or reuse the state of a file, starting at its root group."""
+        from h5sh.state import State
+        key = os.path.realpath(filename)
+        st = os.stat(key)
+        signature = (st.st_mtime, st.st_size)
+        (state, saved) = self.states.get(key, (None, None))
+        if state is not None and saved != signature:
+            state.close()
+            state = None
+        if state is None:
+            state = State(key, **self.state_kwargs)
+            self.states[key] = (state, signature)
+        state.chdir()
+        return state
+
+    def discard(self, filename):
+        """Close the state of a file, if any."""
+        (state, _) = self.states.pop(os.path.realpath(filename), (None, None))
+        if state is not None:
+            state.close()
+
+    def handle(self, conn):
+        """Run a single request."""
+        from h5sh.shell import Batch
+        message = next(_receive(conn), None)
+        if message is None:
+            return
+        if message.get('shutdown'):
+            self.running = False
+            _send(conn, {'status': 0})
+            return
+
+        (stdout, stderr) = (sys.stdout, sys.stderr)
+        sys.stdout = _Output(conn, 'out')
+        sys.stderr = _Output(conn, 'err')
+        try:
+            try:
+                state = self.get_state(message['file'])
+            except (IOError, OSError) as e:
+                print("h5sh: {!s}".format(e), file=sys.stderr)
+                status = 2
+            else:
+                settings = _settings(state)
+                batch = Batch(state, message.get('exit_on_error', False))
+                batch.debug = self.debug
+                try:
+                    status = batch.run(message['commands'])
+                finally:
+                    if (len(state.sessions) != 1
+                            or _settings(state) != settings):
+                        # Changed by 'open', 'use' or 'set'
+                        self.discard(message['file'])
+        finally:
+            (sys.stdout, sys.stderr) = (stdout, stderr)
+        _send(conn, {'status': status})
+
+    def bind(self):
+        """Listen on the socket, replacing a stale one."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory == _user_tmp_dir():
+            _make_private_dir(directory)
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except socket.error:
+                os.unlink(self.path)
+            else:
+                raise IOError("A server is already listening on {}"
+                              .format(self.path))
+            finally:
+                probe.close()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Nobody else may connect, even before the socket is listening
+        umask = os.umask(0o177)
+        try:
+            self._sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        self._sock.listen(16)
+
+    def serve_forever(self):
+        """Handle requests until a client asks the server to stop."""
+        if self._sock is None:
+            self.bind()
+        self.running = True
+        try:
+            while self.running:
+                (conn, _) = self._sock.accept()
+                try:
+                    self.handle(conn)
+                except (socket.error, ValueError, KeyError) as e:
+                    # Client went away or sent a malformed request
+                    print("h5sh serve: {!s}".format(e), file=sys.stderr)
+                finally:
+                    conn.close()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        for (state, _) in self.states.values():
+            state.close()
+        self.states.clear()
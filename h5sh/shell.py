@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Command dispatch shared by the interactive console and batch mode.
+
+Nothing here depends on prompt_toolkit, so batch mode can run without it.
+"""
+
+from __future__ import (division, absolute_import, print_function,
+                        unicode_literals)
+#-----------------------------------------------------------------------------#
+import os
+import sys
+from time import strftime
+from timeit import default_timer
+
+from six import string_types
+from six.moves import shlex_quote
+
+from .commands import COMMANDS
+from .utils import shlex_split, split_commands
+
+###############################################################################
+
+
+class Shell(object):
+    """Run commands against a `State`."""
+
+    def __init__(self, state):
+        # Command-line state
+        self.state = state
+        # Debug mode
+        self.debug = False
+        # Text file to which the latency of each command is appended
+        self.timing_log = None
+
+    def error(self, message):
+        print(message)
+
+    def execute(self, cmd_name, args):
+        """Run a single command, reporting any errors.
+
+        Returns True if the command succeeded.
+        """
+        if self.timing_log is None or cmd_name.startswith('__'):
+            return self._execute(cmd_name, args)
+
+        start = (default_timer(), cpu_time())
+        filename = self.state.filename
+        succeeded = False
+        try:
+            succeeded = self._execute(cmd_name, args)
+        except SystemExit:
+            # 'exit' command
+            succeeded = True
+            raise
+        finally:
+            self.log_timing(filename, [cmd_name] + list(args), succeeded,
+                            *start)
+        return succeeded
+
+    def log_timing(self, filename, args, succeeded, start, start_cpu):
+        """Append a line for a finished command to the timing log.
+
+        Fields are separated by tabs: the local time, wall and CPU seconds,
+        "ok" or "error", the file, and the command line.
+        """
+        line = "\t".join([
+            strftime("%Y-%m-%dT%H:%M:%S"),
+            "{:.6f}".format(default_timer() - start),
+            "{:.6f}".format(cpu_time() - start_cpu),
+            "ok" if succeeded else "error",
+            filename,
+            " ".join(shlex_quote(a) for a in args)])
+        self.timing_log.write(line + "\n")
+        self.timing_log.flush()
+
+    def _execute(self, cmd_name, args):
+        try:
+            cmd = COMMANDS[cmd_name]
+        except KeyError:
+            self.error("h5sh: {}: command not found".format(cmd_name))
+            return False
+
+        try:
+            cmd(self.state, *args)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            if not self.debug and isinstance(e, (TypeError, ValueError)):
+                self.error("{}: {!s}".format(cmd_name, e))
+                return False
+
+            import logging as log
+            log.exception(e)
+            return False
+        return True
+
+
+def cpu_time():
+    """User plus system CPU seconds used by this process."""
+    times = os.times()
+    return times[0] + times[1]
+
+
+class Batch(Shell):
+    """Run commands from strings or files without prompting.
+
+    Commands are separated by newlines or semicolons, and '#' starts a
+    comment. Errors are written to standard error.
+    """
+
+    def __init__(self, state, exit_on_error=False):
+        super(Batch, self).__init__(state)
+        # Stop at the first failed command
+        self.exit_on_error = exit_on_error
+        # Number of failed commands
+        self.failures = 0
+
+    def error(self, message):
+        print(message, file=sys.stderr)
+
+    def run(self, lines):
+        """Run commands from a string or an iterable of lines.
+
+        Lines are read lazily, so commands from a pipe run as they arrive.
+        Returns the exit status: nonzero if any command failed.
+        """
+        if isinstance(lines, string_types):
+            lines = [lines]
+        try:
+            for line in lines:
+                for text in split_commands(line):
+                    args = shlex_split(text)
+                    if self.execute(args[0], args[1:]):
+                        continue
+                    self.failures += 1
+                    if self.exit_on_error:
+                        return 1
+                # Keep output in order with errors when piped
+                sys.stdout.flush()
+        except SystemExit:
+            # 'exit' command
+            pass
+        return 1 if self.failures else 0
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Persistent on-disk copies of structure indexes.
+
+Each indexed file gets a subdirectory of the cache directory, named by a hash
+of the file's real path, that holds the ``.npy`` files of the index columns
+(see `StructureIndex.save`) plus a ``signature.json`` describing the file at
+the time it was indexed. Loading memory-maps the columns, so reopening even a
+huge file is nearly instant.
+"""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+from hashlib import sha1
+import os
+
+# json, shutil and tempfile are imported when needed to speed up startup
+
+FORMAT_VERSION = 2
+SIGNATURE_FILENAME = "signature.json"
+
+###############################################################################
+
+
+def default_cache_dir():
+    """Directory for h5sh caches.
+
+    This is ``$H5SH_CACHE_DIR`` if set, otherwise ``h5sh`` inside
+    ``$XDG_CACHE_HOME`` (default ``~/.cache``).
+    """
+    try:
+        return os.environ['H5SH_CACHE_DIR']
+    except KeyError:
+        pass
+    base = (os.environ.get('XDG_CACHE_HOME')
+            or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'h5sh')
+
+
+def file_signature(f):
+    """Describe an open h5py file so that changes to it can be detected.
+    """
+    path = os.path.realpath(f.filename)
+    st = os.stat(path)
+    fcpl = f.id.get_create_plist()
+    return {
+        'format': FORMAT_VERSION,
+        'path': path,
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'superblock': list(fcpl.get_version()),
+        'userblock': fcpl.get_userblock(),
+    }
+
+
+class Sidecar(object):
+    """Saved structure index of a single HDF5 file."""
+
+    def __init__(self, filename, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        realpath = os.path.realpath(filename)
+        key = sha1(realpath.encode('utf-8')).hexdigest()
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, key)
+
+    def __repr__(self):
+        return "Sidecar({!r})".format(self.path)
+
+    @property
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, SIGNATURE_FILENAME))
+
+    def read_signature(self):
+        """Signature of the file when it was indexed, or None."""
+        import json
+        try:
+            with open(os.path.join(self.path, SIGNATURE_FILENAME)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def load(self):
+        """Memory-map the saved index, or return None if it is unreadable."""
+        from .index import StructureIndex
+        try:
+            return StructureIndex.load(self.path)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save(self, index, signature):
+        """Atomically replace the saved index."""
+        import json
+        import shutil
+        import tempfile
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        tmpdir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            index.save(tmpdir)
+            with open(os.path.join(tmpdir, SIGNATURE_FILENAME), 'w') as f:
+                json.dump(signature, f)
+            self.remove()
+            os.rename(tmpdir, self.path)
+        except Exception:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+
+    def remove(self):
+        import shutil
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def load_index(f, cache_dir=None, rebuild=False):
+    """Load a file's saved index, refreshing and saving it if it is stale.
+
+    Returns the index (or None if there is no saved index and `rebuild` is
+    false) and one of the strings "loaded", "refreshed" or "built" describing
+    what was done. A stale index is used as the starting point for an
+    incremental rebuild; if it cannot be read, the file is indexed from
+    scratch.
+    """
+    sidecar = Sidecar(f.filename, cache_dir)
+    signature = file_signature(f)
+    previous = None
+    if sidecar.exists:
+        saved = sidecar.read_signature()
+        previous = sidecar.load()
+        if saved is not None and saved.get('format') != FORMAT_VERSION:
+            previous = None
+        elif saved == signature and previous is not None and not rebuild:
+            return (previous, "loaded")
+    elif not rebuild:
+        return (None, None)
+
+    from .index import StructureIndex
+    index = StructureIndex.build(f, previous)
+    how = "refreshed" if previous is not None else "built"
+    try:
+        sidecar.save(index, signature)
+    except (IOError, OSError):
+        # Read-only cache directory: keep the index for this session only
+        pass
+    return (index, how)
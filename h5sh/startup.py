@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""Measure how long each module takes to import during startup."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import sys
+from timeit import default_timer
+
+###############################################################################
+
+
+class _TimedLoader(object):
+    """Wrap a module loader to time the module's creation and execution."""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        # Extension modules are initialized here
+        create = getattr(self._loader, 'create_module', None)
+        if create is None:
+            return None
+        return self._profiler.timed(spec.name, create, spec)
+
+    def exec_module(self, module):
+        return self._profiler.timed(module.__name__, self._loader.exec_module,
+                                    module)
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class ImportProfiler(object):
+    """Import hook that records the time spent importing each module.
+
+    Like ``python -X importtime``, each module's "self" time excludes the
+    time spent importing other modules while it runs. Only Python 3 import
+    machinery is supported.
+    """
+
+    def __init__(self):
+        self.start = default_timer()
+        # Cumulative and self times by module name
+        self.cumulative = {}
+        self.exclusive = {}
+        self._stack = []
+        self._finding = False
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def timed(self, name, func, *args):
+        self._stack.append(0.0)
+        start = default_timer()
+        try:
+            return func(*args)
+        finally:
+            elapsed = default_timer() - start
+            children = self._stack.pop()
+            self.cumulative[name] = self.cumulative.get(name, 0) + elapsed
+            self.exclusive[name] = (self.exclusive.get(name, 0)
+                                    + elapsed - children)
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def report(self, f=None, limit=25):
+        """Print the slowest imports and the total startup time."""
+        if f is None:
+            f = sys.stderr
+        total = default_timer() - self.start
+        importing = sum(self.exclusive.values())
+        print("Startup took {:.3f} s, {:.3f} s of it importing {:d} modules"
+              .format(total, importing, len(self.exclusive)), file=f)
+        print("{:>9s} {:>9s}  {}".format("cumul ms", "self ms", "module"),
+              file=f)
+        names = sorted(self.cumulative, key=self.cumulative.get,
+                       reverse=True)
+        for name in names[:limit]:
+            print("{:9.1f} {:9.1f}  {}".format(1000 * self.cumulative[name],
+                                               1000 * self.exclusive[name],
+                                               name), file=f)
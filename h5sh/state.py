@@ -3,31 +3,175 @@
 from __future__ import (division, absolute_import, print_function,
                         unicode_literals)
 #-----------------------------------------------------------------------------#
+from collections import OrderedDict
 from contextlib import contextmanager
 import h5py
 import os
 import sys
 
+from .cache import ListingCache
+from .metadata import GROUP, DATASET, iter_members
+from .pool import FilePool
+from .sidecar import Sidecar, load_index
 from .utils import abspath
 from .styles import (styled_filename, HDF5_GROUP, PROMPT_TOKEN)
 
 ###############################################################################
 
 
+class FileSession(object):
+    """What the shell knows about one of its open files."""
+
+    def __init__(self, filename, mode='r'):
+        # Real path of the file
+        self.filename = filename
+        self.mode = mode
+        # Current group while another file is in use
+        self.cwd = '/'
+        # Structure index, if any
+        self.index = None
+
+    def __repr__(self):
+        return "FileSession({!r}, {!r})".format(self.filename, self.mode)
+
+
 class State(object):
     """The state of the current "shell".
 
-    At the moment this merely encapsulates the working directory and the open
-    file.
+    At the moment this merely encapsulates the working directory, the open
+    files (one of which is in use), cached listings of recently visited
+    groups, and an optional file-wide structure index for each file.
+
+    Files are known by aliases (by default, their base names), which can
+    prefix paths as in ``run3.h5:/results/energy``. At most `max_open_files`
+    are kept open at once; the least recently used are closed as needed and
+    reopened on demand. Other keyword arguments select the file driver and
+    tune the HDF5 caches of every file (see `FilePool`).
     """
 
-    def __init__(self, filename, mode='r'):
-        # HDF5 file
-        self.f = h5py.File(filename, mode)
+    def __init__(self, filename, mode='r', cache_entries=64,
+                 cache_bytes=32 * 1024**2, index=False, index_dir=None,
+                 save_index=True, max_open_files=64, **file_options):
+        # Open HDF5 files
+        self.pool = FilePool(max_open_files, **file_options)
+        # Files by alias, in the order they were opened
+        self.sessions = OrderedDict()
+        # Alias of the file in use
+        self.alias = None
+        # HDF5 file in use
+        self.f = None
         # Current group
-        self.group = self.f
+        self.group = None
+        # Classified listings of recently visited groups
+        self.listings = ListingCache(cache_entries, cache_bytes)
         # Groups/datasets inside the current group
         self._cur_items = None
+        # Metadata of the entire file, optionally saved in index_dir
+        self.index = None
+        self.index_dir = index_dir
+        self.save_index = save_index
+        self.index_on_open = index
+
+        self.use(self.open(filename, mode=mode))
+
+    ###########################################################################
+    # FILES
+
+    def open(self, filename, alias=None, mode='r'):
+        """Open a file (if not already open) and return its alias."""
+        realpath = os.path.realpath(filename)
+        for (other, session) in self.sessions.items():
+            if session.filename == realpath:
+                if alias is not None and alias != other:
+                    raise ValueError("{} is already open as {!r}"
+                                     .format(filename, other))
+                return other
+
+        if alias is None:
+            alias = _unique_alias(os.path.basename(realpath), self.sessions)
+        elif alias in self.sessions:
+            raise ValueError("Alias {!r} is already used for {}".format(
+                alias, self.sessions[alias].filename))
+        elif not alias or ':' in alias:
+            raise ValueError("Invalid alias {!r}".format(alias))
+
+        f = self.pool.get(realpath, mode)
+        session = FileSession(realpath, mode)
+        if self.save_index:
+            # Load a previously saved index, if any
+            (session.index, _) = load_index(f, self.index_dir,
+                                            rebuild=self.index_on_open)
+        elif self.index_on_open:
+            from .index import StructureIndex
+            session.index = StructureIndex.build(f)
+        self.sessions[alias] = session
+        return alias
+
+    def use(self, alias):
+        """Switch to another open file, returning to its last group."""
+        try:
+            session = self.sessions[alias]
+        except KeyError:
+            raise ValueError("No open file named {!r}".format(alias))
+        if alias == self.alias:
+            return
+        if self.alias is not None:
+            # Remember where we were in the previous file
+            previous = self.sessions[self.alias]
+            previous.cwd = self.cwd
+            previous.index = self.index
+            self.pool.pinned.discard(previous.filename)
+
+        self.alias = alias
+        self.f = self.pool.get(session.filename, session.mode)
+        self.pool.pinned.add(session.filename)
+        self.group = self.f
+        self.index = session.index
+        self._cur_items = None
+        try:
+            self.chdir(session.cwd)
+        except (KeyError, ValueError):
+            # Group was removed
+            pass
+
+    @contextmanager
+    def using(self, alias):
+        """Temporarily switch to another open file."""
+        previous = self.alias
+        if alias is None or alias == previous:
+            yield
+            return
+        self.use(alias)
+        try:
+            yield
+        finally:
+            if not self.closed:
+                self.use(previous)
+
+    def split_alias(self, path):
+        """Split ``alias:path`` into the alias and the path in that file.
+
+        The alias is None if the path has no such prefix. An unknown prefix
+        naming an existing HDF5 file opens that file. A bare ``alias:`` refers
+        to the current group of that file.
+        """
+        (prefix, sep, rest) = path.partition(':')
+        if not sep or not prefix:
+            return (None, path)
+        if prefix not in self.sessions:
+            if not (os.path.isfile(prefix) and h5py.is_hdf5(prefix)):
+                return (None, path)
+            prefix = self.open(prefix)
+        return (prefix, rest or '.')
+
+    def get(self, path):
+        """Get an HDF5 object by a path that may be prefixed by an alias."""
+        (alias, path) = self.split_alias(path)
+        if alias is None or alias == self.alias:
+            return self.group[path]
+        session = self.sessions[alias]
+        f = self.pool.get(session.filename, session.mode)
+        return f[abspath(path, session.cwd)]
 
     @property
     def subgroups(self):
@@ -45,30 +189,168 @@ class State(object):
             self._update_cur_items()
         return self._cur_items[1]
 
+    def iter_items(self, path=None):
+        """Generate (name, is_group) for the members of a group.
+
+        By default, the members of the current group are generated. Unlike
+        `subgroups` and `datasets`, members that are not yet known are
+        generated as they are read, so a slow listing can be shown (or
+        abandoned) before it is complete. This may run in a background thread:
+        it stops early if the current group changes, and the listing is only
+        cached once all of it has been read.
+        """
+        start = self.group
+        if path is None:
+            group = start
+            items = self._cur_items
+        else:
+            group = start.get(path)
+            if not isinstance(group, h5py.Group):
+                return
+            items = None
+        if items is None:
+            items = self._cached_items(group)
+        if items is not None:
+            for name in items[0]:
+                yield (name, True)
+            for name in items[1]:
+                yield (name, False)
+            return
+
+        key = _listing_key(group)
+        (groups, datasets) = items = ([], [])
+        for item in _iter_classify(group, groups, datasets):
+            if self.group is not start:
+                # Changed directory: the rest is no longer wanted
+                return
+            yield item
+            if self.group is not start:
+                # Don't read another batch of members
+                return
+        self.listings.put_listing(key, groups, datasets)
+        if path is None and self.group is start:
+            self._cur_items = items
+
+    def complete_path(self, text):
+        """Generate (path, is_group) for members matching a partial path.
+
+        The text may be absolute or relative to the current group, including
+        '..', and everything after its last '/' is a prefix of the member
+        name. Generated paths start with the text up to that '/'.
+        """
+        (head, sep, partial) = text.rpartition('/')
+        head += sep
+        base = abspath(head, self.cwd) if head else None
+
+        if self.index is not None:
+            from .index import join_path
+            members = self.index.complete(join_path(base or self.cwd,
+                                                    partial))
+            if members is not None:
+                for (name, is_group) in members:
+                    yield (head + name, is_group)
+                return
+
+        for (name, is_group) in self.iter_items(base):
+            if name.startswith(partial):
+                yield (head + name, is_group)
+
+    def _cached_items(self, group=None):
+        """Listing of a group from the index or cache, if any."""
+        if group is None:
+            group = self.group
+        if self.index is not None:
+            items = self.index.classify(group.name)
+            if items is not None:
+                return items
+        return self.listings.get_listing(_listing_key(group))
+
     def _update_cur_items(self):
-        _cur_group = self.group
-        groups = []
-        datasets = []
-        for key in _cur_group:
-            cls = _cur_group.get(key, getclass=True)
-            if issubclass(cls, h5py.Group):
-                groups.append(key)
-            elif issubclass(cls, h5py.Dataset):
-                datasets.append(key)
-        self._cur_items = (groups, datasets)
+        items = self._cached_items()
+        if items is None:
+            _cur_group = self.group
+            items = _classify(_cur_group)
+            self.listings.put_listing(_listing_key(_cur_group), *items)
+        self._cur_items = items
+
+    def build_index(self):
+        """Walk the entire file and store its structure.
+
+        Unchanged objects in an existing index (in memory or saved) are not
+        reread. Returns a string describing how the index was obtained.
+        """
+        if self.save_index:
+            (self.index, how) = load_index(self.f, self.index_dir,
+                                           rebuild=True)
+        else:
+            from .index import StructureIndex
+            how = "refreshed" if self.index is not None else "built"
+            self.index = StructureIndex.build(self.f, self.index)
+        self._cur_items = None
+        return how
+
+    def drop_index(self):
+        """Discard the structure index, including any saved copy."""
+        if self.save_index:
+            Sidecar(self.filename, self.index_dir).remove()
+        self.invalidate()
+
+    def configure(self, cache_entries=None, cache_bytes=None,
+                  max_open_files=None, **file_options):
+        """Change cache settings given to the constructor.
+
+        If the file in use has to be reopened for new HDF5 settings to take
+        effect, the current group is restored.
+        """
+        self.listings.resize(cache_entries, cache_bytes)
+        if max_open_files is not None:
+            self.pool.resize(max_open_files)
+        if self.pool.configure(**file_options):
+            session = self.sessions[self.alias]
+            cwd = self.cwd
+            self.f = self.group = self.pool.reopen(session.filename,
+                                                   session.mode)
+            self._cur_items = None
+            try:
+                self.chdir(cwd)
+            except (KeyError, ValueError):
+                pass
+
+    def invalidate(self, path=None):
+        """Discard cached metadata after modifying the file.
+
+        With no path, all cached listings are discarded; otherwise only those
+        of the given group and its descendants. The structure index, if any,
+        is discarded in either case.
+        """
+        if path is not None:
+            path = abspath(path, self.cwd)
+        self.listings.invalidate(path, self.sessions[self.alias].filename)
+        self.index = None
+        self._cur_items = None
 
     def close(self):
-        self.f.close()
+        self.listings.clear()
+        self.index = None
+        self.pool.close_all()
+        self.sessions.clear()
+        self.alias = None
         self.f = None
+        self.group = None
 
     @property
     def closed(self):
         return self.f is None
 
     def chdir(self, dir=None):
+        if dir is not None:
+            (alias, dir) = self.split_alias(dir)
+            if alias is not None:
+                self.use(alias)
         if dir is None:
             # Return to base directory
             self.group = self.f
+            self._cur_items = None
             return
 
         if '.' in dir:
@@ -113,6 +395,46 @@ class State(object):
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
+
+def _listing_key(group):
+    """Cache key for a group: its path, object address and file."""
+    return (group.name, h5py.h5o.get_info(group.id).addr,
+            os.path.realpath(group.file.filename))
+
+
+def _unique_alias(name, taken):
+    """Alias based on a name that is not already taken."""
+    alias = name
+    count = 1
+    while alias in taken:
+        count += 1
+        alias = "{}~{:d}".format(name, count)
+    return alias
+
+
+def _classify(group):
+    """Split the members of a group into subgroup and dataset names."""
+    groups = []
+    datasets = []
+    for _ in _iter_classify(group, groups, datasets):
+        pass
+    return (groups, datasets)
+
+
+def _iter_classify(group, groups, datasets):
+    """Append members to subgroup and dataset lists as they are read.
+
+    Generates (name, is_group) for each subgroup and dataset. Links are
+    classified by the kind of object they resolve to.
+    """
+    for meta in iter_members(group, details=False):
+        if meta.kind == GROUP:
+            groups.append(meta.name)
+            yield (meta.name, True)
+        elif meta.kind == DATASET:
+            datasets.append(meta.name)
+            yield (meta.name, False)
+
 ###############################################################################
 # end of Nemesis/python/exnihilotools/h5sh/state.py
 ###############################################################################
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""One-pass summary statistics that can be merged across blocks."""
+
+from __future__ import (division, absolute_import, print_function, )
+#-----------------------------------------------------------------------------#
+import numpy as np
+
+###############################################################################
+
+
+def _check_dtype(dt):
+    if dt.kind not in "biuf":
+        raise ValueError("Statistics require numeric data, not {}"
+                         .format(dt))
+
+
+class Summary(object):
+    """Count, NaN count, extrema, mean and squared deviations of data.
+
+    Each field is a 1-D array with one entry per summarized slice: a single
+    entry for the whole data, or one per index along an axis. Summaries of
+    separate blocks are combined with `update` using the pairwise formulas
+    of Chan et al., which are numerically stable regardless of the order
+    and size of the blocks.
+    """
+
+    def __init__(self, count, nans, vmin, vmax, mean, m2):
+        self.count = count
+        self.nans = nans
+        self.min = vmin
+        self.max = vmax
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def empty(cls, n=1):
+        """Summary of `n` slices of no data."""
+        return cls(np.zeros(n, np.int64), np.zeros(n, np.int64),
+                   np.full(n, np.nan), np.full(n, np.nan),
+                   np.zeros(n), np.zeros(n))
+
+    @classmethod
+    def from_block(cls, block, axis=None):
+        """Summarize an array, or each of its slices along `axis`."""
+        block = np.asarray(block)
+        _check_dtype(block.dtype)
+        if axis is None:
+            values = block.reshape(1, -1)
+        else:
+            values = np.moveaxis(block, axis, 0)
+            values = values.reshape(values.shape[0], -1)
+        values = values.astype(np.float64)
+
+        if block.dtype.kind == 'f':
+            missing = np.isnan(values)
+            nans = missing.sum(axis=1)
+        else:
+            missing = None
+            nans = np.zeros(values.shape[0], np.int64)
+        count = values.shape[1] - nans
+
+        # fmin/fmax ignore NaN (and give NaN only for all-NaN slices)
+        if values.shape[1]:
+            vmin = np.fmin.reduce(values, axis=1)
+            vmax = np.fmax.reduce(values, axis=1)
+        else:
+            vmin = np.full(values.shape[0], np.nan)
+            vmax = np.full(values.shape[0], np.nan)
+
+        if missing is not None:
+            values[missing] = 0
+        mean = values.sum(axis=1) / np.maximum(count, 1)
+        dev = values - mean[:, np.newaxis]
+        if missing is not None:
+            dev[missing] = 0
+        m2 = np.einsum('ij,ij->i', dev, dev)
+        return cls(count, nans, vmin, vmax, mean, m2)
+
+    def update(self, other, where=slice(None)):
+        """Merge the summary of another block into some of our entries."""
+        na = self.count[where]
+        nb = other.count
+        n = na + nb
+        frac = nb / np.maximum(n, 1)
+        delta = other.mean - self.mean[where]
+        self.mean[where] += delta * frac
+        self.m2[where] += other.m2 + delta * delta * na * frac
+        self.count[where] = n
+        self.nans[where] += other.nans
+        self.min[where] = np.fmin(self.min[where], other.min)
+        self.max[where] = np.fmax(self.max[where], other.max)
+
+    @property
+    def std(self):
+        """Population standard deviation (NaN where there is no data)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.m2 / self.count)
+
+    def rows(self):
+        """Generate (count, nans, min, max, mean, std) for each entry."""
+        mean = np.where(self.count > 0, self.mean, np.nan)
+        return zip(self.count, self.nans, self.min, self.max, mean, self.std)
@@ -5,10 +5,15 @@ from __future__ import (division, absolute_import, print_function,
 from six import PY3
 #-----------------------------------------------------------------------------#
 import h5py
+import itertools
 import numpy as np
 import os
 import shlex
 
+from .metadata import (Metadata, HARD, SOFT, EXTERNAL, GROUP, DATASET,
+                       DATATYPE, scan_links)
+from .selection import DatasetView
+
 ###############################################################################
 # STRING UTILITIES
 ###############################################################################
@@ -40,6 +45,60 @@ def shlex_split(s, comments=False, posix=True):
     return result
 
 
+def split_commands(text):
+    """Split text into command lines at unquoted semicolons and newlines.
+
+    Comments (from an unquoted '#' at the start of a word to the end of the
+    line) are removed, and blank commands are skipped.
+    """
+    commands = []
+    current = []
+    quote = None
+    chars = iter(text)
+    for c in chars:
+        if quote is not None:
+            current.append(c)
+            if c == quote:
+                quote = None
+            elif c == '\\' and quote == '"':
+                current.append(next(chars, ''))
+        elif c in '\'"':
+            quote = c
+            current.append(c)
+        elif c == '\\':
+            current.append(c)
+            current.append(next(chars, ''))
+        elif c == '#' and (not current or current[-1].isspace()):
+            for c in chars:
+                if c == '\n':
+                    break
+            commands.append(''.join(current))
+            current = []
+        elif c in ';\n':
+            commands.append(''.join(current))
+            current = []
+        else:
+            current.append(c)
+    commands.append(''.join(current))
+    return [cmd.strip() for cmd in commands if cmd.strip()]
+
+
+def join_brackets(args):
+    """Rejoin arguments that were split at whitespace inside brackets.
+
+    For example, ``['t[1:2,', '3]', '-p']`` becomes ``['t[1:2, 3]', '-p']``.
+    """
+    result = []
+    depth = 0
+    for arg in args:
+        if depth > 0:
+            result[-1] += " " + arg
+        else:
+            result.append(arg)
+        depth = max(0, result[-1].count('[') - result[-1].count(']'))
+    return result
+
+
 def abspath(newpath, curpath):
     """Return the absolute path to the given 'newpath'.
 
@@ -110,6 +169,59 @@ def make_column_kv_fmt(keys, sep=" "):
     return "{{:{:d}s}}{:s}{{!s}}".format(maxlen, sep).format
 
 
+_BYTE_SUFFIXES = "KMGTPE"
+
+
+def parse_bytes(text):
+    """Convert a size such as '64M' or '1.5G' to a number of bytes.
+
+    Suffixes are binary (K = 1024) and case-insensitive; a trailing 'B' or
+    'iB' is allowed.
+    """
+    s = text.strip().upper()
+    for suffix in ("IB", "B"):
+        if s.endswith(suffix) and len(s) > len(suffix):
+            s = s[:-len(suffix)]
+            break
+    mult = 1
+    if s and s[-1] in _BYTE_SUFFIXES:
+        mult = 1024**(_BYTE_SUFFIXES.index(s[-1]) + 1)
+        s = s[:-1]
+    try:
+        value = float(s) * mult
+    except ValueError:
+        raise ValueError("Invalid size {!r}".format(text))
+    # Also rejects NaN, and infinity which can't be converted to an integer
+    if not 0 <= value < float('inf'):
+        raise ValueError("Invalid size {!r}".format(text))
+    return int(value)
+
+
+def parse_fraction(text):
+    """Convert a number from 0 to 1, such as a cache preemption policy."""
+    value = float(text)
+    if not 0 <= value <= 1:
+        raise ValueError("Expected a number from 0 to 1, not {}".format(text))
+    return value
+
+
+def format_bytes(nbytes):
+    """Format a number of bytes like 'du -h': e.g. 512, 1.5K, 24M.
+    """
+    value = float(nbytes)
+    suffix = ""
+    for next_suffix in _BYTE_SUFFIXES:
+        if abs(value) < 1024:
+            break
+        value /= 1024
+        suffix = next_suffix
+    if not suffix:
+        return "{:d}".format(int(nbytes))
+    if abs(value) < 10:
+        return "{:.1f}{}".format(value, suffix)
+    return "{:.0f}{}".format(value, suffix)
+
+
 if PY3:
     def unescape_string(text):
         return bytes(text, "utf-8").decode("unicode_escape")
@@ -194,32 +306,74 @@ def items(group):
     possible.
 
     The only returned link types are External or Soft. Hard links are opened
-    and the corresponding item is returned.
+    and the corresponding item is returned. The names and link types are read
+    in a single pass over the group.
     """
-    for key in group:
-        value = group.get(key, getlink=True)
-        if isinstance(value, h5py.HardLink):
+    links = []
+    scan_links(group, lambda key, link: links.append((key, link)), info=True)
+    gid = group.id
+    for (key, link) in links:
+        if link == HARD:
             # Get the actual corresponding dataset or group
             value = group[key]
+        elif link == SOFT:
+            path = gid.links.get_val(key.encode('utf-8'))
+            value = h5py.SoftLink(path.decode('utf-8'))
+        elif link == EXTERNAL:
+            (filename, path) = gid.links.get_val(key.encode('utf-8'))
+            value = h5py.ExternalLink(filename.decode('utf-8'),
+                                      path.decode('utf-8'))
+        else:
+            value = group.get(key, getlink=True)
         yield (key, value)
 
 
+def _describe_group(nitems):
+    return "Group ({:d} item{:s})".format(nitems, "s" if nitems != 1 else "")
+
+
+def _describe_dataset(dtype, shape):
+    return "Dataset ({:s}: {:s})".format(dtype.char, format_shape(shape))
+
+
+def _describe_link(path, filename=None):
+    if filename is None:
+        return "Link ({:s})".format(path)
+    if os.path.isabs(filename):
+        filename = os.path.sep.join(['...', os.path.basename(filename)])
+    return "Link ({:s}:{:s})".format(filename, path)
+
+
+def _describe_metadata(meta):
+    if meta.link != HARD:
+        return _describe_link(meta.target, meta.filename)
+    if meta.kind == GROUP:
+        return _describe_group(meta.nchildren)
+    elif meta.kind == DATASET:
+        return _describe_dataset(meta.dtype, meta.shape)
+    elif meta.kind == DATATYPE:
+        return "Datatype ({:s})".format(meta.dtype.char)
+    return "Object"
+
+
 def short_describe(obj):
     """Return a short description of the given group/dataset.
+
+    The object may also be a `Metadata` record, in which case the file is not
+    accessed.
     """
-    if isinstance(obj, h5py.Group):
-        return "Group ({:d} item{:s})".format(len(obj),
-                                              "s" if len(obj) != 1 else "")
+    if isinstance(obj, Metadata):
+        return _describe_metadata(obj)
+    elif isinstance(obj, h5py.Group):
+        return _describe_group(len(obj))
     elif isinstance(obj, h5py.Dataset):
-        return "Dataset ({:s}: {:s})".format(
-            obj.dtype.char, format_shape(obj.shape))
+        return _describe_dataset(obj.dtype, obj.shape)
+    elif isinstance(obj, h5py.Datatype):
+        return "Datatype ({:s})".format(obj.dtype.char)
     elif isinstance(obj, h5py.SoftLink):
-        return "Link ({:s})".format(obj.path)
+        return _describe_link(obj.path)
     elif isinstance(obj, h5py.ExternalLink):
-        filename = obj.filename
-        if os.path.isabs(filename):
-            filename = os.path.sep.join(['...', os.path.basename(filename)])
-        return "Link ({:s}:{:s})".format(filename, obj.path)
+        return _describe_link(obj.path, obj.filename)
     elif isinstance(obj, h5py.HardLink):
         return "Object"
     else:
@@ -241,12 +395,11 @@ def extract(data):
 
     if shape:
         # Extract array data (possibly compound)
-        data = data[:]
-        if PY3 and data.size and isinstance(next(data.flat), bytes):
-            # In Python 3, variable-length ASCII strings are read as bytes,
-            # which causes everything else in python 3 to be super unhappy.
-            # Just convert it to strings.
-            data = to_native_str_array(data)
+        if (isinstance(data, (h5py.Dataset, DatasetView))
+                and string_encoding(data.dtype) is not None):
+            data = read_strings(data)
+        else:
+            data = _native_array(data[:])
     else:
         # Extract scalar data
         try:
@@ -262,3 +415,118 @@ def extract(data):
             data = to_native_str(data)
 
     return data
+
+
+def _native_array(data):
+    """Convert arrays of byte strings to native strings."""
+    encoding = string_encoding(data.dtype)
+    if encoding is not None:
+        data = decode_strings(data, encoding)
+    return data
+
+
+# Number of strings decoded at once by the block-wise fallback
+_DECODE_BLOCK = 1 << 16
+
+try:
+    _STRING_DTYPE = np.dtypes.StringDType()
+except AttributeError:
+    # NumPy < 2
+    _STRING_DTYPE = None
+
+
+def string_encoding(dtype):
+    """Encoding of an HDF5 string datatype, or None for other types."""
+    info = h5py.check_string_dtype(dtype)
+    if info is not None:
+        return info.encoding
+    if dtype.kind == 'S':
+        return 'ascii'
+    return None
+
+
+def decode_strings(arr, encoding='utf-8'):
+    """Convert an array of byte strings to native strings.
+
+    The conversion is chosen from the datatype rather than the values:
+    fixed-length ASCII strings are cast in bulk to a ``U`` array. Otherwise
+    the strings are decoded in blocks into an object array, so that at most
+    one block of temporary data exists at a time; elements that are already
+    native strings are kept.
+    """
+    if not PY3 or arr.dtype.kind not in 'SO':
+        return arr
+    if arr.dtype.kind == 'S' and encoding == 'ascii':
+        return arr.astype('U')
+
+    result = np.empty(arr.shape, dtype=object)
+    flat = arr.reshape(-1)
+    out = result.reshape(-1)
+    for start in range(0, flat.size, _DECODE_BLOCK):
+        block = flat[start:start + _DECODE_BLOCK]
+        out[start:start + _DECODE_BLOCK] = [
+            b.decode(encoding) if isinstance(b, bytes) else b for b in block]
+    return result
+
+
+def read_strings(data):
+    """Read a string dataset (or `DatasetView`) as native strings.
+
+    With h5py and NumPy versions that support it, variable-length strings
+    are converted by HDF5 straight into a ``StringDType`` array, which avoids
+    creating a Python bytes object for every element.
+    """
+    encoding = string_encoding(data.dtype)
+    (dset, sel) = (data, ())
+    if isinstance(data, DatasetView):
+        (dset, sel) = (data.dataset, data.source_selection)
+    if PY3 and _STRING_DTYPE is not None and data.dtype.kind == 'O':
+        try:
+            return dset.astype(_STRING_DTYPE)[sel]
+        except (TypeError, ValueError, IOError):
+            # HDF5 may lack a conversion path, e.g. for ASCII strings until
+            # a UTF-8 conversion has been registered
+            pass
+    return decode_strings(dset[sel], encoding)
+
+
+def extract_edges(data, edgeitems):
+    """Extract only the parts of an array that a summarized print shows.
+
+    Every axis longer than ``2 * edgeitems`` is reduced to its first and last
+    `edgeitems` entries, with a single placeholder entry between them. Since
+    that axis is still longer than ``2 * edgeitems``, printing the result with
+    ``np.array2string(result, edgeitems=edgeitems, threshold=0)`` gives exactly
+    the same text as summarizing the full array, but only the corner
+    hyperslabs are ever read from the file.
+    """
+    shape = data.shape
+    axes = []
+    out_shape = []
+    for n in shape:
+        if n > 2 * edgeitems:
+            e = edgeitems
+            # (source, destination) for the leading and trailing edges
+            axes.append(((slice(0, e), slice(0, e)),
+                         (slice(n - e, n), slice(e + 1, 2 * e + 1))))
+            out_shape.append(2 * e + 1)
+        else:
+            axes.append(((slice(0, n), slice(0, n)),))
+            out_shape.append(n)
+
+    result = np.empty(out_shape, dtype=data.dtype)
+    for corner in itertools.product(*axes):
+        src = tuple(s for (s, _) in corner)
+        dst = tuple(d for (_, d) in corner)
+        result[dst] = data[src]
+
+    # Fill the (never printed) placeholders with valid values
+    for (axis, n) in enumerate(shape):
+        if n > 2 * edgeitems:
+            index = [slice(None)] * len(shape)
+            neighbor = list(index)
+            index[axis] = edgeitems
+            neighbor[axis] = edgeitems - 1
+            result[tuple(index)] = result[tuple(neighbor)]
+
+    return _native_array(result)
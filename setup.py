@@ -19,19 +19,14 @@ setup(
         "Intended Audience :: Developers",
         "License :: OSI Approved :: BSD License",
         "Natural Language :: English",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.4",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
     ],
     description="Fast shell-like tool for interacting with HDF5 files.",
     entry_points={"console_scripts": ["h5sh=h5sh.scripts.main:main"],},
     include_package_data=True,
     install_requires=[
-        "h5py>=2.7.1",
+        "h5py>=3.0",
         "prompt-toolkit>=2.0",
         "numpy>=1.15",
         "pygments",
@@ -42,6 +37,7 @@ setup(
     keywords="h5sh",
     name="h5sh",
     packages=find_packages(include=["h5sh", "h5sh.*"]),
+    python_requires=">=3.7",
     test_suite="tests",
     tests_require=["pytest"],
     url="https://github.com/sethrj/h5sh",
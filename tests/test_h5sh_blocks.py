@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import numpy as np
+
+import h5sh.blocks as module
+
+def test_block_shape():
+    # Whole dataset fits
+    assert module.block_shape((10, 20), (5, 5), 8, 10000) == (10, 20)
+    # Grow whole rows of chunks
+    assert module.block_shape((100, 20), (5, 5), 8, 8 * 20 * 12) == (10, 20)
+    # Partial last axis: stop growing
+    assert module.block_shape((100, 200), (5, 5), 1, 100) == (5, 20)
+    # Never smaller than a chunk
+    assert module.block_shape((100, 200), (10, 10), 8, 1) == (10, 10)
+    # Contiguous: grow by elements
+    assert module.block_shape((100, 30), None, 4, 4 * 30 * 7) == (7, 30)
+    assert module.block_shape((), None, 8, 1) == ()
+    # Empty (e.g. extendable) datasets
+    assert module.block_shape((0, 5), (4, 5), 8, 100) == (0, 5)
+    assert list(module.iter_blocks((0, 5), (0, 5))) == []
+
+def test_iter_blocks():
+    blocks = list(module.iter_blocks((5, 4), (2, 3)))
+    assert blocks[:3] == [(slice(0, 2), slice(0, 3)),
+                          (slice(0, 2), slice(3, 4)),
+                          (slice(2, 4), slice(0, 3))]
+    assert len(blocks) == 6
+    covered = np.zeros((5, 4), dtype=int)
+    for sel in blocks:
+        covered[sel] += 1
+    assert (covered == 1).all()
+
+    assert list(module.iter_blocks((), ())) == [()]
+    assert list(module.iter_blocks((0, 3), (1, 3))) == []
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import pytest
+
+import h5sh.cache as module
+
+def test_lru_entries():
+    cache = module.LRUCache(max_entries=2, max_bytes=100)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    # 'b' is now least recently used
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_lru_bytes():
+    cache = module.LRUCache(max_entries=10, max_bytes=100)
+    cache.put('a', 1, nbytes=60)
+    cache.put('b', 2, nbytes=30)
+    assert cache.nbytes == 90
+    cache.put('c', 3, nbytes=30)
+    assert 'a' not in cache
+    assert cache.nbytes == 60
+    # Too large to ever be stored
+    cache.put('d', 4, nbytes=101)
+    assert 'd' not in cache
+    assert len(cache) == 2
+    cache.resize(max_bytes=30)
+    assert list(cache) == ['c']
+
+def test_listing_invalidate():
+    cache = module.ListingCache()
+    for path in ['/', '/a', '/a/b', '/ab']:
+        cache.put_listing((path, 0), ['g'], ['d'])
+    assert cache.get_listing(('/a', 0)) == (['g'], ['d'])
+    assert cache.nbytes > 0
+    cache.invalidate('/a/')
+    assert sorted(k[0] for k in cache) == ['/', '/ab']
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import h5py
+import numpy as np
+import pytest
+
+import h5sh.chunks as module
+
+@pytest.fixture
+def chunked(tmpdir):
+    filename = str(tmpdir / "chunked.h5")
+    with h5py.File(filename, 'w') as f:
+        d = f.create_dataset('data', shape=(25, 30), chunks=(10, 10),
+                             dtype='i4', compression='gzip')
+        d[:12] = np.arange(12 * 30).reshape(12, 30)
+        f.create_dataset('empty', shape=(4,), chunks=(2,), dtype='f8')
+        f['contiguous'] = np.arange(3)
+    with h5py.File(filename, 'r') as f:
+        yield f
+
+def test_chunk_table(chunked):
+    table = module.ChunkTable.from_dataset(chunked['data'])
+    assert table.grid == (3, 3)
+    assert table.nchunks == 9
+    assert len(table) == 6
+    assert table.chunk_nbytes == 400
+    assert sorted(map(tuple, table.indices.tolist())) == [
+        (0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)]
+    assert table.offsets.tolist()[0] == [0, 0]
+    assert table.nbytes == chunked['data'].id.get_storage_size()
+    assert table.filtered.all()
+    ratios = table.ratio_percentiles((0, 100))
+    assert ratios[0] == pytest.approx(table.ratios.min())
+    assert ratios[1] > 1
+    # Same as looking up chunks one at a time
+    info = chunked['data'].id.get_chunk_info(2)
+    assert table.addresses[2] == info.byte_offset
+    assert table.sizes[2] == info.size
+
+def test_chunk_table_empty(chunked):
+    table = module.ChunkTable.from_dataset(chunked['empty'])
+    assert len(table) == 0
+    assert table.nchunks == 2
+    assert table.indices.shape == (0, 1)
+    assert np.isnan(table.ratio_percentiles()).all()
+    with pytest.raises(ValueError):
+        module.ChunkTable.from_dataset(chunked['contiguous'])
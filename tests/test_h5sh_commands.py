@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import pytest
+import h5py
+import numpy as np
+import re
+import shutil
 
 from h5sh.state import State
 import h5sh.commands as module
@@ -134,3 +138,464 @@ def test_help(tmpstate, capsys):
     s = capsys.readouterr().out
     assert s.startswith("Available commands:")
 
+def test_ls_index(tmpstate, capsys):
+    cmd = module.COMMANDS['ls']
+    module.COMMANDS['index'](tmpstate)
+    assert capsys.readouterr().out.startswith("Built index of 11 objects")
+    cmd(tmpstate, '-l')
+    assert """\
+extgroup             Link (.../example-data-external.h5:external_group)
+extlink              Link (.../example-data-external.h5:external_ds)
+group                Group (3 items)
+link                 Dataset (i: 3)
+softlink             Link (/group/scalar)
+subsubgroup_hardlink Group (0 items)
+""" == capsys.readouterr().out
+    cmd(tmpstate, 'group')
+    assert 'scalar subgroup vector\n' == capsys.readouterr().out
+    cmd(tmpstate, '-1', '/group')
+    assert 'scalar\nsubgroup\nvector\n' == capsys.readouterr().out
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_ls_pages(tmpstate, capsys, indexed):
+    cmd = module.COMMANDS['ls']
+    if indexed:
+        tmpstate.build_index()
+    cmd(tmpstate, '--offset', '1', '--limit', '2', 'group')
+    assert 'subgroup vector\n' == capsys.readouterr().out
+    cmd(tmpstate, '--offset', '3', 'group')
+    assert '' == capsys.readouterr().out
+    cmd(tmpstate, '--limit', '0', 'group')
+    assert '' == capsys.readouterr().out
+    with pytest.raises(ValueError):
+        cmd(tmpstate, '--offset=-1')
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_ls_unsorted(example_h5_filename, capsys, monkeypatch, indexed):
+    names = ['zeta', 'alpha', 'mu']
+    with h5py.File(example_h5_filename, 'a') as f:
+        g = f.create_group('ordered', track_order=True)
+        for name in names:
+            g.create_group(name)
+    cmd = module.COMMANDS['ls']
+    monkeypatch.setattr(module.navigation._Lister, 'page_size', 2)
+    # The structure index has no creation order, so it isn't used with -U
+    with State(example_h5_filename, index=indexed) as state:
+        cmd(state, '-U', '-1', 'ordered')
+        assert capsys.readouterr().out.split() == names
+        cmd(state, '-U', '--offset', '1', 'ordered')
+        assert capsys.readouterr().out.split() == names[1:]
+        # Printed a page at a time
+        cmd(state, 'ordered')
+        assert 'alpha mu\nzeta\n' == capsys.readouterr().out
+
+def test_ls_index_page(example_h5_filename, capsys, monkeypatch):
+    from h5sh.index import StructureIndex
+    with h5py.File(example_h5_filename, 'a') as f:
+        g = f.create_group('wide')
+        for i in range(20):
+            g['d{:02d}'.format(i)] = i
+    rows = []
+    entry = StructureIndex.entry
+
+    def counting_entry(self, row, *args):
+        rows.append(row)
+        return entry(self, row, *args)
+
+    monkeypatch.setattr(StructureIndex, 'entry', counting_entry)
+    cmd = module.COMMANDS['ls']
+    with State(example_h5_filename, index=True) as state:
+        del rows[:]
+        cmd(state, '--offset', '5', '--limit', '2', 'wide')
+        assert capsys.readouterr().out == 'd05 d06\n'
+        assert rows == []
+        cmd(state, '-l', '--offset', '5', '--limit', '2', 'wide')
+        assert [l.split()[0] for l in capsys.readouterr().out.splitlines()
+                ] == ['d05', 'd06']
+        # Only the requested page is reconstructed
+        assert len(rows) == 2
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_find(example_h5_filename, capsys, indexed):
+    cmd = module.COMMANDS['find']
+    with h5py.File(example_h5_filename, 'a') as f:
+        f.create_dataset('chunked', shape=(10, 10), chunks=(5, 5), dtype='i2')
+    tmpstate = State(example_h5_filename, index=indexed)
+
+    def find(*args):
+        cmd(tmpstate, *args)
+        return sorted(capsys.readouterr().out.split())
+
+    assert find('-type', 'd') == ['/group', '/group/subgroup',
+                                  '/group/subgroup/subsubgroup',
+                                  '/subsubgroup_hardlink']
+    assert find('-type', 'l') == ['/extgroup', '/extlink', '/softlink']
+    assert find('group', '-type', 'f') == ['/group/scalar', '/group/vector']
+    assert find('-name', '*sub*', '-type', 'd') == [
+        '/group/subgroup', '/group/subgroup/subsubgroup',
+        '/subsubgroup_hardlink']
+    assert find('-regex', 'group/s') == ['/group/scalar', '/group/subgroup',
+                                         '/group/subgroup/subsubgroup']
+    assert find('-dtype', 'i4') == ['/group/vector', '/link']
+    assert find('-dtype', 'f') == ['/group/scalar']
+    assert find('-size', '+8') == ['/chunked', '/group/vector', '/link']
+    assert find('-size=-9') == ['/group/scalar']
+    assert find('-size', '8') == ['/group/scalar']
+    assert find('-attr', 'c*') == ['/group', '/group/scalar']
+    assert find('-chunked') == ['/chunked']
+    tmpstate.chdir('group')
+    assert find('subgroup') == ['/group/subgroup/subsubgroup']
+    tmpstate.close()
+
+@pytest.fixture
+def hardlinked_h5_filename(example_h5_filename):
+    with h5py.File(example_h5_filename, 'a') as f:
+        f['group/subgroup/subsubgroup/deep'] = np.arange(200.)
+        f['group/subgroup/subsubgroup/deeper/data'] = np.arange(10)
+        f['softgrp'] = h5py.SoftLink('/group')
+    yield example_h5_filename
+
+HARDLINKED_ROOTS = [('/', None), ('/', 'group'), ('/', 'softgrp'),
+                    ('/', 'subsubgroup_hardlink'),
+                    ('/group/subgroup/subsubgroup', None),
+                    ('/group', 'subgroup/subsubgroup/deeper'),
+                    ('/softgrp/subgroup', None)]
+
+def run_indexed_and_walked(filename, capsys, cwd, *args):
+    """Output of a command with and without the structure index."""
+    outputs = []
+    for indexed in [False, True]:
+        with State(filename, index=indexed) as state:
+            state.chdir(cwd)
+            module.COMMANDS[args[0]](state, *args[1:])
+            outputs.append(capsys.readouterr().out)
+    return outputs
+
+@pytest.mark.parametrize('cwd,group', HARDLINKED_ROOTS)
+def test_find_hardlinked(hardlinked_h5_filename, capsys, cwd, group):
+    args = ['find'] + ([group] if group else [])
+    (walked, indexed) = run_indexed_and_walked(hardlinked_h5_filename,
+                                               capsys, cwd, *args)
+    assert sorted(walked.split()) == sorted(indexed.split())
+    # Everything is found below the searched group
+    root = group if group else cwd
+    root = root if root.startswith('/') else cwd.rstrip('/') + '/' + root
+    assert walked and all(p.startswith(root.rstrip('/') + '/')
+                          for p in walked.split())
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_du(tmpstate, capsys, indexed):
+    cmd = module.COMMANDS['du']
+    if indexed:
+        tmpstate.build_index()
+    cmd(tmpstate)
+    # The hard link /link to /group/vector is only counted once
+    assert """\
+       0        0  /group/subgroup/subsubgroup
+       0        0  /group/subgroup
+      20       20  /group
+       0        0  /subsubgroup_hardlink
+      20       20  /
+""" == capsys.readouterr().out
+    cmd(tmpstate, '-s', '-j', '1', 'group')
+    assert "      20       20  /group\n" == capsys.readouterr().out
+    cmd(tmpstate, '-h', '--max-depth', '1')
+    assert """\
+      20       20  /group
+       0        0  /subsubgroup_hardlink
+      20       20  /
+""" == capsys.readouterr().out
+
+@pytest.mark.parametrize('cwd,group', HARDLINKED_ROOTS)
+def test_du_hardlinked(hardlinked_h5_filename, capsys, cwd, group):
+    args = ['du'] + ([group] if group else [])
+    (walked, indexed) = run_indexed_and_walked(hardlinked_h5_filename,
+                                               capsys, cwd, *args)
+    assert walked == indexed
+
+def test_dump_truncated(example_h5_filename, capsys):
+    data = np.arange(200 * 300, dtype='f4').reshape(200, 300) * 1.5
+    with h5py.File(example_h5_filename, 'a') as f:
+        f.create_dataset('big', data=data, chunks=(50, 50))
+    cmd = module.COMMANDS['dump']
+    with State(example_h5_filename) as state:
+        cmd(state, '-t', '50', '-p', '2', 'big')
+    out = capsys.readouterr().out
+    assert "Truncating dataset (60000 exceeds threshold 50)" in out
+    expected = np.array2string(data, threshold=50, edgeitems=5,
+                               precision=2)
+    assert out.endswith("---\n" + expected + "\n")
+
+
+def test_dump_selection(example_h5_filename, capsys):
+    data = np.arange(200 * 300, dtype='f4').reshape(200, 300)
+    with h5py.File(example_h5_filename, 'a') as f:
+        f.create_dataset('big', data=data, chunks=(50, 50))
+    cmd = module.COMMANDS['dump']
+    with State(example_h5_filename) as state:
+        cmd(state, '/group/vector[1:]')
+        out = capsys.readouterr().out
+        assert "Selection: [1:] 2\n" in out
+        assert out.endswith("---\n[2 3]\n")
+
+        # Selections split at whitespace are rejoined
+        cmd(state, '-t', '1000', 'big[10:20,', '::50]')
+        out = capsys.readouterr().out
+        assert "Shape: 200" in out
+        assert "Selection: [10:20, ::50] 10" in out
+        expected = np.array2string(data[10:20, ::50], threshold=1000)
+        assert out.endswith("---\n" + expected + "\n")
+
+        cmd(state, 'big[5, 7]')
+        assert capsys.readouterr().out.endswith("---\n1507.0\n")
+
+        with pytest.raises(ValueError):
+            cmd(state, 'big[1, 2, 3]')
+        with pytest.raises(TypeError):
+            cmd(state, 'big[1:a]')
+
+def test_export(example_h5_filename, tmpdir):
+    data = np.arange(100 * 60, dtype='f4').reshape(100, 60)
+    with h5py.File(example_h5_filename, 'a') as f:
+        f.create_dataset('big', data=data, chunks=(10, 10))
+    out = str(tmpdir.join("big.npy"))
+    with State(example_h5_filename) as state:
+        module.COMMANDS['export'](state, '-B', '1K', 'big[20:, ::2]', out)
+        np.testing.assert_array_equal(np.load(out), data[20:, ::2])
+
+        raw = str(tmpdir.join("vector.raw"))
+        module.COMMANDS['dump'](state, '-f', 'raw', '-o', raw,
+                                '/group/vector')
+        assert np.fromfile(raw, dtype='<i4').tolist() == [1, 2, 3]
+        with pytest.raises(ValueError):
+            module.COMMANDS['dump'](state, '-f', 'npy', '/group/vector')
+
+def test_stats(example_h5_filename, capsys):
+    data = np.arange(50 * 40, dtype='f8').reshape(50, 40)
+    data[3, 3] = np.nan
+    with h5py.File(example_h5_filename, 'a') as f:
+        f.create_dataset('big', data=data, chunks=(8, 8))
+    cmd = module.COMMANDS['stats']
+    with State(example_h5_filename) as state:
+        cmd(state, '-B', '1K', '-j', '3', 'big')
+        out = capsys.readouterr().out
+        assert out == """\
+count 1999
+nan   1
+min   0
+max   1999
+mean  {:.6g}
+std   {:.6g}
+""".format(np.nanmean(data), np.nanstd(data))
+
+        cmd(state, '-a', '-1', 'big[2:4, :3]')
+        assert capsys.readouterr().out == """\
+index  count  nan  min  max  mean  std
+    0      2    0   80  120   100   20
+    1      2    0   81  121   101   20
+    2      2    0   82  122   102   20
+"""
+        with pytest.raises(ValueError):
+            cmd(state, '-a', '2', 'big')
+        with pytest.raises(ValueError):
+            cmd(state, '/group')
+
+def test_stats_empty(example_h5_filename, capsys):
+    with h5py.File(example_h5_filename, 'a') as f:
+        f.create_dataset('empty', shape=(0, 5), maxshape=(None, 5),
+                         chunks=(4, 5), dtype='f8')
+    cmd = module.COMMANDS['stats']
+    with State(example_h5_filename) as state:
+        cmd(state, 'empty')
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[:2] == ["count 0", "nan   0"]
+        cmd(state, '-a', '1', 'empty')
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == 6
+        assert lines[1].split()[:3] == ["0", "0", "0"]
+
+def test_files(example_h5_filename, tmpdir, capsys):
+    other = str(tmpdir / "example-data-external.h5")
+    with State(example_h5_filename) as state:
+        module.COMMANDS['open'](state, '-a', 'ext', other)
+        assert state.alias == 'ext'
+        module.COMMANDS['ls'](state)
+        assert capsys.readouterr().out.split() == ['external_ds',
+                                                   'external_group']
+
+        # Paths in another file
+        module.COMMANDS['dump'](state, 'example-data.h5:/group/vector[1:]')
+        out = capsys.readouterr().out
+        assert "Dataset: /group/vector" in out
+        assert out.endswith("[2 3]\n")
+        assert state.alias == 'ext'
+        with pytest.raises(ValueError):
+            module.COMMANDS['du'](state, 'nosuchfile:/group')
+
+        module.COMMANDS['use'](state, 'example-data.h5')
+        module.COMMANDS['files'](state)
+        out = capsys.readouterr().out.splitlines()
+        assert out[0].startswith("* example-data.h5  ")
+        assert out[1].startswith("  ext  ")
+        with pytest.raises(ValueError):
+            module.COMMANDS['use'](state, 'nope')
+
+def test_time(tmpstate, capsys):
+    cmd = module.COMMANDS['time']
+    cmd(tmpstate, 'ls', 'group')
+    captured = capsys.readouterr()
+    assert captured.out == 'scalar subgroup vector\n'
+    assert re.match(r"real \d+\.\d{3}s  cpu \d+\.\d{3}s\n$", captured.err)
+    with pytest.raises(ValueError):
+        cmd(tmpstate)
+    with pytest.raises(ValueError):
+        cmd(tmpstate, 'bogus')
+    assert capsys.readouterr().err == ''
+
+def test_profile(tmpstate, capsys, tmpdir):
+    import pstats
+    cmd = module.COMMANDS['profile']
+    cmd(tmpstate, '-n', '5', '-s', 'tottime', 'ls', '-l')
+    out = capsys.readouterr().out
+    assert out.startswith("extgroup ")
+    assert "Ordered by: internal time" in out
+
+    prof = str(tmpdir / "ls.prof")
+    cmd(tmpstate, '-o', prof, 'ls')
+    assert capsys.readouterr().out.startswith("extgroup ")
+    stats = pstats.Stats(prof)
+    assert any(func[2] == 'execute' for func in stats.stats)
+
+def test_set(example_h5_filename, capsys):
+    cmd = module.COMMANDS['set']
+    with State(example_h5_filename, rdcc_nbytes=2 * 1024**2) as state:
+        state.chdir('group')
+        cmd(state, 'rdcc-nbytes')
+        assert capsys.readouterr().out == "rdcc-nbytes = 2.0M\n"
+        cmd(state, 'rdcc-nbytes', '64M')
+        cmd(state, 'cache-entries', '8')
+        cmd(state)
+        out = capsys.readouterr().out
+        assert "rdcc-nbytes      = 64M\n" in out
+        assert "cache-entries    = 8\n" in out
+        # File was reopened in the same group
+        assert state.cwd == '/group'
+        assert state.f.id.get_access_plist().get_cache()[2] == 64 * 1024**2
+        with pytest.raises(TypeError):
+            cmd(state, 'bogus', '1')
+        with pytest.raises(ValueError):
+            cmd(state, 'rdcc-w0', '1.5')
+        cmd(state, 'driver', 'core')
+        assert state.f.driver == 'core'
+        assert state.filename == example_h5_filename
+        with pytest.raises(ValueError):
+            cmd(state, 'driver', 'family')
+
+def test_cache(tmpstate, capsys):
+    module.COMMANDS['ls'](tmpstate, 'group')
+    tmpstate.subgroups
+    capsys.readouterr()
+    module.COMMANDS['cache'](tmpstate, '--reset')
+    lines = capsys.readouterr().out.splitlines()
+    assert [l.split("  ")[0] for l in lines] == [
+        "Metadata cache", "Chunk cache", "Group listings", "Open files"]
+    assert "hit rate" in lines[0]
+    assert lines[2].startswith("Group listings  1/64 entries")
+
+def test_chunks(example_h5_filename, capsys):
+    with h5py.File(example_h5_filename, 'a') as f:
+        d = f.create_dataset('big', shape=(30, 20), chunks=(10, 10),
+                             dtype='f8', compression='gzip')
+        d[:10] = 0
+    cmd = module.COMMANDS['chunks']
+    with State(example_h5_filename) as state:
+        cmd(state, 'big')
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[:5] == [
+            "shape        30×20",
+            "chunk shape  10×10 (800 uncompressed)",
+            "chunk grid   3×2",
+            "allocated    2 of 6 chunks (33.3%)",
+            "stored       {} of 1.6K allocated".format(
+                state.f['big'].id.get_storage_size()),
+        ]
+        assert lines[5] == "filters      deflate"
+        assert lines[6].startswith("ratio        min ")
+
+        cmd(state, '-l', '-s', 'address', '-n', '1', 'big')
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[0].split() == ["chunk", "address", "size", "ratio"]
+        assert len(lines) == 2
+        assert lines[1].split()[0] in ("0,0", "0,1")
+        with pytest.raises(ValueError):
+            cmd(state, 'group')
+        with pytest.raises(ValueError):
+            cmd(state, 'nonexistent')
+
+def test_diff(example_h5_filename, tmpdir, capsys):
+    other = str(tmpdir / "other.h5")
+    shutil.copy(example_h5_filename, other)
+    with h5py.File(other, 'a') as f:
+        f['group/extra'] = 1
+    cmd = module.COMMANDS['diff']
+    with State(example_h5_filename) as state:
+        cmd(state, 'group', 'group')
+        assert capsys.readouterr().out == ""
+        with pytest.raises(ValueError) as excinfo:
+            cmd(state, '-j', '2', '/', other + ':/')
+        assert str(excinfo.value) == "1 difference found"
+        assert capsys.readouterr().out == "/group/extra: only in second\n"
+        # Still browsing the first file
+        assert state.alias == "example-data.h5"
+        with pytest.raises(ValueError) as excinfo:
+            cmd(state, '-q', 'group', 'other.h5:group')
+        assert "differ" in str(excinfo.value)
+        assert capsys.readouterr().out == ""
+        with pytest.raises(ValueError):
+            cmd(state, 'nonexistent', 'group')
+        with pytest.raises(TypeError):
+            cmd(state, '--rtol=-1', 'group', 'group')
+
+def test_cp(example_h5_filename, tmpdir, capsys):
+    out = str(tmpdir / "subset.h5")
+    cmd = module.COMMANDS['cp']
+    with State(example_h5_filename) as state:
+        state.chdir('group')
+        cmd(state, '-v', '-o', out, 'vector', '/softlink')
+        assert capsys.readouterr().out == "/group/vector\n/softlink\n"
+        with pytest.raises(ValueError):
+            cmd(state, '-o', out, 'scalar')
+        cmd(state, '-a', '-o', out, '-name', 's*', '-type', 'd')
+        with pytest.raises(ValueError):
+            cmd(state, '-o', out, '-f', '-a', 'scalar')
+        with pytest.raises(ValueError):
+            cmd(state, '-o', out, '-f', 'nonexistent')
+        with pytest.raises(ValueError):
+            cmd(state, '-o', str(example_h5_filename), '-f', 'scalar')
+    with h5py.File(out, 'r') as f:
+        assert f['group/vector'][()].tolist() == [1, 2, 3]
+        assert f.get('softlink', getlink=True).path == '/group/scalar'
+        assert '/group/subgroup/subsubgroup' in f
+        assert 'scalar' not in f['group']
+
+def test_cp_alias(example_h5_filename, tmpdir, capsys):
+    other = str(tmpdir / "b.h5")
+    with h5py.File(other, 'w') as f:
+        f.create_group('in_b')['data'] = [4, 5]
+    out = str(tmpdir / "out.h5")
+    cmd = module.COMMANDS['cp']
+    with State(example_h5_filename) as state:
+        state.open(other, 'bb')
+        cmd(state, '-v', '-o', out, 'bb:/in_b/data')
+        assert capsys.readouterr().out == "/in_b/data\n"
+        # Searches in the group of another file
+        cmd(state, '-f', '-v', '-o', out, '-type', 'd', 'bb:/')
+        assert capsys.readouterr().out == "/in_b\n"
+        assert state.filename == str(example_h5_filename)
+        with pytest.raises(ValueError):
+            cmd(state, '-f', '-o', out, 'bb:/in_b', '/group')
+        with pytest.raises(ValueError):
+            cmd(state, '-f', '-o', other, 'bb:/in_b')
+    with h5py.File(out, 'r') as f:
+        assert f['in_b/data'][()].tolist() == [4, 5]
+        assert 'group' not in f
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import pytest
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+
+from h5sh.console import CommandCompleter
+from h5sh.state import State
+
+@pytest.fixture
+def completer(example_h5_filename):
+    with State(example_h5_filename) as state:
+        yield CommandCompleter(state)
+
+def complete(completer, text):
+    return completer.get_completions(Document(text), CompleteEvent())
+
+def test_complete(completer):
+    assert [c.text for c in complete(completer, "dum")] == ["dump"]
+    assert [c.text for c in complete(completer, "cd ")] == [
+        "extgroup", "group", "subsubgroup_hardlink"]
+    assert [c.text for c in complete(completer, "dump l")] == ["link"]
+    completion = next(complete(completer, "cd gr"))
+    assert (completion.text, completion.start_position) == ("group", -2)
+
+def test_superseded(completer):
+    stale = complete(completer, "dump ")
+    assert next(stale).text == "extgroup/"
+    # Typing more starts a new request, which stops the old one
+    assert [c.text for c in complete(completer, "dump s")] == [
+        "softlink", "subsubgroup_hardlink/"]
+    assert list(stale) == []
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_complete_path(completer, indexed):
+    state = completer.state
+    if indexed:
+        state.build_index()
+    texts = lambda text: [c.text for c in complete(completer, text)]
+    assert texts("cd group/s") == ["group/subgroup"]
+    assert texts("cd /group/subgroup/") == ["/group/subgroup/subsubgroup"]
+    assert texts("cd /nonexistent/") == []
+    assert sorted(texts("dump /group/")) == ["/group/scalar",
+                                             "/group/subgroup/",
+                                             "/group/vector"]
+    state.chdir("group/subgroup")
+    assert texts("dump ../v") == ["../vector"]
+    assert texts("cd ../../g") == ["../../group"]
+    # Through a hard link to a group
+    assert texts("cd /subsubgroup_hardlink/") == []
+    assert texts("cd ../../extg") == ["../../extgroup"]
+
+def test_complete_prefix(completer):
+    assert [c.text for c in complete(completer, "time l")] == ["l", "ls"]
+    assert [c.text for c in complete(completer, "time cd gr")] == ["group"]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import h5py
+import numpy as np
+import pytest
+
+import h5sh.diff as module
+from h5sh.parallel import make_pool
+
+def write(filename, changed):
+    with h5py.File(filename, 'w') as f:
+        d = f.create_dataset('x', shape=(40, 30), chunks=(10, 10), dtype='f8',
+                             compression='gzip')
+        d[:20] = np.arange(600).reshape(20, 30)
+        d[5, 5] = np.nan
+        f['g/y'] = np.arange(4)
+        f['g'].attrs['units'] = 'm'
+        f['g/link'] = h5py.SoftLink('/g/y' if changed else '/x')
+        f['words'] = np.array([b'a', b'b'])
+        if changed:
+            d[12, 3] += 1e-9
+            d[15, 25] = -1
+            f['g'].attrs['units'] = 'cm'
+            f['extra'] = 1
+
+@pytest.fixture
+def files(tmpdir):
+    names = [str(tmpdir / "a.h5"), str(tmpdir / "b.h5")]
+    for (i, name) in enumerate(names):
+        write(name, changed=i)
+    handles = [h5py.File(name, 'r') for name in names]
+    yield handles
+    for f in handles:
+        f.close()
+
+def compare(a, b, jobs=1, **kwargs):
+    with make_pool(jobs) as pool:
+        return [str(d) for d in module.Comparison(block_size=1000, **kwargs)
+                .compare(a, b, pool, max_pending=4)]
+
+def test_equal_elements():
+    a = np.array([1.0, np.nan, 3.0])
+    b = np.array([1.0, np.nan, 3.001])
+    assert module.equal_elements(a, b).tolist() == [True, True, False]
+    assert module.equal_elements(a, b, rtol=1e-3).all()
+    assert not module.equal_elements(np.array([b'a']), np.array([1])).any()
+
+def test_compare(files):
+    (a, b) = files
+    assert compare(a, a) == []
+    assert compare(a, b) == [
+        "/extra: only in second",
+        "/g: attribute 'units' differs",
+        "/g/link: soft link to /x != soft link to /g/y",
+        "/x: data differ at [12, 3]: 363.0 != 363.000000001",
+    ]
+    assert compare(a['x'], b['x'], jobs=3, count=True) == [
+        "/x: 2 of 1200 elements differ, first at [12, 3]: "
+        "363.0 != 363.000000001"]
+    assert compare(a['x'], b['x'], count=True, atol=1e-6) == [
+        "/x: 1 of 1200 elements differ, first at [15, 25]: 475.0 != -1.0"]
+    assert compare(a['g'], b['g'], attrs=False) == [
+        "/g/link: soft link to /x != soft link to /g/y"]
+    assert compare(a['g'], a['x']) == ["/g: group != dataset"]
+    assert compare(a['g/y'], a['x']) == ["/g/y: shape 4 != 40×30"]
+
+def test_compare_empty(tmpdir):
+    with h5py.File(str(tmpdir / "empty.h5"), 'w') as f:
+        for name in ('a', 'b'):
+            f.create_dataset(name, shape=(0, 5), maxshape=(None, 5),
+                             chunks=(4, 5), dtype='f8', compression='gzip')
+        f.create_dataset('c', shape=(0, 5), dtype='f4')
+        assert compare(f['a'], f['b']) == []
+        # Not stored alike, so compared by value
+        assert compare(f['a'], f['c']) == ["/a: type float64 != float32"]
+
+def test_raw_chunks(files, monkeypatch):
+    (a, b) = files
+    assert module.same_storage(a['x'], b['x'])
+    assert not module.same_storage(a['x'], a['g/y'])
+    reads = []
+    equal_elements = module.equal_elements
+    def counted(va, vb, *args):
+        reads.append(va.shape)
+        return equal_elements(va, vb, *args)
+    monkeypatch.setattr(module, 'equal_elements', counted)
+    # Only the chunk that changed is decompressed
+    assert compare(a['x'], b['x'], count=True, atol=1e-6)
+    assert reads == [(10, 10), (10, 10)]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import h5py
+import numpy as np
+import pytest
+
+import h5sh.export as module
+from h5sh.selection import DatasetView
+
+@pytest.fixture
+def h5file(tmpdir):
+    with h5py.File(str(tmpdir.join("export.h5")), 'w') as f:
+        yield f
+
+def test_export_npy(h5file, tmpdir):
+    data = np.arange(40 * 30, dtype='>i4').reshape(40, 30)
+    dset = h5file.create_dataset('data', data=data, chunks=(8, 8))
+    out = str(tmpdir.join("out.npy"))
+    # Tiny budget forces many blocks
+    module.export(dset, out, budget=256)
+    result = np.load(out)
+    np.testing.assert_array_equal(result, data)
+
+    view = DatasetView(dset, (slice(5, None, 3), 7))
+    module.export(view, out, budget=16)
+    np.testing.assert_array_equal(np.load(out), data[5::3, 7])
+
+    # Empty chunked (extendable) dataset
+    empty = h5file.create_dataset('empty', shape=(0, 5), maxshape=(None, 5),
+                                  chunks=(4, 5), dtype='f4')
+    module.export(empty, out, budget=16)
+    assert np.load(out).shape == (0, 5)
+
+def test_export_raw(h5file, tmpdir):
+    data = np.linspace(0, 1, 1000).astype('>f8')
+    dset = h5file.create_dataset('data', data=data)
+    out = str(tmpdir.join("out.raw"))
+    module.export(dset, out, "raw", budget=100)
+    result = np.fromfile(out, dtype='<f8')
+    np.testing.assert_array_equal(result, data)
+
+    empty = h5file.create_dataset('empty', shape=(0, 3), dtype='i2')
+    module.export(empty, out, "raw")
+    assert tmpdir.join("out.raw").size() == 0
+
+    scalar = h5file.create_dataset('scalar', data=1.5)
+    module.export(scalar, out, "raw")
+    assert np.fromfile(out, dtype='<f8').tolist() == [1.5]
+
+def test_export_errors(h5file, tmpdir):
+    strings = h5file.create_dataset('s', data=['a', 'bc'],
+                                    dtype=h5py.string_dtype())
+    with pytest.raises(ValueError):
+        module.export(strings, str(tmpdir.join("out.npy")))
+    dset = h5file.create_dataset('data', data=[1, 2])
+    with pytest.raises(ValueError):
+        module.export(dset, str(tmpdir.join("out.txt")), "txt")
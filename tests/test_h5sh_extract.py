@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import h5py
+import numpy as np
+import pytest
+
+import h5sh.extract as module
+
+def test_covering_paths():
+    assert module.covering_paths(['/a/b', '/ab', '/a', '/c/d', '/a/b/c']) \
+        == ['/a', '/ab', '/c/d']
+    assert module.covering_paths(['/a', '/']) == ['/']
+
+@pytest.fixture
+def source(tmpdir):
+    filename = str(tmpdir / "source.h5")
+    with h5py.File(filename, 'w') as f:
+        f.attrs['title'] = "run"
+        d = f.create_dataset('results/run1/temp', data=np.arange(100.0),
+                             chunks=(10,), compression='gzip')
+        d.attrs['units'] = "K"
+        f['results/run1/deep/value'] = 3
+        f['results/latest'] = h5py.SoftLink('/results/run1')
+        f['results'].attrs['count'] = 1
+        f['other'] = 1
+    with h5py.File(filename, 'r') as f:
+        yield f
+
+def test_copy(source, tmpdir):
+    with h5py.File(str(tmpdir / "out.h5"), 'w') as dst:
+        copied = module.copy_objects(
+            source, ['/results/run1/temp', '/results/latest',
+                     '/results/run1'], dst)
+        assert copied == ['/results/latest', '/results/run1']
+        assert dst['results/run1/temp'].attrs['units'] == "K"
+        assert dst['results/run1/temp'].compression == 'gzip'
+        assert dst['results/run1/deep/value'][()] == 3
+        # Links are copied as links, and parents without attributes
+        assert dst['results'].get('latest', getlink=True).path \
+            == '/results/run1'
+        assert not dst['results'].attrs
+        assert 'other' not in dst
+        with pytest.raises(ValueError):
+            module.copy_objects(source, ['/results/run1/temp'], dst)
+
+def test_copy_options(source, tmpdir):
+    with h5py.File(str(tmpdir / "out.h5"), 'w') as dst:
+        module.copy_objects(source, ['/results/latest'], dst,
+                            expand_soft=True, shallow=True)
+        latest = dst['results'].get('latest', getlink=True)
+        assert isinstance(latest, h5py.HardLink)
+        # Only immediate members of the group
+        assert len(dst['results/latest/deep']) == 0
+        assert dst['results/latest/temp'].shape == (100,)
+
+    with h5py.File(str(tmpdir / "links.h5"), 'w') as dst:
+        module.copy_objects(source, ['/'], dst, link=True)
+        # Root group is expanded into its members
+        link = dst.get('other', getlink=True)
+        assert isinstance(link, h5py.ExternalLink)
+        assert (link.filename, link.path) == (source.filename, '/other')
+        assert dst.attrs['title'] == "run"
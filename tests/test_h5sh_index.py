@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import pytest
+import h5py
+import numpy as np
+
+import h5sh.index as module
+from h5sh.metadata import (GROUP, DATASET, HARD, SOFT, EXTERNAL)
+
+@pytest.fixture
+def index(example_h5_filename):
+    with h5py.File(example_h5_filename, 'r') as f:
+        yield module.StructureIndex.build(f)
+
+def test_walk(example_h5_filename):
+    with h5py.File(example_h5_filename, 'r') as f:
+        paths = [m.path for m in module.walk(f['group'])]
+    assert paths == ['/group', '/group/scalar', '/group/subgroup',
+                     '/group/vector', '/group/subgroup/subsubgroup']
+
+def test_entries(index):
+    assert len(index) == 11
+    assert list(index.counts()) == [6, 5, 0, 0]
+
+    root = index['/']
+    assert root.nchildren == 6
+    scalar = index['/group/scalar']
+    assert (scalar.kind, scalar.link) == (DATASET, HARD)
+    assert scalar.dtype == np.dtype('f8')
+    assert scalar.shape == ()
+    assert scalar.attrs == ('cats',)
+    assert index['/group'].attrs == ('count', 'unit')
+    soft = index['/softlink']
+    assert (soft.kind, soft.link, soft.target) == (DATASET, SOFT,
+                                                   '/group/scalar')
+    ext = index['/extgroup']
+    assert (ext.kind, ext.link) == (GROUP, EXTERNAL)
+    assert ext.filename.endswith('example-data-external.h5')
+
+    with pytest.raises(KeyError):
+        index['/nonexistent']
+    assert index.get('/group/nonexistent') is None
+
+def test_hardlinked_group(index):
+    alias = index['/group/subgroup/subsubgroup']
+    assert alias.target == '/subsubgroup_hardlink'
+    assert index.children('/group/subgroup/subsubgroup') == []
+    assert index.children('/group/subgroup/subsubgroup/foo') is None
+
+def test_subtree(example_h5_filename):
+    with h5py.File(example_h5_filename, 'a') as f:
+        f['subsubgroup_hardlink/deep'] = np.arange(3)
+        f['softgrp'] = h5py.SoftLink('/subsubgroup_hardlink')
+        index = module.StructureIndex.build(f)
+
+    (rows, paths) = index.subtree('/')
+    assert list(paths) == list(index.paths[1:])
+    # Hard-linked groups below are descended into at their first path
+    (rows, paths) = index.subtree('/subsubgroup_hardlink')
+    assert list(paths) == ['/subsubgroup_hardlink/deep']
+    # ... so a walk from an alias has the same rows at other paths
+    for alias in ['/group/subgroup/subsubgroup/', '/softgrp']:
+        (alias_rows, paths) = index.subtree(alias)
+        assert list(alias_rows) == list(rows)
+        assert list(paths) == [alias.rstrip('/') + '/deep']
+    assert index.entry(rows[0], '/softgrp/deep').name == 'deep'
+    # A walk from the group containing the alias descends into it too
+    assert index.subtree('/group') is None
+    assert index.subtree('/group/vector') is None
+
+def test_children(index):
+    assert [m.name for m in index.children('/group')] == [
+        'scalar', 'subgroup', 'vector']
+    assert index.children('/group/vector') is None
+    assert index.classify('/') == (
+        ['extgroup', 'group', 'subsubgroup_hardlink'],
+        ['extlink', 'link', 'softlink'])
+    assert len(index.descendant_rows('/group')) == 4
+
+def test_prefix_sorting():
+    records = [module.Metadata('/', GROUP, HARD, None, None, None, (), (),
+                               None, None, 3, 0, 0)]
+    for path in ['/a', '/a-b', '/a/c']:
+        records.append(records[0]._replace(path=path, nchildren=0))
+    index = module.StructureIndex.from_metadata(records)
+    assert [m.path for m in index.children('/a')] == ['/a/c']
+    assert [m.name for m in index.children('/')] == ['a', 'a-b']
+
+def test_complete(index):
+    assert index.complete('/gr') == [('group', True)]
+    assert index.complete('/group/') == [('scalar', False),
+                                         ('subgroup', True),
+                                         ('vector', False)]
+    assert index.complete('/group/s', limit=1) == [('scalar', False)]
+    assert index.complete('/subsubgroup_hardlink/') == []
+    assert index.complete('/link/') is None
+    assert index.complete('/nonexistent/x') is None
+
+def test_string_storage(tmp_path):
+    wide = np.dtype([('field{:03d}'.format(i), 'f8') for i in range(200)])
+    root = module.Metadata('/', GROUP, HARD, None, None, None, (), (),
+                           None, None, 3, 0, 0)
+    records = [root]
+    for (i, path) in enumerate([u'/z', u'/\xe9t\xe9', u'/a']):
+        records.append(root._replace(
+            path=path, kind=DATASET, dtype=wide if i else np.dtype('f4'),
+            shape=(i,), filters=('gzip',), attrs=(u'\xfcnit',),
+            nchildren=None))
+    index = module.StructureIndex.from_metadata(records)
+    columns = index.columns
+    # Each distinct spec is stored once, however long
+    assert len(columns['dtype_specs']) == 3
+    assert list(columns['filter_specs']) == ['', 'gzip']
+    assert len(columns['path'].data) == sum(len(m.path.encode('utf-8'))
+                                            for m in records)
+    # UTF-8 byte order is code point order
+    assert list(index.paths) == [u'/', u'/a', u'/z', u'/\xe9t\xe9']
+    assert index.complete(u'/\xe9') == [(u'\xe9t\xe9', False)]
+
+    index.save(str(tmp_path))
+    loaded = module.StructureIndex.load(str(tmp_path))
+    for m in records:
+        assert loaded[m.path] == m
+    assert loaded[u'/\xe9t\xe9'].dtype == wide
+    assert list(loaded.paths[np.array([3, 1])]) == [u'/\xe9t\xe9', u'/a']
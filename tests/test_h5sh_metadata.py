@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import pytest
+import h5py
+import numpy as np
+
+import h5sh.metadata as module
+from h5sh.metadata import (GROUP, DATASET, DATATYPE, UNKNOWN, HARD, SOFT,
+                           EXTERNAL)
+from h5sh.utils import short_describe
+
+@pytest.fixture
+def h5file(example_h5_filename):
+    with h5py.File(example_h5_filename, 'a') as f:
+        f['dangling'] = h5py.SoftLink('/nonexistent')
+        f['type'] = np.dtype('i2')
+    with h5py.File(example_h5_filename, 'r') as f:
+        yield f
+
+def test_iter_members(h5file):
+    members = dict((m.name, m) for m in module.iter_members(h5file))
+    assert sorted(members) == sorted(h5file)
+    group = members['group']
+    assert (group.path, group.kind, group.link, group.nchildren) == (
+        '/group', GROUP, HARD, 3)
+    assert group.addr == h5py.h5o.get_info(h5file['group'].id).addr
+    link = members['link']
+    assert (link.kind, link.dtype, link.shape) == (DATASET, np.dtype('i'),
+                                                   (3,))
+    assert members['type'].kind == DATATYPE
+    soft = members['softlink']
+    assert (soft.link, soft.target) == (SOFT, '/group/scalar')
+    ext = members['extlink']
+    assert (ext.link, ext.target) == (EXTERNAL, 'external_ds')
+    assert ext.filename.endswith('example-data-external.h5')
+    # Same descriptions as from the objects
+    for name in ['group', 'link', 'softlink', 'extgroup']:
+        obj = h5file.get(name, getlink=True)
+        if isinstance(obj, h5py.HardLink):
+            obj = h5file[name]
+        assert short_describe(members[name]) == short_describe(obj)
+
+def test_classify_members(h5file):
+    members = dict((m.name, m) for m in module.iter_members(h5file, False))
+    # Links are resolved
+    assert members['softlink'].kind == DATASET
+    assert members['extgroup'].kind == GROUP
+    assert members['dangling'].kind == UNKNOWN
+    assert members['group'].nchildren is None
+
+def test_scan_links(h5file):
+    names = []
+    module.scan_links(h5file, names.append, offset=1, limit=2)
+    assert names == sorted(h5file)[1:3]
+    kinds = []
+    module.scan_links(h5file['group'], lambda n, k: kinds.append(k),
+                      info=True)
+    assert kinds == [HARD] * 3
+
+def test_iter_members_batches(h5file, monkeypatch):
+    calls = []
+    scan_links = module.scan_links
+
+    def counting_scan_links(*args, **kwargs):
+        calls.append(args[1:])
+        return scan_links(*args, **kwargs)
+
+    monkeypatch.setattr(module, 'scan_links', counting_scan_links)
+    names = sorted(h5file)
+    members = module.iter_members(h5file, False, batch=2)
+    # Only the first batch is read before the first member is generated
+    assert next(members).name == names[0]
+    assert len(calls) == 1
+    assert [m.name for m in members] == names[1:]
+    # Batches double in size
+    assert [c[2] for c in calls] == [2, 4, 8]
+    assert [m.name for m in module.iter_members(
+        h5file, False, offset=1, limit=4, batch=3)] == names[1:5]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import pytest
+import h5py
+
+from h5sh.pool import FilePool
+
+@pytest.fixture
+def filenames(tmpdir):
+    names = []
+    for i in range(4):
+        name = str(tmpdir / "run{:d}.h5".format(i))
+        with h5py.File(name, 'w') as f:
+            f['value'] = i
+        names.append(name)
+    yield names
+
+def test_reuse(filenames):
+    pool = FilePool(2)
+    f = pool.get(filenames[0])
+    assert pool.get(filenames[0]) is f
+    assert pool.opens == 1
+    assert filenames[0] in pool
+    pool.close_all()
+    assert not f.id.valid
+    assert len(pool) == 0
+
+def test_lru(filenames):
+    pool = FilePool(2)
+    (a, b, c) = [pool.get(name) for name in filenames[:3]]
+    # Least recently used was closed
+    assert not a.id.valid
+    assert b.id.valid and c.id.valid
+    assert filenames[0] not in pool
+    # ... and is reopened on demand
+    assert pool.get(filenames[0])['value'][()] == 0
+    assert pool.opens == 4
+    assert filenames[1] not in pool
+
+def test_pinned(filenames):
+    pool = FilePool(1)
+    a = pool.get(filenames[0])
+    pool.pinned.add(a.filename)
+    b = pool.get(filenames[1])
+    # Over the limit rather than closing a pinned file
+    assert a.id.valid and b.id.valid
+    pool.resize(1)
+    assert a.id.valid and not b.id.valid
+    with pytest.raises(ValueError):
+        pool.resize(0)
+    pool.close(filenames[0])
+    assert not a.id.valid
+    assert not pool.pinned
+
+def test_writable(filenames):
+    pool = FilePool()
+    f = pool.get(filenames[0])
+    assert f.mode == 'r'
+    g = pool.get(filenames[0], 'r+')
+    assert g.mode == 'r+'
+    assert not f.id.valid
+
+def test_cache_options(filenames):
+    pool = FilePool(rdcc_nbytes=4 * 1024**2, rdcc_w0=None,
+                    mdc_nbytes=8 * 1024**2)
+    assert pool.options == {'rdcc_nbytes': 4 * 1024**2}
+    with pytest.raises(TypeError):
+        FilePool(bogus=1)
+    (a, b) = [pool.get(name) for name in filenames[:2]]
+    assert a.id.get_access_plist().get_cache()[2] == 4 * 1024**2
+    assert a.id.get_mdc_config().max_size == 8 * 1024**2
+    pool.pinned.add(a.filename)
+
+    # Metadata cache is resized in place
+    assert pool.configure(mdc_nbytes=16 * 1024**2) == []
+    assert b.id.valid
+    assert b.id.get_mdc_config().max_size == 16 * 1024**2
+
+    # Unpinned files are closed and pinned ones must be reopened
+    assert pool.configure(rdcc_nslots=101) == [a.filename]
+    assert not b.id.valid
+    a = pool.reopen(a.filename)
+    assert a.filename in pool.pinned
+    assert a.id.get_access_plist().get_cache()[1:3] == (101, 4 * 1024**2)
+
+@pytest.mark.parametrize('driver', ['sec2', 'stdio', 'core', 'fileobj'])
+def test_drivers(filenames, driver):
+    pool = FilePool(driver=driver, read_ahead=64 * 1024)
+    f = pool.get(filenames[0])
+    assert f.driver == driver
+    # Named after the real file whatever the driver
+    assert f.filename == filenames[0]
+    assert f['value'][()] == 0
+    g = pool.get(filenames[0], 'r+')
+    g['other'] = 5
+    pool.close_all()
+    with h5py.File(filenames[0], 'r') as f:
+        assert f['other'][()] == 5
+
+def test_change_driver(filenames):
+    pool = FilePool(driver='fileobj')
+    (a, b) = [pool.get(name) for name in filenames[:2]]
+    fileobj = pool._fileobjs[b.filename]
+    pool.pinned.add(a.filename)
+    with pytest.raises(ValueError):
+        pool.configure(driver='mpio')
+    assert pool.configure(driver='core') == [a.filename]
+    # Python file closed along with the HDF5 file
+    assert fileobj.closed
+    assert pool.reopen(a.filename).driver == 'core'
+    assert not pool._fileobjs
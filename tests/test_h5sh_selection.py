@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import h5py
+import numpy as np
+import pytest
+
+import h5sh.selection as module
+
+def test_parse_selection():
+    assert module.parse_selection("1000:2000, ::8, 3") == (
+        slice(1000, 2000), slice(None, None, 8), 3)
+    assert module.parse_selection("...,-1") == (Ellipsis, -1)
+    assert module.parse_selection(":") == (slice(None),)
+    for bad in ["", "1,,2", "a:b", "1:2:3:4", "...,..."]:
+        with pytest.raises(ValueError):
+            module.parse_selection(bad)
+
+def test_split_selection():
+    assert module.split_selection("temp") == ("temp", None)
+    assert module.split_selection("/a/temp[1:2, 3]") == (
+        "/a/temp", (slice(1, 2), 3))
+    assert module.split_selection("[weird]") == ("[weird]", None)
+
+def test_format_selection():
+    for text in ["1000:2000, ::8, 3", "..., -1", ":", "1:"]:
+        assert module.format_selection(module.parse_selection(text)) == text
+
+def test_normalize_selection():
+    norm = module.normalize_selection
+    assert norm((slice(2, None, 3), -1), (10, 4)) == [(2, 3, 3), 3]
+    assert norm((Ellipsis, 1), (5, 6, 7)) == [(0, 1, 5), (0, 1, 6), 1]
+    assert norm(slice(8, 2), (5,)) == [(5, 1, 0)]
+    with pytest.raises(ValueError):
+        norm((1, 2), (5,))
+    with pytest.raises(ValueError):
+        norm((5,), (5,))
+    with pytest.raises(ValueError):
+        norm((slice(None, None, -1),), (5,))
+
+def test_dataset_view(tmpdir):
+    data = np.arange(20 * 30 * 4).reshape(20, 30, 4)
+    with h5py.File(str(tmpdir.join("view.h5")), 'w') as f:
+        dset = f.create_dataset('data', data=data)
+        sel = module.parse_selection("3:17, ::4, 2")
+        view = module.DatasetView(dset, sel)
+        expected = data[3:17, ::4, 2]
+        assert view.shape == expected.shape
+        assert view.size == expected.size
+        np.testing.assert_array_equal(view[:], expected)
+        np.testing.assert_array_equal(np.asarray(view), expected)
+        np.testing.assert_array_equal(view[-3:, 1::2], expected[-3:, 1::2])
+        assert view[4, 5] == expected[4, 5]
+
+        scalar = module.DatasetView(dset, (1, 2, 3))
+        assert scalar.shape == ()
+        assert scalar[()] == data[1, 2, 3]
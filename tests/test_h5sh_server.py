@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import io
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import h5sh.server as module
+
+pytestmark = pytest.mark.skipif(not hasattr(module.socket, 'AF_UNIX'),
+                                reason="Unix sockets are unavailable")
+
+@pytest.fixture
+def server(tmpdir):
+    server = module.Server(str(tmpdir.join("h5sh.sock")))
+    server.bind()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    if server.running:
+        module.stop_server(server.path)
+    thread.join(10)
+    assert not thread.is_alive()
+
+def client(server, filename, commands, **kwargs):
+    (out, err) = (io.StringIO(), io.StringIO())
+    status = module.run_client(filename, commands, server.path,
+                               stdout=out, stderr=err, **kwargs)
+    return (status, out.getvalue(), err.getvalue())
+
+def test_server(server, example_h5_filename):
+    assert client(server, example_h5_filename, "cd group; pwd") == (
+        0, "/group\n", "")
+    # Each request starts at the root with the same open file
+    assert client(server, example_h5_filename, "pwd") == (0, "/\n", "")
+    assert len(server.states) == 1
+    (state, _) = next(iter(server.states.values()))
+
+    (status, out, err) = client(server, example_h5_filename,
+                                "bogus; pwd; cd /nonexistent; pwd",
+                                exit_on_error=True)
+    assert (status, out) == (1, "")
+    assert "command not found" in err
+
+    (status, out, err) = client(server, "nonexistent.h5", "pwd")
+    assert status == 2
+    assert "No such file" in err
+
+    # Modified files are reopened (writing from another process, which
+    # must ignore the server's file lock)
+    env = dict(os.environ, HDF5_USE_FILE_LOCKING="FALSE")
+    subprocess.check_call([sys.executable, "-c", """if True:
+        import h5py, sys
+        with h5py.File(sys.argv[1], 'a') as f:
+            f.create_group("newgroup")
+        """, example_h5_filename], env=env)
+    (status, out, err) = client(server, example_h5_filename, "cd newgroup")
+    assert (status, err) == (0, "")
+    assert next(iter(server.states.values()))[0] is not state
+    assert state.closed
+
+    assert module.stop_server(server.path) == 0
+
+def test_server_isolation(server, example_h5_filename, tmpdir):
+    other = str(tmpdir.join("b.h5"))
+    subprocess.check_call([sys.executable, "-c", """if True:
+        import h5py, sys
+        with h5py.File(sys.argv[1], 'w') as f:
+            f.create_group("in_b")
+        """, other])
+    (status, out, err) = client(server, example_h5_filename,
+                                "open {}; ls".format(other))
+    assert (status, out.split()) == (0, ['in_b'])
+    # The next request is back in its own file, with the original settings
+    (status, out, err) = client(server, example_h5_filename,
+                                "filename; set cache-entries")
+    assert status == 0
+    assert out.splitlines() == [example_h5_filename, "cache-entries = 64"]
+    (state, _) = next(iter(server.states.values()))
+
+    assert client(server, example_h5_filename, "set cache-entries 2")[0] == 0
+    assert state.closed
+    (status, out, err) = client(server, example_h5_filename,
+                                "set cache-entries")
+    assert out == "cache-entries = 64\n"
+    # Unchanged states are kept
+    assert client(server, example_h5_filename, "pwd")[0] == 0
+    assert not next(iter(server.states.values()))[0].closed
+
+def test_client_main(server, example_h5_filename):
+    # The client must not import h5py
+    script = ("import sys\n"
+              "from h5sh.scripts.main import main\n"
+              "try:\n"
+              "    main(sys.argv[1:])\n"
+              "finally:\n"
+              "    assert 'h5py' not in sys.modules\n")
+    proc = subprocess.Popen(
+        [sys.executable, "-c", script, example_h5_filename, "--socket",
+         server.path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, universal_newlines=True)
+    (out, err) = proc.communicate("cd group\npwd\n")
+    assert (proc.returncode, out, err) == (0, "/group\n", "")
+
+def test_no_server(tmpdir):
+    with pytest.raises((IOError, OSError)):
+        module.run_client("foo.h5", "pwd", str(tmpdir.join("none.sock")))
+
+def test_private_socket(tmpdir, monkeypatch):
+    private = tmpdir.join("h5sh-user")
+    monkeypatch.setattr(module, '_user_tmp_dir', lambda: str(private))
+    monkeypatch.delenv('H5SH_SOCKET', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    server = module.Server()
+    assert server.path == str(private.join("h5sh.sock"))
+    server.bind()
+    try:
+        assert private.stat().mode & 0o777 == 0o700
+        assert os.stat(server.path).st_mode & 0o777 == 0o600
+    finally:
+        server.close()
+
+    # A directory that others can access is refused
+    private.chmod(0o755)
+    with pytest.raises(IOError):
+        module.Server().bind()
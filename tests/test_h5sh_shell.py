@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import subprocess
+import sys
+
+import pytest
+
+from h5sh.state import State
+import h5sh.shell as module
+
+def test_batch(example_h5_filename, capsys):
+    with State(example_h5_filename) as state:
+        batch = module.Batch(state)
+        assert batch.run("cd group; pwd # comment; ls\nattr scalar") == 0
+        out = capsys.readouterr().out
+        assert out.startswith("/group\ncats")
+
+        assert batch.run(["bogus; pwd\n", "cd nonexistent\n", "pwd"]) == 1
+        captured = capsys.readouterr()
+        assert captured.out == "/group\n/group\n"
+        assert captured.err.startswith("h5sh: bogus: command not found\n")
+        assert batch.failures == 2
+
+        batch = module.Batch(state, exit_on_error=True)
+        assert batch.run("cd /; bogus; pwd") == 1
+        assert capsys.readouterr().out == ""
+
+        batch = module.Batch(state)
+        assert batch.run("pwd; exit; bogus") == 0
+        assert capsys.readouterr().out == "/\n"
+
+def run_main(args, stdin=None):
+    # Batch mode must not load the interactive console
+    script = ("import sys\n"
+              "from h5sh.scripts.main import main\n"
+              "try:\n"
+              "    main(sys.argv[1:])\n"
+              "finally:\n"
+              "    assert 'prompt_toolkit' not in sys.modules\n"
+              "    assert 'pygments' not in sys.modules\n")
+    proc = subprocess.Popen([sys.executable, "-c", script] + args,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    (out, err) = proc.communicate(stdin)
+    return (proc.returncode, out, err)
+
+def test_main_batch(example_h5_filename, tmpdir):
+    (status, out, err) = run_main([example_h5_filename, '-c',
+                                   'cd /group; pwd'])
+    assert (status, out, err) == (0, "/group\n", "")
+
+    script = tmpdir.join("test.h5sh")
+    script.write("cd group\npwd\nbogus\n")
+    (status, out, err) = run_main([example_h5_filename, '-f', str(script)])
+    assert (status, out) == (1, "/group\n")
+    assert "command not found" in err
+
+    (status, out, err) = run_main([example_h5_filename], stdin="pwd\n")
+    assert (status, out, err) == (0, "/\n", "")
+
+def test_main_driver(example_h5_filename):
+    (status, out, err) = run_main([example_h5_filename, '--driver', 'core',
+                                   '-c', 'set driver'])
+    assert (status, out) == (0, "driver = core\n")
+    (status, out, err) = run_main([example_h5_filename, '--driver', 'bogus'])
+    assert status == 2
+    assert ("invalid choice: 'bogus' (choose from sec2, stdio, core, "
+            "fileobj)") in err
+
+def test_main_rdcc_w0(example_h5_filename):
+    (status, out, err) = run_main([example_h5_filename, '--rdcc-w0', '0.5',
+                                   '-c', 'set rdcc-w0'])
+    assert (status, out) == (0, "rdcc-w0 = 0.5\n")
+    (status, out, err) = run_main([example_h5_filename, '--rdcc-w0', '1.5'])
+    assert status == 2
+    assert "Expected a number from 0 to 1, not 1.5" in err
+
+def test_timing_log(example_h5_filename, tmpdir):
+    log = tmpdir.join("timing.tsv")
+    (status, out, err) = run_main([example_h5_filename, '--timing-log',
+                                   str(log), '-c',
+                                   'ls group; dump "nope[1]"; exit'])
+    assert status == 1
+    lines = [l.split("\t") for l in log.read().splitlines()]
+    assert [l[3:] for l in lines] == [
+        ["ok", example_h5_filename, "ls group"],
+        ["error", example_h5_filename, "dump 'nope[1]'"],
+        ["ok", example_h5_filename, "exit"]]
+    for l in lines:
+        assert float(l[1]) >= 0 and float(l[2]) >= 0
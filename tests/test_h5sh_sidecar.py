@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import os
+import pytest
+import h5py
+import numpy as np
+
+import h5sh.sidecar as module
+from h5sh.state import State
+
+def test_roundtrip(example_h5_filename, h5sh_cache_dir):
+    with h5py.File(example_h5_filename, 'r') as f:
+        assert module.load_index(f) == (None, None)
+        (index, how) = module.load_index(f, rebuild=True)
+        assert how == "built"
+        (loaded, how) = module.load_index(f)
+        assert how == "loaded"
+
+    assert isinstance(loaded.paths.data, np.memmap)
+    assert len(loaded) == len(index)
+    for path in index.paths:
+        assert loaded[path] == index[path]
+    sidecar = module.Sidecar(example_h5_filename)
+    assert sidecar.path.startswith(str(h5sh_cache_dir))
+    assert sidecar.exists
+
+def test_refresh(example_h5_filename):
+    filename = str(example_h5_filename)
+    with h5py.File(filename, 'a') as f:
+        f.create_dataset('group/grow', shape=(2,), maxshape=(None,),
+                         dtype='f4')
+    with State(filename, index=True) as state:
+        old = state.index
+        assert old['/group'].attrs == ('count', 'unit')
+        assert old['/group/grow'].shape == (2,)
+
+    with h5py.File(filename, 'a') as f:
+        f['group'].attrs['new'] = 1
+        f['group/grow'].resize((5,))
+    # Ensure the modification time differs
+    st = os.stat(filename)
+    os.utime(filename, (st.st_atime, st.st_mtime + 10))
+
+    with State(filename) as state:
+        index = state.index
+        assert index['/group'].attrs == ('count', 'new', 'unit')
+        assert index['/group'].nchildren == 4
+        assert index['/group/grow'].shape == (5,)
+        assert index['/group/vector'] == old['/group/vector']
+        state.drop_index()
+        assert state.index is None
+    assert not module.Sidecar(filename).exists
+
+def test_no_save(example_h5_filename):
+    with State(example_h5_filename, index=True, save_index=False) as state:
+        assert state.index is not None
+    assert not module.Sidecar(example_h5_filename).exists
+
+def test_old_format(example_h5_filename, h5sh_cache_dir):
+    with h5py.File(example_h5_filename, 'r') as f:
+        module.load_index(f, rebuild=True)
+        sidecar = module.Sidecar(example_h5_filename)
+        signature = sidecar.read_signature()
+        signature['format'] = module.FORMAT_VERSION - 1
+        sidecar.save(sidecar.load(), signature)
+        (index, how) = module.load_index(f)
+    assert how == "built"
+    assert len(index) == 11
+    assert sidecar.read_signature()['format'] == module.FORMAT_VERSION
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import json
+import os
+import subprocess
+import sys
+from timeit import default_timer
+
+import pytest
+
+import h5sh.startup as module
+
+# Allowed startup time in seconds beyond importing h5py
+STARTUP_BUDGET = float(os.environ.get('H5SH_STARTUP_BUDGET', '0.5'))
+
+py3only = pytest.mark.skipif(sys.version_info < (3, 4),
+                             reason="Import hooks require Python 3.4")
+
+@py3only
+def test_import_profiler(tmpdir, monkeypatch, capsys):
+    tmpdir.join("outer_mod.py").write("import inner_mod\n")
+    tmpdir.join("inner_mod.py").write("import time\ntime.sleep(0.02)\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    profiler = module.ImportProfiler().install()
+    try:
+        import outer_mod
+    finally:
+        profiler.uninstall()
+    assert profiler not in sys.meta_path
+    assert profiler.cumulative['outer_mod'] >= profiler.cumulative['inner_mod']
+    assert profiler.exclusive['inner_mod'] >= 0.02
+    assert profiler.exclusive['outer_mod'] < 0.02
+
+    profiler.report(sys.stdout)
+    out = capsys.readouterr().out
+    assert out.startswith("Startup took")
+    assert "inner_mod" in out
+
+def python_time(code, *args):
+    start = default_timer()
+    subprocess.check_call([sys.executable, "-c", code] + list(args))
+    return default_timer() - start
+
+@py3only
+def test_startup_budget(example_h5_filename):
+    # Batch commands load only what they need
+    script = ("import sys\n"
+              "from h5sh.scripts.main import main\n"
+              "try:\n"
+              "    main(sys.argv[1:])\n"
+              "except SystemExit:\n"
+              "    pass\n"
+              "loaded = [m for m in ('prompt_toolkit', 'pygments',\n"
+              "          'multiprocessing', 'h5sh.commands.query',\n"
+              "          'h5sh.index') if m in sys.modules]\n"
+              "assert not loaded, loaded\n")
+    # Warm up the filesystem cache
+    python_time(script, example_h5_filename, "-c", "pwd")
+
+    baseline = min(python_time("import h5py") for _ in range(3))
+    elapsed = min(python_time(script, example_h5_filename, "-c", "pwd")
+                  for _ in range(3))
+    assert elapsed - baseline < STARTUP_BUDGET
+
+def test_deferred_commands():
+    # Each command module defines exactly the commands deferred to it
+    script = ("import json, pkgutil\n"
+              "from importlib import import_module\n"
+              "import h5sh.commands as pkg\n"
+              "from h5sh.commands import COMMANDS\n"
+              "deferred = {}\n"
+              "for (name, mod) in COMMANDS.deferred.items():\n"
+              "    deferred.setdefault(mod, []).append(name)\n"
+              "for info in pkgutil.iter_modules(pkg.__path__):\n"
+              "    import_module(pkg.__name__ + '.' + info.name)\n"
+              "registered = {}\n"
+              "for (name, cmd) in COMMANDS.commands.items():\n"
+              "    registered.setdefault(cmd.__module__, []).append(name)\n"
+              "print(json.dumps([deferred, registered]))\n")
+    output = subprocess.check_output([sys.executable, "-c", script])
+    (deferred, registered) = json.loads(output.decode())
+    assert deferred
+    assert (dict((m, sorted(n)) for (m, n) in registered.items())
+            == dict((m, sorted(n)) for (m, n) in deferred.items()))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import pytest
+import h5py
+
+from h5sh.state import State
+
+def test_listing_cache(example_h5_filename):
+    with State(example_h5_filename) as state:
+        assert sorted(state.subgroups) == ['extgroup', 'group',
+                                           'subsubgroup_hardlink']
+        assert sorted(state.datasets) == ['extlink', 'link', 'softlink']
+        state.chdir('group')
+        assert state.subgroups == ['subgroup']
+        assert state.datasets == ['scalar', 'vector']
+        assert len(state.listings) == 2
+
+        misses = state.listings.misses
+        state.chdir('..')
+        assert 'group' in state.subgroups
+        state.chdir()
+        assert 'group' in state.subgroups
+        assert state.listings.misses == misses
+
+def test_listing_invalidate(example_h5_filename):
+    with State(example_h5_filename, mode='a') as state:
+        state.chdir('group')
+        assert state.subgroups == ['subgroup']
+        state.group.create_group('newgroup')
+        # Stale until explicitly invalidated
+        assert state.subgroups == ['subgroup']
+        state.invalidate('.')
+        assert state.subgroups == ['newgroup', 'subgroup']
+
+def test_listing_budget(example_h5_filename):
+    with State(example_h5_filename, cache_entries=1) as state:
+        state.subgroups
+        state.chdir('group')
+        state.subgroups
+        assert [k[0] for k in state.listings] == ['/group']
+
+def test_open_files(example_h5_filename, tmpdir):
+    other = str(tmpdir / "run3.h5")
+    with h5py.File(other, 'w') as f:
+        f.create_group('results')['energy'] = [1.0, 2.0]
+
+    with State(example_h5_filename, max_open_files=1) as state:
+        state.chdir('group')
+        alias = state.open(other)
+        assert alias == "run3.h5"
+        # Opening again gives the same alias
+        assert state.open(other) == alias
+        with pytest.raises(ValueError):
+            state.open(other, alias="other")
+        with pytest.raises(ValueError):
+            state.open(other.replace("run3", "example-data-external"),
+                       alias="run3.h5")
+
+        # Cross-file access without switching
+        assert list(state.get("run3.h5:/results/energy")) == [1.0, 2.0]
+        assert state.cwd == '/group'
+
+        state.chdir("run3.h5:results")
+        assert state.alias == "run3.h5"
+        assert state.cwd == '/results'
+        assert state.datasets == ['energy']
+
+        # Switching back restores the previous group
+        state.use("example-data.h5")
+        assert state.cwd == '/group'
+        with state.using("run3.h5"):
+            assert state.cwd == '/results'
+        assert state.cwd == '/group'
+
+        # Only the file in use stays open
+        assert list(state.pool) == [state.sessions[state.alias].filename]
+        with pytest.raises(ValueError):
+            state.use("nonexistent")
+
+def test_split_alias(example_h5_filename, tmpdir):
+    with State(example_h5_filename) as state:
+        assert state.split_alias("/group") == (None, "/group")
+        assert state.split_alias("example-data.h5:") == ("example-data.h5",
+                                                         ".")
+        # Unknown prefix that isn't a file
+        assert state.split_alias("foo:bar") == (None, "foo:bar")
+        # Existing file is opened on demand
+        assert state.split_alias(str(example_h5_filename) + ":/group") == (
+            "example-data.h5", "/group")
+        ext = str(tmpdir / "example-data-external.h5")
+        assert state.split_alias(ext + ":/external_ds") == (
+            "example-data-external.h5", "/external_ds")
+        assert len(state.sessions) == 2
+
+def test_iter_items(example_h5_filename):
+    with State(example_h5_filename) as state:
+        items = state.iter_items()
+        assert next(items) == ('extgroup', True)
+        # Abandoned when the group changes; nothing is cached
+        state.chdir('group')
+        assert list(items) == []
+        assert len(state.listings) == 0
+
+        assert sorted(state.iter_items()) == [('scalar', False),
+                                              ('subgroup', True),
+                                              ('vector', False)]
+        assert len(state.listings) == 1
+        assert state.subgroups == ['subgroup']
+        # Served from the completed listing
+        assert state.listings.misses == 2
+
+def test_iter_items_batches(example_h5_filename, monkeypatch):
+    import h5sh.metadata
+    with h5py.File(example_h5_filename, 'a') as f:
+        g = f.create_group('wide')
+        for i in range(250):
+            g.create_group('g{:03d}'.format(i))
+    calls = []
+    scan_links = h5sh.metadata.scan_links
+
+    def counting_scan_links(*args, **kwargs):
+        calls.append(args[2:4])
+        return scan_links(*args, **kwargs)
+
+    monkeypatch.setattr(h5sh.metadata, 'scan_links', counting_scan_links)
+    with State(example_h5_filename) as state:
+        state.chdir('wide')
+        items = state.iter_items()
+        assert next(items) == ('g000', True)
+        assert calls == [(0, 100)]
+        assert len([next(items) for _ in range(99)]) == 99
+        # No more batches are read once the group changes
+        state.chdir('..')
+        assert list(items) == []
+        assert calls == [(0, 100)]
+        state.chdir('wide')
+        assert len(list(state.iter_items())) == 250
+        assert calls[1:] == [(0, 100), (100, 200)]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (division, absolute_import, print_function, )
+
+import numpy as np
+import pytest
+
+import h5sh.stats as module
+
+def merged(data, nblocks, axis=None):
+    n = 1 if axis is None else data.shape[axis]
+    summary = module.Summary.empty(n)
+    for idx in np.array_split(np.arange(data.shape[0]), nblocks):
+        block = data[idx[0]:idx[-1] + 1]
+        where = slice(None) if axis is None else slice(idx[0], idx[-1] + 1)
+        summary.update(module.Summary.from_block(block, axis), where)
+    return summary
+
+def test_summary():
+    data = np.random.RandomState(1).normal(1e6, 3, (97, 13))
+    data[5, 7] = np.nan
+    s = merged(data, 7)
+    assert s.count[0] == data.size - 1
+    assert s.nans[0] == 1
+    assert s.min[0] == np.nanmin(data)
+    assert s.max[0] == np.nanmax(data)
+    assert s.mean[0] == pytest.approx(np.nanmean(data), rel=1e-14)
+    assert s.std[0] == pytest.approx(np.nanstd(data), rel=1e-10)
+
+def test_summary_axis():
+    data = np.arange(60, dtype='i2').reshape(12, 5)
+    s = merged(data, 5, axis=0)
+    np.testing.assert_array_equal(s.count, 5)
+    np.testing.assert_array_equal(s.min, data.min(axis=1))
+    np.testing.assert_allclose(s.mean, data.mean(axis=1))
+    np.testing.assert_allclose(s.std, data.std(axis=1))
+
+def test_summary_empty():
+    s = module.Summary.empty(2)
+    s.update(module.Summary.from_block(np.full((2, 3), np.nan), axis=0))
+    s.update(module.Summary.from_block(np.zeros((2, 0)), axis=0))
+    rows = list(s.rows())
+    assert rows[0][:2] == (0, 3)
+    assert np.isnan(rows[0][2:]).all()
+
+    with pytest.raises(ValueError):
+        module.Summary.from_block(np.array(['a']))
@@ -5,6 +5,7 @@ from __future__ import (division, absolute_import, print_function, )
 from pprint import pprint
 import pytest
 import h5py
+import numpy as np
 import sys
 
 import h5sh.utils as module
@@ -27,6 +28,20 @@ def test_shlex_split():
     assert ['foo bar', 'baz'] == split(r'"foo bar" baz')
     assert ['foo bar', 'baz'] == split(r'"foo bar" "baz')
 
+def test_split_commands():
+    split = module.split_commands
+    assert split("cd /a; ls -l;; attr x\n") == ["cd /a", "ls -l", "attr x"]
+    assert split("echo 'a;b' \"c # d\"; x # y; z\nw") == [
+        "echo 'a;b' \"c # d\"", "x", "w"]
+    assert split("ls a#b") == ["ls a#b"]
+    assert split("# only a comment\n\n") == []
+
+def test_join_brackets():
+    assert module.join_brackets(['a', 'b']) == ['a', 'b']
+    assert module.join_brackets(['t[1:2,', '::8,', '3]', '-p', '2']) == [
+        't[1:2, ::8, 3]', '-p', '2']
+    assert module.join_brackets(['x]', 'y[', 'z']) == ['x]', 'y[ z']
+
 def test_abspath():
     abspath = module.abspath
 
@@ -95,3 +110,97 @@ def test_unescape_string():
     un = module.unescape_string
     assert "This\nis Sparta" == un(r"This\nis Spart\x61")
 
+def test_parse_bytes():
+    parse = module.parse_bytes
+    assert 123 == parse("123")
+    assert 2048 == parse("2k")
+    assert 64 * 1024**2 == parse("64M")
+    assert 64 * 1024**2 == parse("64MiB")
+    assert int(1.5 * 1024**3) == parse("1.5G")
+    with pytest.raises(ValueError):
+        parse("-1G")
+    with pytest.raises(ValueError):
+        parse("lots")
+    for text in ["inf", "-inf", "nan", "1e308G"]:
+        with pytest.raises(ValueError):
+            parse(text)
+
+def test_parse_fraction():
+    parse = module.parse_fraction
+    assert parse("0") == 0
+    assert parse("0.25") == 0.25
+    assert parse("1") == 1
+    for text in ["-0.1", "1.5", "nan", "x"]:
+        with pytest.raises(ValueError):
+            parse(text)
+
+def test_format_bytes():
+    fmt = module.format_bytes
+    assert "0" == fmt(0)
+    assert "1023" == fmt(1023)
+    assert "1.0K" == fmt(1024)
+    assert "1.5K" == fmt(1536)
+    assert "24M" == fmt(24 * 1024**2)
+    assert "2.0G" == fmt(2 * 1024**3)
+
+@pytest.mark.parametrize('shape', [(100,), (7, 40), (30, 3, 20), (4, 4)])
+def test_extract_edges(tmpdir, shape):
+    data = np.arange(np.prod(shape), dtype='f8').reshape(shape) / 7
+    with h5py.File(str(tmpdir / "edges.h5"), 'w') as f:
+        dset = f.create_dataset('data', data=data)
+        for edgeitems in [1, 2, 3]:
+            expected = np.array2string(data, edgeitems=edgeitems,
+                                       threshold=0, precision=3)
+            edges = module.extract_edges(dset, edgeitems)
+            assert edges.shape == tuple(min(n, 2 * edgeitems + 1)
+                                        for n in shape)
+            assert expected == np.array2string(edges, edgeitems=edgeitems,
+                                               threshold=0, precision=3)
+
+
+def test_decode_strings():
+    fixed = np.array([b'ab', b'c'])
+    result = module.decode_strings(fixed, 'ascii')
+    assert result.dtype.kind == 'U'
+    assert result.tolist() == ['ab', 'c']
+
+    mixed = np.array([u'café'.encode('utf-8'), u'x', b''], dtype=object)
+    result = module.decode_strings(mixed, 'utf-8')
+    assert result.dtype == object
+    assert result.tolist() == [u'café', u'x', u'']
+
+    ints = np.arange(3)
+    assert module.decode_strings(ints) is ints
+
+def test_read_strings(tmpdir):
+    from h5sh.selection import DatasetView
+    words = [u'café', u'', u'long' * 10, u'x']
+    with h5py.File(str(tmpdir / "strings.h5"), 'w') as f:
+        dset = f.create_dataset('s', data=words,
+                                dtype=h5py.string_dtype('utf-8'))
+        fixed = f.create_dataset('f', data=np.array([b'ab', b'c']))
+        assert module.string_encoding(dset.dtype) == 'utf-8'
+        assert module.string_encoding(fixed.dtype) == 'ascii'
+        assert module.string_encoding(np.dtype('f8')) is None
+
+        assert module.extract(dset).tolist() == words
+        assert module.extract(fixed).tolist() == [u'ab', u'c']
+        view = DatasetView(dset, (slice(None, None, 2),))
+        assert module.read_strings(view).tolist() == words[::2]
+        edges = module.extract_edges(dset, 1)
+        assert [edges[0], edges[-1]] == [words[0], words[-1]]
+
+def test_read_ascii_strings(tmpdir):
+    # HDF5 only converts ASCII strings to NumPy strings after it has
+    # converted UTF-8 ones, so check in a fresh process
+    import subprocess
+    import sys
+    filename = str(tmpdir / "ascii.h5")
+    with h5py.File(filename, 'w') as f:
+        f.create_dataset('a', data=np.array([b'ab', b'c'], dtype=object),
+                         dtype=h5py.string_dtype('ascii'))
+    script = ("import h5py; from h5sh.utils import extract; "
+              "print(extract(h5py.File({!r}, 'r')['a']).tolist())"
+              .format(filename))
+    out = subprocess.check_output([sys.executable, "-c", script])
+    assert out.decode().strip() == "['ab', 'c']"